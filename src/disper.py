@@ -19,6 +19,9 @@ import sys
 import logging
 import optparse
 import shlex
+import socket
+import stat
+from StringIO import StringIO
 
 from switcher import Switcher, Resolution, ResolutionSelection
 from plugins import Plugins
@@ -45,6 +48,7 @@ class Disper:
     plugins = None          # plugins object
     log = None
     conffile = None         # last configuration file read
+    stdin = sys.stdin       # where to read the configuration to import from
 
     def __init__(self):
         self.log = logging.getLogger('disper')
@@ -77,8 +81,11 @@ class Disper:
             help='comma-separated list of displays to operate on, or "auto" to detect; '+
                  'the first is the primary display.')
         self.add_option('-t', '--direction', dest='direction',
-            choices=['left','right','top','bottom'],
-            help='where to extend displays: "left", "right", "top", or "bottom"')
+            choices=['left','right','top','bottom','grid'],
+            help='where to extend displays: "left", "right", "top", "bottom", or "grid"')
+        self.add_option('', '--refresh', dest='refresh', type='float',
+            help='refresh rate in Hz to switch to, e.g. "144"; the closest rate available at the '+
+                 'resolution is used. By default the highest rate of the preferred mode is used.')
         self.add_option('', '--scaling', dest='scaling',
             choices=['default','native','scaled','centered','aspect-scaled'],
             help='flat-panel scaling mode: "default", "native", "scaled", "centered", or "aspect-scaled"')
@@ -88,6 +95,14 @@ class Disper:
                  os.environ.get('XDG_CONFIG_HOME', os.path.join('~', '.config', 'disper'))))
         self.add_option('', '--cycle-stages', dest='cycle_stages', default='-c:-s:-S',
             help='colon-separated list command-line arguments to cycle through; "-S:-c:-s" by default')
+        self.add_option('', '--watch-action', dest='watch_action', default='-e',
+            help='command-line arguments to switch with when displays are connected or '+
+                 'disconnected while watching; "-e" by default')
+        self.add_option('', '--daemon', action='store_true', dest='daemon',
+            help='keep running and execute actions requested by subsequent disper invocations, '+
+                 'which is faster than doing all the work each time')
+        self.add_option('', '--no-daemon', action='store_true', dest='no_daemon',
+            help='execute the action directly, even when a disper daemon is running')
 
         group = optparse.OptionGroup(self.parser, 'Actions',
             'Select exactly one of the following actions')
@@ -107,6 +122,8 @@ class Disper:
             help='import current settings from standard input')
         self._add_option(group, '-C', '--cycle', action='append_const', const='cycle', dest='actions',
             help='cycle through the list of cycle stages')
+        self._add_option(group, '-w', '--watch', action='append_const', const='watch', dest='actions',
+            help='keep running and switch with the watch action when displays are connected or disconnected')
         self.parser.add_option_group(group)
 
 
@@ -137,10 +154,13 @@ class Disper:
         '''parses command-line options; can be called multiple times'''
         self.argv += args
 
-    def options_parse(self, args=None):
-        '''parses command-line options given; adds options to current list if set'''
+    def options_parse(self, args=None, ignore=[]):
+        '''parses command-line options given; adds options to current list if set.
+        Actions in ignore are left out, as if they weren't given.'''
         if args: self.options_append(args)
         (self.options, self.args) = self.parser.parse_args(self.argv)
+        if self.options.actions:
+            self.options.actions = filter(lambda x: x not in ignore, self.options.actions)
         # need exactly one action
         if not self.options.actions: self.options.actions = []
         elif len(self.options.actions) > 1:
@@ -211,9 +231,11 @@ class Disper:
         elif 'export' in self.options.actions:
             print self.export_config()
         elif 'import' in self.options.actions:
-            self.import_config('\n'.join(sys.stdin))
+            self.import_config(self.stdin.read())
         elif 'cycle' in self.options.actions:
             self._cycle(self.options.cycle_stages.split(':'))
+        elif 'watch' in self.options.actions:
+            self._watch(self.options.watch_action)
         elif 'list' in self.options.actions:
             # list displays with resolutions
             displays = self.options.displays
@@ -296,6 +318,7 @@ class Disper:
         else:
             res = Resolution(res)
         # and switch
+        self.switcher().set_refresh_rate(self.options.refresh)
         result = self.switcher().switch_clone(displays, res)
         self.plugins.set_layout_clone(displays, res)
         self.plugins.call('switch')
@@ -336,6 +359,7 @@ class Disper:
         # figure out direction
         if not direction: direction = self.options.direction
         # and switch
+        self.switcher().set_refresh_rate(self.options.refresh)
         result = self.switcher().switch_extend(displays, direction, ress)
         self.plugins.set_layout_extend(displays, direction, ress)
         self.plugins.call('switch')
@@ -382,6 +406,117 @@ class Disper:
             f.write(str(stage)+'\n')
             f.close()
 
+    def _watch(self, args):
+        argv = self.argv[:]
+        def parse():
+            self.argv = argv[:]
+            self.options_parse(shlex.split(args), ignore=['watch'])
+        # check the watch action before watching, so that it can't end the
+        # watcher at the first event
+        parse()
+        if not self.options.actions:
+            self.parser.error('no action specified in watch action: '+args)
+        def switch(displays):
+            try:
+                parse()
+                self.switch()
+            except (Exception, SystemExit), e:
+                # keep watching when a switch fails
+                self.log.error(str(e))
+        try:
+            self.switcher().watch(switch)
+        except Exception, e:
+            self.log.critical(str(e))
+            raise SystemExit(1)
+
+    def daemon(self):
+        '''Keep running and execute commands sent by disper clients through
+        a local socket, see client(). The switcher is created only once and
+        kept around, which saves connecting to X and probing each time.'''
+        path = socket_path(create=True)
+        if not path:
+            self.log.critical('no private directory for the disper daemon socket')
+            raise SystemExit(1)
+        if os.path.exists(path):
+            # a socket that can't be connected to is left over
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                try:
+                    s.connect(path)
+                    self.log.critical('disper daemon already running at '+path)
+                    raise SystemExit(1)
+                except socket.error:
+                    os.unlink(path)
+            finally:
+                s.close()
+        self.switcher()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            oldmask = os.umask(0077)
+            try: server.bind(path)
+            finally: os.umask(oldmask)
+            server.listen(5)
+            self.log.info('disper daemon listening at '+path)
+            while True:
+                conn, addr = server.accept()
+                try:
+                    try:
+                        # don't let a client that stops sending block others
+                        conn.settimeout(REQUEST_TIMEOUT)
+                        request = _recv_request(conn)
+                        # connections without data only check if we're running
+                        if not request: continue
+                        args, stdin = request
+                        status, out, err = self.command(args, stdin)
+                        conn.sendall('%d %d %d\n%s%s'%(status, len(out), len(err), out, err))
+                    except (socket.error, ValueError), e:
+                        self.log.warning('disper client connection failed: %s'%e)
+                finally:
+                    conn.close()
+        finally:
+            server.close()
+            os.unlink(path)
+
+    def command(self, args, stdin=''):
+        '''Execute a disper command-line from a running disper process, as is
+        done by the daemon. stdin is the data used for import. Returns the
+        exit status, and what was written to standard output and error.'''
+        out, err = StringIO(), StringIO()
+        handler = logging.StreamHandler(err)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logging.getLogger().addHandler(handler)
+        oldstdout, oldstderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = out, err
+        self.stdin = StringIO(stdin)
+        status = 0
+        try:
+            try:
+                self.argv = []
+                self.options_append(self.config_read_default())
+                self.options_parse(args)
+                if self.options.daemon:
+                    self.log.critical('disper daemon already running')
+                    raise SystemExit(1)
+                if 'watch' in self.options.actions:
+                    self.log.critical('cannot watch from the disper daemon, use --no-daemon')
+                    raise SystemExit(2)
+                # the display configuration may have changed since last time;
+                # the display server probes by itself on hotplug, so what it
+                # knows is recent enough
+                self.switcher().refresh(probe=False)
+                self.switch()
+            except SystemExit, e:
+                if type(e.code) == int: status = e.code
+                elif e.code: status = 1
+            except Exception, e:
+                self.log.error(str(e))
+                status = 1
+        finally:
+            sys.stdout, sys.stderr = oldstdout, oldstderr
+            logging.getLogger().removeHandler(handler)
+            self.stdin = sys.stdin
+        return status, out.getvalue(), err.getvalue()
+
     def switcher(self):
         '''Return switcher object (singleton).
         This is implemented as a method, so that it can be created only when
@@ -391,10 +526,116 @@ class Disper:
         return self._switcher
 
 
+# seconds the daemon waits for a client to send its request
+REQUEST_TIMEOUT = 5.0
+# largest request accepted by the daemon, in bytes
+REQUEST_MAX = 16*1024*1024
+
+def socket_path(create=False):
+    '''Return the path of the socket a disper daemon listens on; there is one
+    daemon for each user and X display. Without XDG_RUNTIME_DIR it is put in a
+    directory in /tmp that only the user can access, which is created when
+    create is True. Returns None when that directory can't be trusted.'''
+    display = os.environ.get('DISPLAY', '').replace('/', '_')
+    directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not directory:
+        directory = os.path.join('/tmp', 'disper-%d'%os.getuid())
+        if create and not os.path.lexists(directory):
+            try: os.mkdir(directory, 0700)
+            except OSError: pass
+        # another user may have created it first
+        try: st = os.lstat(directory)
+        except OSError: return None
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or \
+           st.st_mode & 0077:
+            return None
+    return os.path.join(directory, 'disper-%d-%s.sock'%(os.getuid(), display))
+
+def _recv_request(conn):
+    '''Receive a command from a disper client; returns (args, stdin), or
+    None if the client didn't send anything. A request starts with a line with
+    the length of the arguments and of stdin, so that it is known when all of
+    it has been received.'''
+    header = _recv_exactly(conn, 0, '\n')
+    if not header: return None
+    nargs, nstdin = map(int, header.split())
+    if nargs < 0 or nstdin < 0 or nargs + nstdin > REQUEST_MAX:
+        raise ValueError('invalid request size')
+    args = _recv_exactly(conn, nargs)
+    stdin = _recv_exactly(conn, nstdin)
+    return filter(lambda x: x, args.split('\0')), stdin
+
+def _recv_exactly(conn, size, end=None):
+    '''Receive size bytes from a connection, or when end is given, a line
+    ending with it (without end). Raises ValueError if the connection is
+    closed before that; returns '' if nothing was received at all.'''
+    data = []
+    received = 0
+    while end or received < size:
+        d = conn.recv(end and 1 or min(size - received, 65536))
+        if not d:
+            if end and not data: return ''
+            raise ValueError('incomplete request')
+        if end and d == end: break
+        data.append(d)
+        received += len(d)
+        if end and received > 64: raise ValueError('invalid request header')
+    return ''.join(data)
+
+def client(args):
+    '''Send a command to a running disper daemon and output its result. Returns
+    the exit status, or None if no daemon is running or it doesn't respond in
+    time.'''
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(REQUEST_TIMEOUT)
+    stdin = None
+    try:
+        path = socket_path()
+        if not path: return None
+        try:
+            s.connect(path)
+        except socket.error:
+            return None
+        stdin = ''
+        if '-i' in args or '--import' in args:
+            stdin = sys.stdin.read()
+        args = '\0'.join(args)
+        s.sendall('%d %d\n'%(len(args), len(stdin)) + args + stdin)
+        s.shutdown(socket.SHUT_WR)
+        data = []
+        while True:
+            d = s.recv(4096)
+            if not d: break
+            data.append(d)
+    except socket.timeout:
+        # run locally instead, with the standard input that was read already
+        if stdin: sys.stdin = StringIO(stdin)
+        return None
+    finally:
+        s.close()
+    header, sep, data = ''.join(data).partition('\n')
+    status, nout, nerr = map(int, header.split())
+    sys.stdout.write(data[:nout])
+    sys.stderr.write(data[nout:nout+nerr])
+    return status
+
 def main():
+    # hand over to a running daemon when possible; this is done before
+    # anything else to keep it fast
+    args = sys.argv[1:]
+    local = ['--daemon', '--no-daemon', '-w', '--watch', '-h', '--help', '--version']
+    if not filter(lambda x: x in local, args):
+        status = client(args)
+        if status != None:
+            raise SystemExit(status)
     disper = Disper()
-    disper.options_parse(sys.argv[1:])
-    disper.switch()
+    # the client may have replaced standard input with what it read already
+    disper.stdin = sys.stdin
+    disper.options_parse(args)
+    if disper.options.daemon:
+        disper.daemon()
+    else:
+        disper.switch()
 
 if __name__ == "__main__":
     # Python 2.3 doesn't support arguments to basicConfig()
@@ -111,15 +111,20 @@ class MetaMode:
     options = {}    # options for modeline
     metamodes = []  # configuration for each display
     src = None      # source line, required for deleting a metamode
+    _key = ()       # canonical key of the display configurations
+    _changes = 0    # number of changes to any MetaMode, for indexes
 
     def __init__(self, value=None):
         self.set(value)
 
     def set(self, value):
+        # a MetaMode that is set again may be in an indexed MetaModeList
+        if '_key' in self.__dict__: MetaMode._changes += 1
         self.src = value
         self.id = None
         self.options = {}
         self.metamodes = []
+        self._key = ()
         if not value: return
         #opts, sep, line = value.partition('::') #python>=2.5
         opts, line = (value.split('::',1)+['']*2)[:2]
@@ -140,6 +145,7 @@ class MetaMode:
             mode = MetaModeDisplay(disp)
             if mode.physical:
                 self.metamodes.append(mode)
+        self._key = self._make_key()
 
     def __str__(self):
         s = ''
@@ -153,16 +159,11 @@ class MetaMode:
         if type(other) == int:
             return self.id == other
         elif type(other) == str:
-            return self == MetaMode(other)
+            return self._key == MetaMode(other)._key
         else:
             # Only compare metamodes, options don't matter. Displays that
             # have NULL (for which x.physical isn't defined) don't count.
-            displaysS = filter(lambda x: x.physical, self.metamodes)
-            displaysO = filter(lambda x: x.physical, other.metamodes)
-            if len(displaysS) != len(displaysO): return False
-            for m in displaysS:
-                if not m in displaysO: return False
-            return True
+            return self._key == other._key
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -170,6 +171,32 @@ class MetaMode:
     def __nonzero__(self):
         return len(self.metamodes)>0
 
+    def key(self):
+        '''return a hashable value that is equal for MetaModes that compare
+        equal, so that they can be matched using a dict.'''
+        return self._key
+
+    def update_key(self):
+        '''compute the key from the display configurations again; needed
+        after they have been modified.'''
+        self._key = self._make_key()
+        MetaMode._changes += 1
+
+    def _make_key(self):
+        '''return the key from the display configurations'''
+        displays = []
+        for d in self.metamodes:
+            if not d.physical: continue
+            virtual = d.virtual
+            if not virtual: virtual = d.physical
+            if type(d.physical) == list: physical = tuple(d.physical)
+            else: physical = d.physical
+            if type(virtual) == list: virtual = tuple(virtual)
+            position = d.position
+            if position: position = tuple(position)
+            displays.append((d.display, physical, virtual, position))
+        return tuple(sorted(displays))
+
     def bounding_size(self):
         '''return the size of the total virtual screen as (w,h)'''
         x,y,w,h = self.bounding_box()
@@ -193,20 +220,100 @@ class MetaMode:
         return cmin[0], cmin[1], cmax[0]-cmin[0], cmax[1]-cmin[1]
 
 
+def _unindexing(name):
+    '''return the list method name that drops the MetaModeList index'''
+    method = getattr(list, name)
+    def unindexing(self, *args):
+        self._by_id = self._by_key = None
+        return method(self, *args)
+    unindexing.__name__ = name
+    return unindexing
+
+
 class MetaModeList(list):
-    '''A list of MetaModes.'''
+    '''A list of MetaModes. MetaModes are indexed by id and by key on the
+    first find, so they can be found directly. The index is built again when
+    the list is changed, or when any MetaMode was changed (see
+    MetaMode.update_key()).'''
 
     def __init__(self, metamodes=None):
         list.__init__(self)
+        self._by_id = self._by_key = None
+        self._indexed = None
         if metamodes: 
             for m in metamodes:
                 self.append(MetaMode(m))
 
+    append = _unindexing('append')
+    extend = _unindexing('extend')
+    insert = _unindexing('insert')
+    remove = _unindexing('remove')
+    pop = _unindexing('pop')
+    sort = _unindexing('sort')
+    reverse = _unindexing('reverse')
+    __setitem__ = _unindexing('__setitem__')
+    __delitem__ = _unindexing('__delitem__')
+    __setslice__ = _unindexing('__setslice__')
+    __delslice__ = _unindexing('__delslice__')
+    __iadd__ = _unindexing('__iadd__')
+    __imul__ = _unindexing('__imul__')
+
+    def _index(self):
+        '''build the index when the list or any MetaMode has changed'''
+        if self._by_id is not None and self._indexed == MetaMode._changes:
+            return
+        self._by_id = {}
+        self._by_key = {}
+        self._indexed = MetaMode._changes
+        # the first one wins, like a linear search would
+        for mm in self:
+            if mm.id != None: self._by_id.setdefault(mm.id, mm)
+            self._by_key.setdefault(mm.key(), mm)
+
     def find(self, el):
-        '''find a MetaMode by either id or string'''
-        for i in self:
-            if i == el:
-                return i
+        '''find a MetaMode by either id, string or MetaMode'''
+        if type(el) == str:
+            el = MetaMode(el)
+        self._index()
+        if type(el) == int:
+            return self._by_id.get(el)
+        return self._by_key.get(el.key())
+
+
+def metamode_plan(current, desired):
+    '''return the operations needed to turn the MetaModeList current into the
+    list of MetaModes desired, as done by update_screen_metamodes() in
+    nvidia-settings. Operations are returned in the order they are to be
+    executed as a list of ('add', MetaMode), ('delete', MetaMode) and
+    ('move', MetaMode, index) tuples. MetaModes are added to the end of the
+    list, and only those that are not at their desired index are moved.'''
+    # index current metamodes so that each desired one is matched at once
+    available = {}
+    for mm in current:
+        available.setdefault(mm.key(), []).append(mm)
+    adds = []
+    order = []
+    for mm in desired:
+        match = available.get(mm.key())
+        if match:
+            order.append(match.pop(0))
+        else:
+            adds.append(('add', mm))
+            order.append(mm)
+    kept = set(map(id, order))
+    deletes = [('delete', mm) for mm in current if id(mm) not in kept]
+    # list as it is after adding and deleting; then move out-of-place ones
+    mmlist = [mm for mm in current if id(mm) in kept] + [op[1] for op in adds]
+    position = dict([(id(mm), i) for i, mm in enumerate(mmlist)])
+    moves = []
+    for i, mm in enumerate(order):
+        if position[id(mm)] == i: continue
+        moves.append(('move', mm, i))
+        mmlist.remove(mm)
+        mmlist.insert(i, mm)
+        for j in range(i, len(mmlist)):
+            position[id(mmlist[j])] = j
+    return adds + deletes + moves
 
 
 def metamode_clone(displays, physical, virtual=None):
@@ -275,6 +382,7 @@ def metamode_add_extend(metamode, direction, display, physical, virtual=None):
     else:
         mmdisp = MetaModeDisplay('%s: NULL'%(display))
     metamode.metamodes.append(mmdisp)
+    metamode.update_key()
     return metamode
 
 
@@ -304,6 +412,8 @@ if __name__ == '__main__':
             print 'ERROR: find by id failed for id %d' % mm.id
         if mms.find(str(mm)).src != mm.src:
             print 'ERROR: find by str failed for id %d' % mm.id
+        if mms.find(MetaMode(str(mm))).src != mm.src:
+            print 'ERROR: find by MetaMode instance failed for id %d' % mm.id
         if MetaMode(metamodesstr[i]) != mm:
             print 'ERROR: find by MetaMode failed for id %d' % mm.id
 
@@ -321,6 +431,25 @@ if __name__ == '__main__':
         if not mms.find(mm) or mms.find(mm).id != 63:
             print 'ERROR: find variation by str failed: %s' % mm
 
+    # the index follows changes to the list and to its MetaModes
+    mms = MetaModeList(metamodesstr[:2])
+    m = mms[1]
+    metamode_add_extend(m, 'right', 'TV-0', [640,480])
+    if mms.find(m) is not m or mms.find(str(m)) is not m:
+        print 'ERROR: find after metamode_add_extend failed'
+    mms.remove(m)
+    if mms.find(51) or mms.find(m):
+        print 'ERROR: find after remove found %s'%m
+    mms.insert(0, m)
+    if mms.find(51) is not m:
+        print 'ERROR: find after insert failed'
+    mms[0] = MetaMode('id=70 :: CRT-1: 800x600 +0+0')
+    if mms.find(51) or mms.find(70) is not mms[0]:
+        print 'ERROR: find after item assignment failed'
+    mms[0].set('id=71 :: CRT-1: 800x600 +0+0')
+    if mms.find(70) or mms.find(71) is not mms[0]:
+        print 'ERROR: find after set failed'
+
     # test bounding box sizes
     m = MetaMode('DFP-0: 800x600 +0+0, CRT-0: 800x600 +0+0')
     if m.bounding_size() != (800, 600):
@@ -353,6 +482,22 @@ if __name__ == '__main__':
         if m != MetaMode(mmline):
             print 'ERROR: metamode_extend %s: %s'%(dir,str(m))
 
+    # test metamode list planning
+    mms = MetaModeList(metamodesstr[:4])
+    ops = metamode_plan(mms, [mms[0], mms[2], mms[3]])
+    if len(ops) != 1 or ops[0][0] != 'delete' or ops[0][1].id != 51:
+        print 'ERROR: metamode_plan delete: %s'%str(ops)
+    ops = metamode_plan(mms, [MetaMode(str(mms[1])), mms[0], mms[2], mms[3]])
+    if len(ops) != 1 or ops[0][0] != 'move' or ops[0][1].id != 51 or ops[0][2] != 0:
+        print 'ERROR: metamode_plan move: %s'%str(ops)
+    m = MetaMode('DFP-0: 800x600 +0+0')
+    ops = metamode_plan(mms, [m] + mms[1:])
+    if map(lambda x: x[0], ops) != ['add', 'delete', 'move'] or ops[0][1] != m \
+            or ops[1][1].id != 50 or ops[2][1] != m or ops[2][2] != 0:
+        print 'ERROR: metamode_plan add: %s'%str(ops)
+    if metamode_plan(mms, mms) != []:
+        print 'ERROR: metamode_plan unchanged'
+
     print 'tests finished.'
 
 
@@ -0,0 +1,115 @@
+##############################################################################
+# modelines.py - modeline parsing for nvidia GPUs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License at http://www.gnu.org/licenses/gpl.txt
+# By using, editing and/or distributing this software you agree to
+# the terms and conditions of this license.
+
+import re
+
+# a single modeline, optionally prepended with "token=value" pairs and "::",
+# as found in the NUL-separated NV_CTRL_BINARY_DATA_MODELINES buffer:
+#   source=edid :: "1280x1024" 108.00 1280 1328 1440 1688 1024 1025 1028 1066 +hsync +vsync
+_MODELINE_RE = re.compile(r'(?:([^\0"]*?)\s*::\s*)?"([^"\0]*)"\s+([\d.]+)' +
+    r'\s+(\d+)'*8 + r'([^\0]*)')
+_OPTION_RE = re.compile(r'\s*([^=,\s]+)\s*=\s*([^,]*?)\s*(?:,|$)')
+
+
+class ModeLine:
+    '''A ModeLine as reported by the nvidia driver'''
+
+    name = None     # name of the mode, e.g. "1280x1024"
+    options = {}    # "token=value" pairs, like source=edid
+    clock = None    # pixel clock in MHz
+    hdisplay = hsyncstart = hsyncend = htotal = None
+    vdisplay = vsyncstart = vsyncend = vtotal = None
+    flags = []      # remaining flags, like +hsync and Interlace
+
+    def __init__(self, value=None):
+        self.set(value)
+
+    def set(self, value):
+        '''set from a modeline string, or from a match of _MODELINE_RE'''
+        self.name = None
+        self.options = {}
+        self.flags = []
+        if not value: return
+        if type(value) == str:
+            m = _MODELINE_RE.match(value.strip())
+            if not m: raise ValueError('malformed modeline: %s'%value)
+        else:
+            m = value
+        opts, self.name, clock = m.group(1, 2, 3)
+        if opts:
+            self.options = dict(_OPTION_RE.findall(opts))
+        self.clock = float(clock)
+        (self.hdisplay, self.hsyncstart, self.hsyncend, self.htotal,
+         self.vdisplay, self.vsyncstart, self.vsyncend, self.vtotal) = \
+            map(int, m.group(4, 5, 6, 7, 8, 9, 10, 11))
+        self.flags = m.group(12).split()
+
+    def size(self):
+        '''return the resolution of the mode as (w,h)'''
+        return self.hdisplay, self.vdisplay
+
+    def refresh(self):
+        '''return the vertical refresh rate in Hz'''
+        if not self.htotal or not self.vtotal: return 0.0
+        rate = self.clock * 1000000.0 / (self.htotal * self.vtotal)
+        flags = map(lambda f: f.lower(), self.flags)
+        if 'interlace' in flags: rate *= 2
+        if 'doublescan' in flags: rate /= 2
+        return rate
+
+    def source(self):
+        '''return where the driver got the mode from, e.g. edid or xconfig'''
+        return self.options.get('source')
+
+    def __str__(self):
+        s = ''
+        if self.options:
+            s += ', '.join(map(lambda x: '%s=%s'%x, self.options.items()))
+            s += ' :: '
+        s += '"%s" %.3f %d %d %d %d %d %d %d %d'%(self.name, self.clock,
+            self.hdisplay, self.hsyncstart, self.hsyncend, self.htotal,
+            self.vdisplay, self.vsyncstart, self.vsyncend, self.vtotal)
+        if self.flags: s += ' ' + ' '.join(self.flags)
+        return s
+
+
+def parse_modelines(data):
+    '''return a list of ModeLines from the NUL-separated modelines as returned
+    by NV_CTRL_BINARY_DATA_MODELINES; the buffer is parsed in a single pass.'''
+    return map(ModeLine, _MODELINE_RE.finditer(data))
+
+
+if __name__ == '__main__':
+    data = '\0'.join([
+        'source=xconfig :: "1024x768" 65.00 1024 1048 1184 1344 768 771 777 806 -hsync -vsync',
+        'source=edid, xconfig-name=foo :: "1280x1024_60" 108.000 1280 1328 1440 1688 1024 1025 1028 1066 +hsync +vsync',
+        '"640x480" 12.587 640 656 720 800 480 490 492 524 -HSync -VSync Interlace',
+        '', ''])
+    mls = parse_modelines(data)
+    if len(mls) != 3:
+        print 'ERROR: number of modelines %d != 3'%len(mls)
+    if mls[0].name != '1024x768' or mls[0].size() != (1024, 768):
+        print 'ERROR: name or size of modeline: %s'%mls[0]
+    if mls[1].source() != 'edid' or mls[1].options.get('xconfig-name') != 'foo':
+        print 'ERROR: options of modeline: %s'%mls[1]
+    if int(round(mls[1].refresh())) != 60:
+        print 'ERROR: refresh rate %f != 60'%mls[1].refresh()
+    if mls[2].options or int(round(mls[2].refresh())) != 60:
+        print 'ERROR: interlaced modeline: %s'%mls[2]
+    if ModeLine(str(mls[1])).size() != mls[1].size():
+        print 'ERROR: modeline string conversion: %s'%mls[1]
+    print 'all tests done.'
+
+# vim:ts=4:sw=4:expandtab:
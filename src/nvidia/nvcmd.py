@@ -18,12 +18,13 @@
 # By using, editing and/or distributing this software you agree to
 # the terms and conditions of this license.
 
-_all = ['GPU', 'Screen', 'NVidiaControl', 'metamode_clone', 'metamode_add_extend' ]
+_all = ['GPU', 'Screen', 'NVidiaControl', 'metamode_clone', 'metamode_add_extend', 'metamode_plan', 'ModeLine', 'parse_modelines' ]
 
 import re
 from nvctrl import *
 from nvctrl import NVidiaControl as NVidiaControlLowLevel
 from metamodes import *
+from modelines import *
 
 __BUS_TYPES = ['AGP', 'PCI', 'PCI Express', 'Integrated']
 __OS_TYPES = ['Linux', 'FreeBSD', 'SunOS']
@@ -208,6 +209,12 @@ class NVidiaControl(NVidiaControlLowLevel):
         mls = self.query_binary_data(target, [display], NV_CTRL_BINARY_DATA_MODELINES)
         return filter(lambda x: x, mls.data.split('\0'))
 
+    def get_display_modes(self, target, display):
+        '''return a display device's supported ModeLines as a list of
+        ModeLine instances, see get_display_modelines().'''
+        mls = self.query_binary_data(target, [display], NV_CTRL_BINARY_DATA_MODELINES)
+        return parse_modelines(mls.data)
+
     def get_current_metamode(self, target):
         '''returns the metamode currently being used by the specified X
         screen. The MetaMode string has the same syntax as the MetaMode
@@ -304,6 +311,33 @@ class NVidiaControl(NVidiaControlLowLevel):
         mm = "index=%d :: %s"%(to, re.sub(r'^.*::\s*', r'', mm))
         res = self.set_string_attribute(target, [], NV_CTRL_STRING_MOVE_METAMODE, mm)
         return res.flags
+
+    def update_metamodes(self, target, ops):
+        '''execute the add, delete and move operations on MetaModes as
+        returned by metamode_plan() in a single round-trip. Returns a list
+        with the result of each operation: the id of an added MetaMode (or
+        -1), and whether a deletion or move succeeded.'''
+        settings = []
+        for op in ops:
+            mm = re.sub(r'^.*::\s*', r'', op[1].src or str(op[1]))
+            if op[0] == 'add':
+                settings.append(('operation', [], NV_CTRL_STRING_OPERATION_ADD_METAMODE, mm))
+            elif op[0] == 'delete':
+                settings.append(('string', [], NV_CTRL_STRING_DELETE_METAMODE, mm))
+            elif op[0] == 'move':
+                mm = "index=%d :: %s"%(op[2], mm)
+                settings.append(('string', [], NV_CTRL_STRING_MOVE_METAMODE, mm))
+            else:
+                raise ValueError('Unknown metamode operation: %s'%op[0])
+        results = []
+        for op, res in zip(ops, self.set_many(target, settings)):
+            if op[0] == 'add':
+                r = re.match('id=(\d+)', res.string)
+                if r: results.append(int(r.group(1)))
+                else: results.append(-1)
+            else:
+                results.append(res.flags)
+        return results
          
 
     def build_display_modepool(self, target, display, opt=None):
@@ -426,6 +460,16 @@ class NVidiaControl(NVidiaControlLowLevel):
         '''return current GPU scaling as [target, method].
         See set_gpu_scaling() for details.'''
         res = self.query_int_attribute(target, [display], NV_CTRL_GPU_SCALING)
+        return self._gpu_scaling(res)
+
+    def get_gpu_scalings(self, target, displays):
+        '''return current GPU scaling for each of the displays, as a list with
+        the same elements get_gpu_scaling() returns, in a single round-trip.'''
+        res = self.query_many([(target, [d], NV_CTRL_GPU_SCALING) for d in displays])
+        return map(self._gpu_scaling, res)
+
+    def _gpu_scaling(self, res):
+        '''return GPU scaling as [target, method] from a query reply'''
         if not res.flags: return False
         starget = res.value >> 16
         if starget == 1:   starget = 'native'
@@ -20,8 +20,7 @@
 # By using, editing and/or distributing this software you agree to
 # the terms and conditions of this license.
 
-import xnet
-import minx
+from x11 import xnet, minx
 
 from nvtarget import *
 
@@ -133,6 +132,60 @@ NV_CTRL_STRING_OPERATION_BUILD_MODEPOOL = 3   # /* DG  */
 NV_CTRL_STRING_OPERATION_LAST_ATTRIBUTE = NV_CTRL_STRING_OPERATION_BUILD_MODEPOOL
 
 
+###############################################################################
+# attribute cache. replies to queries of these attributes are kept by
+# NVidiaControl until they are changed through the same connection; values
+# that change by themselves, like temperatures and clocks, are not cached.
+# neither are NV_CTRL_PROBE_DISPLAYS, since querying it makes the driver
+# probe the displays again, and NV_CTRL_BINARY_DATA_EDID, which changes when
+# a monitor is swapped on the same connector; hotplug would go unnoticed.
+# keys are the kind of query ('int', 'string' or 'binary') and the attribute.
+#
+_CACHED_ATTRIBUTES = set([
+    ('int', NV_CTRL_ASSOCIATED_DISPLAY_DEVICES),
+    ('int', NV_CTRL_GPU_SCALING),
+    ('int', NV_CTRL_FLATPANEL_NATIVE_RESOLUTION),
+    ('int', NV_CTRL_MAX_DISPLAYS),
+    ('int', NV_CTRL_XINERAMA),
+    ('string', NV_CTRL_STRING_PRODUCT_NAME),
+    ('string', NV_CTRL_STRING_VBIOS_VERSION),
+    ('string', NV_CTRL_STRING_NVIDIA_DRIVER_VERSION),
+    ('string', NV_CTRL_STRING_DISPLAY_DEVICE_NAME),
+    ('string', NV_CTRL_STRING_CURRENT_METAMODE),
+    ('string', NV_CTRL_STRING_TWINVIEW_XINERAMA_INFO_ORDER),
+    ('binary', NV_CTRL_BINARY_DATA_MODELINES),
+    ('binary', NV_CTRL_BINARY_DATA_METAMODES) ])
+
+# cached attributes that become invalid when an attribute is set or a string
+# operation ('operation') is executed. writes that are not listed here
+# invalidate the whole cache.
+_CACHE_INVALIDATES = {
+    ('int', NV_CTRL_ASSOCIATED_DISPLAY_DEVICES): [
+        ('int', NV_CTRL_ASSOCIATED_DISPLAY_DEVICES),
+        ('int', NV_CTRL_FLATPANEL_NATIVE_RESOLUTION),
+        ('string', NV_CTRL_STRING_CURRENT_METAMODE),
+        ('binary', NV_CTRL_BINARY_DATA_MODELINES),
+        ('binary', NV_CTRL_BINARY_DATA_METAMODES) ],
+    ('int', NV_CTRL_GPU_SCALING): [
+        ('int', NV_CTRL_GPU_SCALING) ],
+    ('string', NV_CTRL_STRING_ADD_METAMODE): [
+        ('binary', NV_CTRL_BINARY_DATA_METAMODES) ],
+    ('string', NV_CTRL_STRING_DELETE_METAMODE): [
+        ('string', NV_CTRL_STRING_CURRENT_METAMODE),
+        ('binary', NV_CTRL_BINARY_DATA_METAMODES) ],
+    ('string', NV_CTRL_STRING_MOVE_METAMODE): [
+        ('binary', NV_CTRL_BINARY_DATA_METAMODES) ],
+    ('string', NV_CTRL_STRING_TWINVIEW_XINERAMA_INFO_ORDER): [
+        ('string', NV_CTRL_STRING_TWINVIEW_XINERAMA_INFO_ORDER) ],
+    ('operation', NV_CTRL_STRING_OPERATION_ADD_METAMODE): [
+        ('binary', NV_CTRL_BINARY_DATA_METAMODES) ],
+    ('operation', NV_CTRL_STRING_OPERATION_BUILD_MODEPOOL): [
+        ('int', NV_CTRL_FLATPANEL_NATIVE_RESOLUTION),
+        ('binary', NV_CTRL_BINARY_DATA_MODELINES) ],
+    ('operation', NV_CTRL_STRING_OPERATION_GTF_MODELINE): [],
+    ('operation', NV_CTRL_STRING_OPERATION_CVT_MODELINE): [] }
+
+
 ###############################################################################
 # NV-CONTROL major op numbers. these constants identify the request type
 #
@@ -140,6 +193,7 @@ _X_nvCtrlQueryExtension                  = 0
 _X_nvCtrlQueryAttribute                  = 2
 _X_nvCtrlQueryStringAttribute            = 4
 _X_nvCtrlQueryValidAttributeValues       = 5
+_X_nvCtrlSelectNotify                    = 6
 _X_nvCtrlSetStringAttribute              = 9
 _X_nvCtrlSetAttributeAndGetStatus        = 19
 _X_nvCtrlQueryBinaryData                 = 20
@@ -169,6 +223,8 @@ ATTRIBUTE_TYPE_X_SCREEN             = 0x20
 ATTRIBUTE_TYPE_XINERAMA             = 0x40
 ATTRIBUTE_TYPE_VCSC                 = 0x80
 
+ATTRIBUTE_CHANGED_EVENT             = 0
+
 
 
 
@@ -181,11 +237,13 @@ class _NVCtrlQueryExtensionRequest:
     constructor arg. the self.opcode can be obtained with
     an XQueryExtension'''
 
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'nv_opcode'),
+            minx.XData('CARD16',1,'length'))
+
     def __init__(self, opcode):
-        self.encoding = minx.encode(
-            minx.XData('CARD8',1,opcode),
-            minx.XData('CARD8',1,_X_nvCtrlQueryExtension),
-            minx.XData('CARD16',1,1))
+        self.encoding = self._format.pack(opcode, _X_nvCtrlQueryExtension, 1)
 
 
 class _NVCtrlQueryExtensionReply:
@@ -193,8 +251,7 @@ class _NVCtrlQueryExtensionReply:
     the major and minor versions of the NV-CONTROL extension
     (if supported, of course)'''
 
-    def __init__(self,encoding):
-        xreply, ad = minx.decode(encoding,
+    _format = minx.XStruct(
             minx.XData('BYTE',1,'type'),
             minx.XData('PAD',1,'padb1'),
             minx.XData('CARD16',1,'sequence_number'),
@@ -207,8 +264,51 @@ class _NVCtrlQueryExtensionReply:
             minx.XData('CARD32',1,'padl7'),
             minx.XData('CARD32',1,'padl8'))
 
-        for n, v in xreply.iteritems():
-            setattr( self, n, v )
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
+
+
+###############################################################################
+# NV-CONTROL Select Notify and the attribute changed event
+#
+class _NVCtrlSelectNotifyRequest:
+    '''this class wraps the NV-CONTROL select notify request, which
+    enables or disables events of a type for an X screen. it has
+    no reply.'''
+
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'nv_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD32',1,'screen'),
+            minx.XData('CARD16',1,'notify_type'),
+            minx.XData('CARD16',1,'onoff'))
+
+    def __init__(self,opcode,screen,notify_type,onoff):
+        self.encoding = self._format.pack(opcode, _X_nvCtrlSelectNotify, 3,
+            screen, notify_type, onoff)
+
+
+class _NVCtrlAttributeChangedEvent:
+    '''the event sent when an attribute has changed, after it was
+    enabled with NVCtrlSelectNotify.'''
+
+    _format = minx.XStruct(
+            minx.XData('BYTE',1,'type'),
+            minx.XData('BYTE',1,'detail'),
+            minx.XData('CARD16',1,'sequence_number'),
+            minx.XData('CARD32',1,'time'),
+            minx.XData('CARD32',1,'screen'),
+            minx.XData('CARD32',1,'display_mask'),
+            minx.XData('CARD32',1,'attribute'),
+            minx.XData('INT32',1,'value'),
+            minx.XData('CARD32',1,'pad0'),
+            minx.XData('CARD32',1,'pad1'))
+
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
 
 
 ###############################################################################
@@ -224,15 +324,18 @@ class _NVCtrlQueryAttributeRequest:
     returns the value of an integer driver attr. this
     one can raise Value Error and Match error. see NVCtrlLib.h'''
 
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'nv_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD16',1,'target_id'),
+            minx.XData('CARD16',1,'target_type'),
+            minx.XData('CARD32',1,'display_mask'),
+            minx.XData('CARD32',1,'attr'))
+
     def __init__(self,opcode,target_id,target_type,display_mask,attr):
-        self.encoding = minx.encode(
-            minx.XData('CARD8',1,opcode),
-            minx.XData('CARD8',1,_X_nvCtrlQueryAttribute),
-            minx.XData('CARD16',1,4),
-            minx.XData('CARD16',1,target_id),
-            minx.XData('CARD16',1,target_type),
-            minx.XData('CARD32',1,display_mask),
-            minx.XData('CARD32',1,attr))
+        self.encoding = self._format.pack(opcode, _X_nvCtrlQueryAttribute, 4,
+            target_id, target_type, display_mask, attr)
         
 
 class _NVCtrlQueryAttributeReply:
@@ -240,8 +343,7 @@ class _NVCtrlQueryAttributeReply:
     the value and the flags, which describe whether attr
     is read-only, etc. see NVCtrlLib.h'''
 
-    def __init__(self,encoding):
-        xreply, ad = minx.decode(encoding,
+    _format = minx.XStruct(
             minx.XData('BYTE',1,'type'),
             minx.XData('BYTE',1,'pad0'),
             minx.XData('CARD16',1,'sequence_number'),
@@ -253,27 +355,31 @@ class _NVCtrlQueryAttributeReply:
             minx.XData('CARD32',1,'pad6'),
             minx.XData('CARD32',1,'pad7'))
 
-        for n, v in xreply.iteritems():
-            setattr( self, n, v )
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
 
 
 ###############################################################################
 # NV-CONTROL Set Attribute And Get Status
 #
 class _NVCtrlSetAttributeAndGetStatusRequest:
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'nv_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD32',1,'screen'),
+            minx.XData('CARD32',1,'display_mask'),
+            minx.XData('CARD32',1,'attr'),
+            minx.XData('INT32',1,'value'))
+
     def __init__(self,opcode,screen,display_mask,attr,value):
-        self.encoding = minx.encode(
-            minx.XData('CARD8',1,opcode),
-            minx.XData('CARD8',1,_X_nvCtrlSetAttributeAndGetStatus),
-            minx.XData('CARD16',1,5),
-            minx.XData('CARD32',1,screen),
-            minx.XData('CARD32',1,display_mask),
-            minx.XData('CARD32',1,attr),
-            minx.XData('INT32',1,value))
+        self.encoding = self._format.pack(opcode,
+            _X_nvCtrlSetAttributeAndGetStatus, 5, screen, display_mask, attr,
+            value)
 
 class _NVCtrlSetAttributeAndGetStatusReply:
-    def __init__(self,encoding):
-        xreply, ad = minx.decode(encoding,
+    _format = minx.XStruct(
             minx.XData('BYTE',1,'type'),
             minx.XData('BYTE',1,'pad0'),
             minx.XData('CARD16',1,'sequence_number'),
@@ -285,8 +391,9 @@ class _NVCtrlSetAttributeAndGetStatusReply:
             minx.XData('CARD32',1,'pad6'),
             minx.XData('CARD32',1,'pad7'))
 
-        for n, v in xreply.iteritems():
-            setattr( self, n, v )
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
 
 
 
@@ -300,12 +407,15 @@ class _NVCtrlQueryTargetCountRequest:
     explained in NVCtrl.h. this request will return a count of
     the gpu's on the system, for example, with target type 1'''
 
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'nv_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD32',1,'target'))
+
     def __init__(self, opcode, target):
-        self.encoding = minx.encode(
-            minx.XData('CARD8',1,opcode),
-            minx.XData('CARD8',1,_X_nvCtrlQueryTargetCount),
-            minx.XData('CARD16',1,2),
-            minx.XData('CARD32',1,target))
+        self.encoding = self._format.pack(opcode, _X_nvCtrlQueryTargetCount,
+            2, target)
 
 
 class _NVCtrlQueryTargetCountReply:
@@ -314,8 +424,7 @@ class _NVCtrlQueryTargetCountReply:
     if the target type does not exist at all, so check for errors
     if u query something that might not be there'''
 
-    def __init__(self,encoding):
-        xreply, ad = minx.decode(encoding,
+    _format = minx.XStruct(
             minx.XData('BYTE',1,'type'),
             minx.XData('PAD',1,'padb1'),
             minx.XData('CARD16',1,'sequence_number'),
@@ -327,8 +436,9 @@ class _NVCtrlQueryTargetCountReply:
             minx.XData('CARD32',1,'padl7'),
             minx.XData('CARD32',1,'padl8'))
 
-        for n, v in xreply.iteritems():
-            setattr( self, n, v )
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
 
 
 ###############################################################################
@@ -344,15 +454,18 @@ class _NVCtrlQueryBinaryDataRequest:
     returns the value of an integer driver attr. this
     one can raise Value Error and Match error. see NVCtrlLib.h'''
 
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'nv_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD16',1,'target_id'),
+            minx.XData('CARD16',1,'target_type'),
+            minx.XData('CARD32',1,'display_mask'),
+            minx.XData('CARD32',1,'attr'))
+
     def __init__(self,opcode,target_id,target_type,display_mask,attr):
-        self.encoding = minx.encode(
-            minx.XData('CARD8',1,opcode),
-            minx.XData('CARD8',1,_X_nvCtrlQueryBinaryData),
-            minx.XData('CARD16',1,4),
-            minx.XData('CARD16',1,target_id),
-            minx.XData('CARD16',1,target_type),
-            minx.XData('CARD32',1,display_mask),
-            minx.XData('CARD32',1,attr))
+        self.encoding = self._format.pack(opcode, _X_nvCtrlQueryBinaryData,
+            4, target_id, target_type, display_mask, attr)
  
 
 class _NVCtrlQueryBinaryDataReply:
@@ -361,8 +474,7 @@ class _NVCtrlQueryBinaryDataReply:
     if the target type does not exist at all, so check for errors
     if u query something that might not be there'''
 
-    def __init__(self,encoding):
-        xreply, ad = minx.decode(encoding,
+    _format = minx.XStruct(
             minx.XData('BYTE',1,'type'),
             minx.XData('PAD',1,'pad0'),
             minx.XData('CARD16',1,'sequence_number'),
@@ -372,14 +484,12 @@ class _NVCtrlQueryBinaryDataReply:
             minx.XData('CARD32',1,'pad4'),
             minx.XData('CARD32',1,'pad5'),
             minx.XData('CARD32',1,'pad6'),
-            minx.XData('CARD32',1,'pad7'))
-
-        for n, v in xreply.iteritems():
-            setattr( self, n, v )
+            minx.XData('CARD32',1,'pad7'),
+            minx.XData('STRING8','n','data'))
 
-        rs, ad = minx.decode(ad,
-            minx.XData('STRING8',self.n,'data'))
-        self.data = str(rs['data'])
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
 
 
 ###############################################################################
@@ -389,15 +499,19 @@ class _NVCtrlQueryStringAttributeRequest:
     '''this is the string version of Query Attribute. works
     just like the int version, only the reply is different'''
 
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'nv_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD16',1,'target_id'),
+            minx.XData('CARD16',1,'target_type'),
+            minx.XData('CARD32',1,'display_mask'),
+            minx.XData('CARD32',1,'attr'))
+
     def __init__(self,opcode,target_id,target_type,display_mask,attr):
-        self.encoding = minx.encode(
-            minx.XData('CARD8',1,opcode),
-            minx.XData('CARD8',1,_X_nvCtrlQueryStringAttribute),
-            minx.XData('CARD16',1,4),
-            minx.XData('CARD16',1,target_id),
-            minx.XData('CARD16',1,target_type),
-            minx.XData('CARD32',1,display_mask),
-            minx.XData('CARD32',1,attr))
+        self.encoding = self._format.pack(opcode,
+            _X_nvCtrlQueryStringAttribute, 4, target_id, target_type,
+            display_mask, attr)
 
 class _NVCtrlQueryStringAttributeReply:
     '''the reply to NVCtrlQueryStringAttribute request. returns
@@ -408,8 +522,7 @@ class _NVCtrlQueryStringAttributeReply:
     'length' field is equiv to X 'size' field, 'n' is equiv
     to X 'string length' field'''
 
-    def __init__(self,encoding):
-        xreply, ad = minx.decode( encoding,
+    _format = minx.XStruct(
             minx.XData('BYTE',1,'type'),
             minx.XData('BYTE',1,'pad0'),
             minx.XData('CARD16',1,'sequence_number'),
@@ -419,14 +532,12 @@ class _NVCtrlQueryStringAttributeReply:
             minx.XData('CARD32',1,'pad4'),
             minx.XData('CARD32',1,'pad5'),
             minx.XData('CARD32',1,'pad6'),
-            minx.XData('CARD32',1,'pad7'))
+            minx.XData('CARD32',1,'pad7'),
+            minx.XData('STRING8','n','string'))
 
-        for n, v in xreply.iteritems():
-            setattr( self, n, v )
-
-        rs, ad = minx.decode(ad,
-            minx.XData('STRING8',self.n,'string'))
-        self.string = str(rs['string'])
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
         if self.string is not None and self.string.endswith('\0'): self.string = self.string[:-1]
 
 
@@ -434,22 +545,25 @@ class _NVCtrlQueryStringAttributeReply:
 # NV-CONTROL Set String Attribute
 #
 class _NVCtrlSetStringAttributeRequest:
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'nv_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD32',1,'screen'),
+            minx.XData('CARD32',1,'display_mask'),
+            minx.XData('CARD32',1,'attr'),
+            minx.XData('CARD32',1,'n'),
+            minx.XData('STRING8','n','data'))
+
     def __init__(self,opcode,screen,display_mask,attr,data):
         dlen = len(data)+1 #include terminating 0
-        self.encoding = minx.encode(
-            minx.XData('CARD8',1,opcode),
-            minx.XData('CARD8',1,_X_nvCtrlSetStringAttribute),
-            minx.XData('CARD16',1,5 + (((dlen+3)&~3) >> 2) ),
-            minx.XData('CARD32',1,screen),
-            minx.XData('CARD32',1,display_mask),
-            minx.XData('CARD32',1,attr),
-            minx.XData('CARD32',1,dlen),
-            minx.XData('STRING8',dlen,data+'\0'))
+        self.encoding = self._format.pack(opcode,
+            _X_nvCtrlSetStringAttribute, 5 + (((dlen+3)&~3) >> 2), screen,
+            display_mask, attr, dlen, data+'\0')
 
 
 class _NVCtrlSetStringAttributeReply:
-    def __init__(self,encoding):
-        xreply, ad = minx.decode(encoding,
+    _format = minx.XStruct(
             minx.XData('BYTE',1,'type'),
             minx.XData('BYTE',1,'pad0'),
             minx.XData('CARD16',1,'sequence_number'),
@@ -461,8 +575,9 @@ class _NVCtrlSetStringAttributeReply:
             minx.XData('CARD32',1,'pad6'),
             minx.XData('CARD32',1,'pad7'))
 
-        for n, v in xreply.iteritems():
-            setattr( self, n, v )
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
 
 
 ###############################################################################
@@ -473,15 +588,19 @@ class _NVCtrlQueryValidAttributeValuesRequest:
     which tells us whether or not the attr is present, and if so,
     what the valid values for it are'''
 
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'nv_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD16',1,'target_id'),
+            minx.XData('CARD16',1,'target_type'),
+            minx.XData('CARD32',1,'display_mask'),
+            minx.XData('CARD32',1,'attr'))
+
     def __init__(self,opcode,target_id,target_type,display_mask,attr):
-        self.encoding = minx.encode(
-            minx.XData('CARD8',1,opcode),
-            minx.XData('CARD8',1,_X_nvCtrlQueryValidAttributeValues),
-            minx.XData('CARD16',1,4),
-            minx.XData('CARD16',1,target_id),
-            minx.XData('CARD16',1,target_type),
-            minx.XData('CARD32',1,display_mask),
-            minx.XData('CARD32',1,attr))
+        self.encoding = self._format.pack(opcode,
+            _X_nvCtrlQueryValidAttributeValues, 4, target_id, target_type,
+            display_mask, attr)
 
 
 class _NVCtrlQueryValidAttributeValuesReply:
@@ -489,8 +608,7 @@ class _NVCtrlQueryValidAttributeValuesReply:
     the value and the flags, which describe whether attr
     is read-only, etc. see NVCtrlLib.h'''
 
-    def __init__(self,encoding):
-        xreply, ad = minx.decode(encoding,
+    _format = minx.XStruct(
             minx.XData('BYTE',1,'type'),
             minx.XData('BYTE',1,'pad0'),
             minx.XData('CARD16',1,'sequence_number'),
@@ -502,35 +620,39 @@ class _NVCtrlQueryValidAttributeValuesReply:
             minx.XData('CARD32',1,'bits'),
             minx.XData('CARD32',1,'perms'))
 
-        for n, v in xreply.iteritems():
-            setattr( self, n, v )
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
 
 
 ###############################################################################
 # NV-CONTROL String Operation
 #
 class _NVCtrlStringOperationRequest:
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'nv_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD16',1,'target_id'),
+            minx.XData('CARD16',1,'target_type'),
+            minx.XData('CARD32',1,'display_mask'),
+            minx.XData('CARD32',1,'attr'),
+            minx.XData('CARD32',1,'n'),
+            minx.XData('STRING8','n','data'))
+
     def __init__(self,opcode,target_id,target_type,display_mask,attr,data):
         dlen = 0
         if data and len(data) > 0:
             dlen = len(data)+1 #include terminating 0
         else:
             data = ''
-        self.encoding = minx.encode(
-            minx.XData('CARD8',1,opcode),
-            minx.XData('CARD8',1,_X_nvCtrlStringOperation),
-            minx.XData('CARD16',1,5 + (((dlen+3)&~3) >> 2) ),
-            minx.XData('CARD16',1,target_id),
-            minx.XData('CARD16',1,target_type),
-            minx.XData('CARD32',1,display_mask),
-            minx.XData('CARD32',1,attr),
-            minx.XData('CARD32',1,dlen),
-            minx.XData('STRING8',dlen,data+'\0'))
+        self.encoding = self._format.pack(opcode, _X_nvCtrlStringOperation,
+            5 + (((dlen+3)&~3) >> 2), target_id, target_type, display_mask,
+            attr, dlen, data+'\0')
 
 
 class _NVCtrlStringOperationReply:
-    def __init__(self,encoding):
-        xreply, ad = minx.decode(encoding,
+    _format = minx.XStruct(
             minx.XData('BYTE',1,'type'),
             minx.XData('BYTE',1,'padb1'),
             minx.XData('CARD16',1,'sequence_number'),
@@ -540,14 +662,12 @@ class _NVCtrlStringOperationReply:
             minx.XData('CARD32',1,'padl4'),
             minx.XData('CARD32',1,'padl5'),
             minx.XData('CARD32',1,'padl6'),
-            minx.XData('CARD32',1,'padl7'))
-
-        for n, v in xreply.iteritems():
-            setattr( self, n, v )
+            minx.XData('CARD32',1,'padl7'),
+            minx.XData('STRING8','n','string'))
 
-        rs, ad = minx.decode(ad,
-            minx.XData('STRING8',self.n,'string'))
-        self.string = str(rs['string'])
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
 
 
 ###############################################################################
@@ -558,15 +678,20 @@ class NVidiaControl:
     xsock = None    # X connection socket
     xscreen = None  # X screen
     opcode = None   # major opcode for X extension
+    first_event = None # event code of first event of X extension
     version = None  # NV-CONTROL extension version
 
     gpucount = 0    # number of GPUs in the system
 
+    cache_hits = 0      # number of queries answered from the cache
+    cache_misses = 0    # number of cacheable queries sent to the X server
+
 
     def __init__(self):
         '''Initialise the nVidia control extension. A KeyError is raised if no
         nVidia extension could be found, a ValueError is raised if it was
         found but found unsuitable.'''
+        self._cache = {}
         self.init_NV_CONTROL()
 
     def init_NV_CONTROL(self):
@@ -579,6 +704,7 @@ class NVidiaControl:
         try:
             NVCtrl = minx.XQueryExtension(self.xsock, 'NV-CONTROL')
             self.opcode = NVCtrl.major_opcode
+            self.first_event = NVCtrl.first_event
         except Exception,e:
             self.xsock.close()
             raise e
@@ -615,27 +741,45 @@ class NVidiaControl:
             return self.version
 
         rq = _NVCtrlQueryExtensionRequest(self.opcode)
-        binrp = minx.Xchange(self.xsock, rq)
-
-        if binrp[0] == 0:
-            raise minx.XServerError(binrp)
-        else:
-            nvc = _NVCtrlQueryExtensionReply(binrp)
-            self.version = (nvc.major,nvc.minor)
-            return self.version
+        nvc = minx.Xchange(self.xsock, rq, _NVCtrlQueryExtensionReply)
+        self.version = (nvc.major,nvc.minor)
+        return self.version
 
 
     def query_int_attribute(self, target, displays, attr):
         '''return the value of an integer attribute'''
         display_mask = self._displays2mask(displays)
+        key = self._cache_key('int', target, display_mask, attr)
+        if key in self._cache: return self._cache_hit(key)
+        self._cache_miss(key)
         rq = _NVCtrlQueryAttributeRequest(self.opcode, target.id(),
             target.type(), display_mask, attr)
-        binrp = minx.Xchange(self.xsock, rq)
-
-        if binrp[0] == 0:
-            raise minx.XServerError(binrp)
-        else:
-            return _NVCtrlQueryAttributeReply(binrp)
+        return self._cache_store(key,
+            minx.Xchange(self.xsock, rq, _NVCtrlQueryAttributeReply))
+
+
+    def query_many(self, queries):
+        '''return the values of several integer attributes at once. queries
+        is a list of (target, displays, attr) tuples; all requests are sent
+        together and their replies are returned as a list in the same order.
+        Cached values are not requested again.'''
+        results = []
+        keys = []
+        for target, displays, attr in queries:
+            display_mask = self._displays2mask(displays)
+            key = self._cache_key('int', target, display_mask, attr)
+            if key in self._cache:
+                results.append(self._cache_hit(key))
+                continue
+            rq = _NVCtrlQueryAttributeRequest(self.opcode, target.id(),
+                target.type(), display_mask, attr)
+            self.xsock.enqueue(rq, _NVCtrlQueryAttributeReply)
+            self._cache_miss(key)
+            results.append(None)
+            keys.append((len(results)-1, key))
+        for (i, key), reply in zip(keys, self._flush()):
+            results[i] = self._cache_store(key, reply)
+        return results
 
 
     def set_int_attribute(self, target, displays, attr, value):
@@ -644,27 +788,22 @@ class NVidiaControl:
             raise ValueError( 'SetIntAttribute can only be executed on a screen' )
 
         display_mask = self._displays2mask(displays)
+        self.invalidate_cache('int', attr)
         rq = _NVCtrlSetAttributeAndGetStatusRequest(self.opcode, target.id(),
             display_mask, attr, value)
-        binrp = minx.Xchange(self.xsock, rq)
-
-        if binrp[0] == 0:
-            raise minx.XServerError(binrp)
-        else:
-            return _NVCtrlSetAttributeAndGetStatusReply(binrp)
+        return minx.Xchange(self.xsock, rq, _NVCtrlSetAttributeAndGetStatusReply)
 
 
     def query_string_attribute(self, target, displays, attr):
         '''return the value of a string attribute'''
         display_mask = self._displays2mask(displays)
+        key = self._cache_key('string', target, display_mask, attr)
+        if key in self._cache: return self._cache_hit(key)
+        self._cache_miss(key)
         rq = _NVCtrlQueryStringAttributeRequest(self.opcode, target.id(),
             target.type(), display_mask, attr)
-        binrp = minx.Xchange(self.xsock, rq)
-
-        if binrp[0] == 0:
-            raise minx.XServerError(binrp)
-        else:
-            return _NVCtrlQueryStringAttributeReply(binrp)
+        return self._cache_store(key,
+            minx.Xchange(self.xsock, rq, _NVCtrlQueryStringAttributeReply))
 
 
     def set_string_attribute(self, target, displays, attr, data):
@@ -673,50 +812,60 @@ class NVidiaControl:
             raise ValueError( 'SetStringAttribute can only be executed on a screen' )
 
         display_mask = self._displays2mask(displays)
+        self.invalidate_cache('string', attr)
         rq = _NVCtrlSetStringAttributeRequest(self.opcode, target.id(),
             display_mask, attr, data)
-        binrp = minx.Xchange(self.xsock, rq)
+        return minx.Xchange(self.xsock, rq, _NVCtrlSetStringAttributeReply)
 
-        if binrp[0] == 0:
-            raise minx.XServerError(binrp)
-        else:
-            return _NVCtrlSetStringAttributeReply(binrp)
+
+    def set_many(self, target, settings):
+        '''set several string attributes and execute string operations at
+        once. settings is a list of (kind, displays, attr, data) tuples, where
+        kind is 'string' for set_string_attribute() or 'operation' for
+        string_operation(). All requests are sent together and their replies
+        are returned as a list in the same order. target has to be a Screen.'''
+        if not isinstance(target, Screen):
+            raise ValueError( 'SetStringAttribute can only be executed on a screen' )
+
+        for kind, displays, attr, data in settings:
+            display_mask = self._displays2mask(displays)
+            self.invalidate_cache(kind, attr)
+            if kind == 'string':
+                rq = _NVCtrlSetStringAttributeRequest(self.opcode, target.id(),
+                    display_mask, attr, data)
+                self.xsock.enqueue(rq, _NVCtrlSetStringAttributeReply)
+            elif kind == 'operation':
+                rq = _NVCtrlStringOperationRequest(self.opcode, target.id(),
+                    target.type(), display_mask, attr, data)
+                self.xsock.enqueue(rq, _NVCtrlStringOperationReply)
+            else:
+                raise ValueError( 'Unknown kind of setting: %s'%kind )
+        return self._flush()
 
 
     def query_target_count(self, target):
         '''return the target count'''
         rq = _NVCtrlQueryTargetCountRequest(self.opcode, target.type())
-        binrp = minx.Xchange(self.xsock, rq)
-
-        if binrp[0] == 0:
-            raise minx.XServerError(binrp)
-        else:
-            return _NVCtrlQueryTargetCountReply(binrp)
+        return minx.Xchange(self.xsock, rq, _NVCtrlQueryTargetCountReply)
 
 
     def query_binary_data(self, target, displays, attr):
         '''return binary data'''
         display_mask = self._displays2mask(displays)
+        key = self._cache_key('binary', target, display_mask, attr)
+        if key in self._cache: return self._cache_hit(key)
+        self._cache_miss(key)
         rq = _NVCtrlQueryBinaryDataRequest(self.opcode, target.id(),
             target.type(), display_mask, attr)
-        binrp = minx.Xchange(self.xsock, rq)
-
-        if binrp[0] == 0:
-            raise minx.XServerError(binrp)
-        else:
-            return _NVCtrlQueryBinaryDataReply(binrp)
+        return self._cache_store(key,
+            minx.Xchange(self.xsock, rq, _NVCtrlQueryBinaryDataReply))
 
 
     def query_valid_attr_values(self, target, displays, attr):
         display_mask = self._displays2mask(displays)
         rq = _NVCtrlQueryValidAttributeValuesRequest(self.opcode, target.id(),
             target.type(), display_mask, attr)
-        binrp = minx.Xchange(self.xsock, rq)
-
-        if binrp[0] == 0:
-            raise minx.XServerError(binrp)
-        else:
-            return _NVCtrlQueryValidAttributeValuesReply(binrp)
+        return minx.Xchange(self.xsock, rq, _NVCtrlQueryValidAttributeValuesReply)
 
 
     def get_valid_attr_values(self, target, attr):
@@ -732,14 +881,78 @@ class NVidiaControl:
     def string_operation(self, target, displays, attr, data):
         '''execute a string operation'''
         display_mask = self._displays2mask(displays)
+        self.invalidate_cache('operation', attr)
         rq = _NVCtrlStringOperationRequest(self.opcode, target.id(),
             target.type(), display_mask, attr, data)
-        binrp = minx.Xchange(self.xsock, rq)
+        return minx.Xchange(self.xsock, rq, _NVCtrlStringOperationReply)
 
-        if binrp[0] == 0:
-            raise minx.XServerError(binrp)
-        else:
-            return _NVCtrlStringOperationReply(binrp)
+
+    def select_notify(self, target, onoff=True):
+        '''enable or disable attribute changed events for an X screen, which
+        are returned by next_attribute_event().'''
+        if not isinstance(target, Screen):
+            raise ValueError( 'SelectNotify can only be executed on a screen' )
+        rq = _NVCtrlSelectNotifyRequest(self.opcode, target.id(),
+            ATTRIBUTE_CHANGED_EVENT, int(onoff))
+        minx.Xchange(self.xsock, rq)
+
+
+    def next_attribute_event(self, timeout=None):
+        '''wait for an attribute changed event for at most timeout seconds
+        (forever if None) and return it, or None when none arrived. Other
+        events are discarded.'''
+        while True:
+            event = self.xsock.next_event(timeout)
+            if not event: return None
+            if ord(event[0]) & 0x7f == self.first_event + ATTRIBUTE_CHANGED_EVENT:
+                return _NVCtrlAttributeChangedEvent(event)
+
+
+    def invalidate_cache(self, kind=None, attr=None):
+        '''forget cached attribute values. When kind ('int', 'string' or
+        'operation') and attr of a write are given, only the attributes
+        affected by it are forgotten, otherwise the whole cache is cleared.
+        This is also needed when the configuration is changed by other means,
+        like XRandR.'''
+        if (kind, attr) not in _CACHE_INVALIDATES:
+            self._cache.clear()
+            return
+        affected = _CACHE_INVALIDATES[(kind, attr)]
+        for key in self._cache.keys():
+            if (key[0], key[4]) in affected:
+                del self._cache[key]
+
+
+    def _cache_key(self, kind, target, display_mask, attr):
+        '''return the key of a query in the cache, or None if its reply
+        is not to be cached.'''
+        if (kind, attr) not in _CACHED_ATTRIBUTES: return None
+        return (kind, target.type(), target.id(), display_mask, attr)
+
+    def _cache_hit(self, key):
+        '''return a cached reply'''
+        self.cache_hits += 1
+        return self._cache[key]
+
+    def _cache_miss(self, key):
+        '''count a query that is sent to the X server when it is to be
+        cached'''
+        if key: self.cache_misses += 1
+
+    def _cache_store(self, key, reply):
+        '''store a reply in the cache when it is to be cached; returns it'''
+        if key: self._cache[key] = reply
+        return reply
+
+
+    def _flush(self):
+        '''send all queued requests and return their replies; raises the
+        first error encountered, if any.'''
+        replies = self.xsock.flush()
+        for r in replies:
+            if isinstance(r, minx.XServerError):
+                raise r
+        return replies
 
 
     def _displays2mask(self, displays):
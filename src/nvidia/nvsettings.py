@@ -17,7 +17,7 @@ _all = ['NVidiaSettings', 'Screen', 'GPU']
 
 import os
 import re
-import xnet
+from x11 import xnet
 import socket
 from nvtarget import *
 
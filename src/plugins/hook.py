@@ -17,6 +17,7 @@ import os
 import logging
 import subprocess
 from plugin import Plugin
+from switcher.layout import layout_displays
 
 class Hook(Plugin):
     '''A hook is a plugin that executes an external command'''
@@ -46,19 +47,12 @@ class Hook(Plugin):
         hdisplays = self._translate_displays(displays)
         self._env['DISPER_DISPLAYS'] = ' '.join(hdisplays)
         self._env['DISPER_LAYOUT'] = layout
-        bb = [0,0]
+        sizes = {}
+        for d in displays: sizes[d] = resolutions[d].size()
+        positions, bb = layout_displays(displays, sizes, layout)
         for i in range(len(displays)):
-            # TODO move computation to switcher/resolutions.py:ResolutionSelection
-            r = resolutions[displays[i]].size()
-            if layout in ['right','left']:
-                bb[0] += r[0]
-                bb[1] = max(bb[1], r[1])
-            else:
-                bb[1] += r[1]
-                bb[0] = max(bb[0], r[0])
             self._env['DISPER_RESOLUTION_'+hdisplays[i]] = str(resolutions[displays[i]])
-            # position is backend-dependant, we don't know it here :(
-            #self._env['DISPER_POSITION_'+hdisplays[i]] = ''
+            self._env['DISPER_POSITION_'+hdisplays[i]] = '%d,%d'%positions[displays[i]]
         self._env['DISPER_BB_RESOLUTION'] = 'x'.join(map(str, bb))
 
     def call(self, stage):
@@ -16,13 +16,17 @@
 import logging
 
 from edid import Edid
+from cache import DisplayCache
 from resolutions import *
+from layout import layout_displays
 
 class Switcher:
 
     _displays = None
     _resolutions = ResolutionCollection()
+    _cache = None
     backend = None
+    _refresh_rate = None
 
     def __init__(self):
         '''Initialise the switcher and find a backend'''
@@ -60,16 +64,33 @@ class Switcher:
     #def get_display_supported_res(self, ndisp):
     #def get_display_preferred_res(self, ndisp):
     #def get_display_edid(self, ndisp):
+    #def get_driver_version(self):
     #def switch_clone(self, displays, res):
     #def switch_extend(self, displays, direction, ress):
     #def import_config(self, cfg):
     #def export_config(self):
+    ## and these are optional
+    #def refresh(self, probe=True):
+    #def wait_display_event(self, timeout=None):
+    #def get_current_layout(self):
+    #def probe_displays(self, displays):
+    #def set_refresh_rate(self, rate):
 
     def __getattr__(self, name):
         '''Pass unrecognised methods to the switcher itself; this is to
         simulate binding to a parent class at runtime.'''
         return getattr(self.backend, name)
 
+    def refresh(self, probe=True):
+        '''forget all information obtained from the backend, so that it will
+        be probed again; needed when the switcher is used for a long time.
+        When probe is False, the backend may use what the display server
+        already knows instead of probing the hardware again.'''
+        self._displays = None
+        self._resolutions = ResolutionCollection()
+        if hasattr(self.backend, 'refresh'):
+            self.backend.refresh(probe=probe)
+
     def get_displays(self):
         '''return an array of connected displays'''
         # hash displays to avoid probing twice
@@ -84,35 +105,163 @@ class Switcher:
     def get_resolutions_display(self, disp):
         '''return a list of resolutions for the specified display'''
         # hash resolutions to avoid probing them twice
-        if disp in self._resolutions: return self._resolutions[disp]
-        # get supported resolutions from driver
-        r = ResolutionList(self.backend.get_display_supported_res(disp))
-        if len(r)==0:
-            r = ResolutionList('800x600, 640x480')
-            self.log.warning('no resolutions found for display %s, falling back to: %s'%(disp, r))
-        # bump weight of flat-panel display with 1000
-        res = self.backend.get_display_preferred_res(disp)
-        if res:
-            res = Resolution(res)
-            if res in r: r[r.index(res)].weight += 1000
-            else: r.append(res)
-        # bump weight of EDID resolutions with 100
-        edid_data = self.backend.get_display_edid(disp)
-        if edid_data:
-            edid = Edid(edid_data)
-            for d in edid.get_monitor_details():
-                title, info = d
-                if title != 'Detailed Timing': continue
-                res = Resolution([info['horizontal_active'], info['vertical_active']])
-                if res in r: r[r.index(res)].weight += 100
+        if disp not in self._resolutions:
+            self._probe_resolutions([disp])
+        return self._resolutions[disp]
+
+    def _probe_resolutions(self, displays):
+        '''find the resolutions of the displays and store them. Displays that
+        are not in the cache are probed by the backend all at once, when it
+        supports that.'''
+        edids = {}
+        probe = []
+        for disp in displays:
+            # known displays don't need to be probed
+            edid_data = edids[disp] = self.backend.get_display_edid(disp)
+            if edid_data:
+                r = self.get_cache().get(edid_data)
+                if r:
+                    self.log.info('resolutions of '+str(disp)+' (cached): '+', '.join(map(str,sorted(r))))
+                    self._resolutions[disp] = r
+                    continue
+            probe.append(disp)
+        if not probe: return
+        # get supported and preferred resolutions from driver
+        if hasattr(self.backend, 'probe_displays'):
+            probed = self.backend.probe_displays(probe)
+        else:
+            probed = {}
+            for disp in probe:
+                probed[disp] = (self.backend.get_display_supported_res(disp),
+                                self.backend.get_display_preferred_res(disp))
+        for disp in probe:
+            supported, preferred = probed[disp]
+            edid_data = edids[disp]
+            r = ResolutionList(supported)
+            if len(r)==0:
+                r = ResolutionList('800x600, 640x480')
+                self.log.warning('no resolutions found for display %s, falling back to: %s'%(disp, r))
+            # bump weight of flat-panel display with 1000
+            if preferred:
+                res = Resolution(preferred)
+                if res in r: r[r.index(res)].weight += 1000
                 else: r.append(res)
-        self.log.info('resolutions of '+str(disp)+': '+', '.join(map(str,sorted(r))))
-        self._resolutions[disp] = r
-        return r
+            # bump weight of EDID resolutions with 100
+            if edid_data:
+                edid = Edid(edid_data)
+                for d in edid.get_monitor_details():
+                    title, info = d
+                    if title != 'Detailed Timing': continue
+                    res = Resolution([info['horizontal_active'], info['vertical_active']])
+                    if res in r: r[r.index(res)].weight += 100
+                    else: r.append(res)
+                # and the detailed or native timings of extension blocks,
+                # only when the driver supports them
+                extra = ResolutionList()
+                for t in edid.get_all_timings():
+                    if t.source == 'edid': continue
+                    if t.source != 'cea' and not t.preferred: continue
+                    res = Resolution([t.width, t.height])
+                    if res in r and res not in extra: extra.append(res)
+                for res in extra: r[r.index(res)].weight += 100
+            self.log.info('resolutions of '+str(disp)+': '+', '.join(map(str,sorted(r))))
+            self._resolutions[disp] = r
+            if edid_data: self.get_cache().set(edid_data, r)
+
+    def get_cache(self):
+        '''return the DisplayCache for the current backend'''
+        if not self._cache:
+            self._cache = DisplayCache(self.backend.get_driver_version())
+        return self._cache
+
+    def watch(self, action, delay=1.0):
+        '''wait for displays to be connected or disconnected and call action
+        with the list of connected displays when that happens; this never
+        returns. Events that arrive within delay seconds of each other are
+        handled at once, since connecting a display often gives a burst.'''
+        if not hasattr(self.backend, 'wait_display_event'):
+            raise Exception('Watching displays is not supported by this backend')
+        # start listening and skip what happened before
+        while self.backend.wait_display_event(0): pass
+        displays = self.get_displays()
+        while True:
+            self.backend.wait_display_event()
+            while self.backend.wait_display_event(delay): pass
+            # the display server has just seen the change, no need to probe
+            self.refresh(probe=False)
+            newdisplays = self.get_displays()
+            if set(newdisplays) != set(displays):
+                self.log.info('connected displays changed: '+', '.join(newdisplays))
+                action(newdisplays)
+                displays = self.get_displays()
+            # skip events caused by probing and switching
+            while self.backend.wait_display_event(0): pass
+
+    def set_refresh_rate(self, rate):
+        '''set the refresh rate in Hz to switch displays to, or None for the
+        best one of each mode'''
+        self._refresh_rate = rate
+        if hasattr(self.backend, 'set_refresh_rate'):
+            self.backend.set_refresh_rate(rate)
+        elif rate is not None:
+            self.log.warning('selecting a refresh rate is not supported by this backend')
+
+    def switch_clone(self, displays, res):
+        '''switch to resolution and clone all displays, unless that is the
+        current configuration already'''
+        ress = ResolutionSelection(res, displays)
+        if self._is_current_layout(self._layout(displays, ress)):
+            self.log.info('displays already cloned at %s, not switching'%res)
+            return
+        return self.backend.switch_clone(displays, res)
+
+    def switch_extend(self, displays, direction, ress):
+        '''extend desktop across all displays, unless that is the current
+        configuration already. direction is one of 'left'/'right'/'bottom'/'top',
+        and ress a dict of a resolution for each display.'''
+        if self._is_current_layout(self._layout(displays, ress, direction)):
+            self.log.info('displays already extended %s, not switching'%direction)
+            return
+        return self.backend.switch_extend(displays, direction, ress)
+
+    def _layout(self, displays, ress, direction=None):
+        '''return the layout of displays with the resolutions from ress as a
+        dict with a tuple (Resolution, (x, y)) for each display, placed as
+        layout_displays() does.'''
+        sizes = {}
+        for disp in displays:
+            res = Resolution(ress[disp])
+            sizes[disp] = res.virtual or res.physical
+        positions, size = layout_displays(displays, sizes, direction)
+        layout = {}
+        for disp in displays:
+            layout[disp] = (Resolution(ress[disp]), positions[disp])
+        return layout
+
+    def _is_current_layout(self, layout):
+        '''return whether the layout, as returned by _layout(), is the active
+        configuration at the refresh rate set, if any; False if the backend
+        can't tell'''
+        if not hasattr(self.backend, 'get_current_layout'): return False
+        current = self.backend.get_current_layout()
+        if not current: return False
+        self.log.info('current layout: '+', '.join(map(lambda d:
+            '%s: %s +%d+%d'%(d, current[d][0], current[d][1][0], current[d][1][1]),
+            current)))
+        if dict(map(lambda d: (d, current[d][:2]), current)) != layout:
+            return False
+        # a backend that can't select a refresh rate wouldn't change it
+        if self._refresh_rate is None or not hasattr(self.backend, 'set_refresh_rate'):
+            return True
+        for d in current:
+            rate = current[d][2]
+            if rate is None or abs(rate - self._refresh_rate) >= 0.5: return False
+        return True
 
     def get_resolutions(self, displays):
         '''return a ResolutionCollection which is a hash with resolutions for
-        each display'''
+        each display; displays that need probing are probed together.'''
+        self._probe_resolutions(filter(lambda d: d not in self._resolutions, displays))
         res = ResolutionCollection()
         for disp in displays:
             res[disp] = self.get_resolutions_display(disp)
@@ -0,0 +1,152 @@
+##############################################################################
+# cache.py - persistent cache of display capabilities
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License at http://www.gnu.org/licenses/gpl.txt
+# By using, editing and/or distributing this software you agree to
+# the terms and conditions of this license.
+
+import os
+import logging
+try: from hashlib import sha1
+except ImportError: from sha import new as sha1
+
+from resolutions import *
+
+class DisplayCache:
+    '''an on-disk cache of the resolutions supported by displays. Displays are
+    identified by their EDID; the driver version is part of the key too, since
+    the driver determines which modes are valid. Each display has its own file
+    in the cache directory, which contains the EDID it was created for, so
+    that an entry is only used for the exact same display.'''
+
+    def __init__(self, driver, directory=None):
+        '''create a cache for displays on the driver given, which is a
+        string containing the backend and its version. The directory
+        defaults to disper's directory in XDG_CACHE_HOME.'''
+        self.log = logging.getLogger('disper.switcher.cache')
+        self.driver = driver
+        if not directory:
+            home = os.environ.get('HOME', '/')
+            directory = os.path.join(
+                os.environ.get('XDG_CACHE_HOME', os.path.join(home, '.cache')),
+                'disper', 'displays')
+        self.directory = directory
+
+    def get(self, edid):
+        '''return the ResolutionList stored for a display with the EDID data
+        given, or None if it isn't present.'''
+        filename = self._filename(edid)
+        if not os.path.exists(filename): return None
+        entry = {}
+        try:
+            f = open(filename, 'r')
+            try:
+                for l in f.readlines():
+                    key, sep, value = map(lambda s: s.strip(), l.partition(':'))
+                    entry[key] = value
+            finally:
+                f.close()
+            # validate entry, the EDID could have changed or hashes collide
+            if entry.get('edid') != edid.encode('hex'): return None
+            if entry.get('driver') != self.driver: return None
+            r = ResolutionList()
+            for v in entry['resolutions'].split(','):
+                res, sep, weight = v.partition('=')
+                r.append(Resolution(res.strip(), int(weight)))
+            return r
+        except (IOError, KeyError, ValueError, TypeError), e:
+            self.log.warning('ignoring invalid display cache entry %s: %s'%(filename, e))
+            return None
+
+    def set(self, edid, resolutions):
+        '''store the ResolutionList for a display with the EDID data given'''
+        filename = self._filename(edid)
+        try:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            # write to a temporary file first so that readers never see a
+            # partially written entry
+            f = open(filename + '.tmp', 'w')
+            try:
+                f.write('edid: %s\n'%edid.encode('hex'))
+                f.write('driver: %s\n'%self.driver)
+                f.write('resolutions: %s\n'%', '.join(
+                    map(lambda r: '%s=%d'%(r, r.weight), resolutions)))
+            finally:
+                f.close()
+            os.rename(filename + '.tmp', filename)
+        except (IOError, OSError), e:
+            self.log.warning('could not write display cache entry %s: %s'%(filename, e))
+
+    def _filename(self, edid):
+        '''return the name of the cache file for a display'''
+        return os.path.join(self.directory, sha1(edid + '\0' + self.driver).hexdigest())
+
+
+if __name__ == '__main__':
+    import shutil, tempfile
+    logging.disable(logging.WARNING)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        directory = os.path.join(tmpdir, 'displays')
+        cache = DisplayCache('nvidia 1.0', directory)
+        edid = '\0\xff\xff\xff\xff\xff\xff\0' + '\x12\x34' * 60
+        if cache.get(edid) != None:
+            print 'ERROR: entry found in empty cache'
+
+        rl = ResolutionList('1920x1080, 1280x1024, 800x600')
+        rl[0].weight = 1000
+        rl[2].weight = -5
+        cache.set(edid, rl)
+        r = cache.get(edid)
+        if r != rl:
+            print 'ERROR: cache round trip: %s'%r
+        elif [x.weight for x in r] != [1000, 0, -5]:
+            print 'ERROR: cache round trip weights: %s'%[x.weight for x in r]
+        if os.path.exists(cache._filename(edid) + '.tmp'):
+            print 'ERROR: temporary cache file left behind'
+
+        # other displays and drivers don't match
+        if cache.get(edid[:-1] + '\0') != None:
+            print 'ERROR: entry found for another EDID'
+        if DisplayCache('nvidia 2.0', directory).get(edid) != None:
+            print 'ERROR: entry found for another driver'
+        # an entry for another EDID with the same file name is not used
+        f = open(cache._filename(edid), 'r')
+        lines = f.readlines()
+        f.close()
+        f = open(cache._filename(edid), 'w')
+        f.write('edid: 00\n' + ''.join(lines[1:]))
+        f.close()
+        if cache.get(edid) != None:
+            print 'ERROR: entry used for a colliding EDID'
+
+        # invalid entries are ignored
+        for content in ['', 'garbage\n',
+                        'edid: %s\ndriver: nvidia 1.0\n'%edid.encode('hex'),
+                        'edid: %s\ndriver: nvidia 1.0\nresolutions: 800x600=x\n'%edid.encode('hex'),
+                        'edid: %s\ndriver: nvidia 1.0\nresolutions: 800y600=0\n'%edid.encode('hex')]:
+            f = open(cache._filename(edid), 'w')
+            f.write(content)
+            f.close()
+            if cache.get(edid) != None:
+                print 'ERROR: invalid cache entry used: %r'%content
+
+        # a directory that cannot be created is no error
+        f = open(os.path.join(tmpdir, 'file'), 'w')
+        f.close()
+        DisplayCache('nvidia 1.0', os.path.join(tmpdir, 'file', 'sub')).set(edid, rl)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print 'all tests done.'
+
+# vim:ts=4:sw=4:expandtab:
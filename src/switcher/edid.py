@@ -9,10 +9,11 @@
 
 ### FIXME recheck endianness for these structs
 
-from struct import pack, unpack
+from struct import Struct, unpack_from
+from collections import namedtuple
 
 ### EDID Header Magic
-EDID_HEADER = "\0\xFF\xFF\xFF\xFF\xFF\xFF\0" 
+EDID_HEADER = "\0\xFF\xFF\xFF\xFF\xFF\xFF\0"
 ### ASCII capital letter offset
 ASC = 64
 SERIAL_DT = "\0\0\0\xFF\0"
@@ -20,59 +21,133 @@ ASCII_DT = "\0\0\0\xFE\0"
 RANGE_DT = "\0\0\0\xFD\0"
 NAME_DT = "\0\0\0\xFC\0"
 
+### Layout of the 128 byte base block, decoded at once; the four 18 byte
+### descriptors at offset 54 are skipped and decoded when needed
+_BASE = Struct('>8sHHI9B10B3B8H72xBB')
+_BLOCK = Struct('128B')
+### Monitor descriptor: tag and text or range limits
+_DESCRIPTOR = Struct('5s13s')
+_RANGE_DT = Struct('5x4B')
+_MANUFACTURER_DT = Struct('3xB1x13B')
+DESCRIPTOR_OFFSET = 54
+DESCRIPTOR_SIZE = 18
+### Detailed timing descriptor, with the pixel clock in 10 kHz units
+_DTD = Struct('<H16B')
+_BYTE = Struct('B')
+### Extension blocks
+BLOCK_SIZE = 128
+CEA_EXT = 0x02
+DISPLAYID_EXT = 0x70
+_CEA_HEADER = Struct('4B')
+CEA_VIDEO_BLOCK = 2
+### DisplayID section header, data block header, and detailed timing
+_DISPLAYID_HEADER = Struct('4B')
+_DISPLAYID_BLOCK = Struct('3B')
+_DISPLAYID_TIMING = Struct('<HBB8H')
+DISPLAYID_TIMING_I = 0x03
+DISPLAYID_TIMING_VII = 0x22
+
+### A video timing found in the EDID; source is one of 'edid', 'cea',
+### 'cea-vic' and 'displayid', and preferred is set for the preferred or
+### native timings of the display
+Timing = namedtuple('Timing', 'width height refresh interlaced preferred source')
+
+### CEA-861 video identification codes: width, height, refresh, interlaced
+CEA_VICS = {
+	1: (640, 480, 60, 0), 2: (720, 480, 60, 0), 3: (720, 480, 60, 0),
+	4: (1280, 720, 60, 0), 5: (1920, 1080, 60, 1), 6: (1440, 480, 60, 1),
+	7: (1440, 480, 60, 1), 8: (1440, 240, 60, 0), 9: (1440, 240, 60, 0),
+	10: (2880, 480, 60, 1), 11: (2880, 480, 60, 1), 12: (2880, 240, 60, 0),
+	13: (2880, 240, 60, 0), 14: (1440, 480, 60, 0), 15: (1440, 480, 60, 0),
+	16: (1920, 1080, 60, 0), 17: (720, 576, 50, 0), 18: (720, 576, 50, 0),
+	19: (1280, 720, 50, 0), 20: (1920, 1080, 50, 1), 21: (1440, 576, 50, 1),
+	22: (1440, 576, 50, 1), 23: (1440, 288, 50, 0), 24: (1440, 288, 50, 0),
+	25: (2880, 576, 50, 1), 26: (2880, 576, 50, 1), 27: (2880, 288, 50, 0),
+	28: (2880, 288, 50, 0), 29: (1440, 576, 50, 0), 30: (1440, 576, 50, 0),
+	31: (1920, 1080, 50, 0), 32: (1920, 1080, 24, 0), 33: (1920, 1080, 25, 0),
+	34: (1920, 1080, 30, 0), 35: (2880, 480, 60, 0), 36: (2880, 480, 60, 0),
+	37: (2880, 576, 50, 0), 38: (2880, 576, 50, 0), 39: (1920, 1080, 50, 1),
+	40: (1920, 1080, 100, 1), 41: (1280, 720, 100, 0), 42: (720, 576, 100, 0),
+	43: (720, 576, 100, 0), 44: (1440, 576, 100, 1), 45: (1440, 576, 100, 1),
+	46: (1920, 1080, 120, 1), 47: (1280, 720, 120, 0), 48: (720, 480, 120, 0),
+	49: (720, 480, 120, 0), 50: (1440, 480, 120, 1), 51: (1440, 480, 120, 1),
+	52: (720, 576, 200, 0), 53: (720, 576, 200, 0), 54: (1440, 576, 200, 1),
+	55: (1440, 576, 200, 1), 56: (720, 480, 240, 0), 57: (720, 480, 240, 0),
+	58: (1440, 480, 240, 1), 59: (1440, 480, 240, 1), 60: (1280, 720, 24, 0),
+	61: (1280, 720, 25, 0), 62: (1280, 720, 30, 0), 63: (1920, 1080, 120, 0),
+	64: (1920, 1080, 100, 0), 65: (1280, 720, 24, 0), 66: (1280, 720, 25, 0),
+	67: (1280, 720, 30, 0), 68: (1280, 720, 50, 0), 69: (1280, 720, 60, 0),
+	70: (1280, 720, 100, 0), 71: (1280, 720, 120, 0), 72: (1920, 1080, 24, 0),
+	73: (1920, 1080, 25, 0), 74: (1920, 1080, 30, 0), 75: (1920, 1080, 50, 0),
+	76: (1920, 1080, 60, 0), 77: (1920, 1080, 100, 0), 78: (1920, 1080, 120, 0),
+	79: (1680, 720, 24, 0), 80: (1680, 720, 25, 0), 81: (1680, 720, 30, 0),
+	82: (1680, 720, 50, 0), 83: (1680, 720, 60, 0), 84: (1680, 720, 100, 0),
+	85: (1680, 720, 120, 0), 86: (2560, 1080, 24, 0), 87: (2560, 1080, 25, 0),
+	88: (2560, 1080, 30, 0), 89: (2560, 1080, 50, 0), 90: (2560, 1080, 60, 0),
+	91: (2560, 1080, 100, 0), 92: (2560, 1080, 120, 0), 93: (3840, 2160, 24, 0),
+	94: (3840, 2160, 25, 0), 95: (3840, 2160, 30, 0), 96: (3840, 2160, 50, 0),
+	97: (3840, 2160, 60, 0), 98: (4096, 2160, 24, 0), 99: (4096, 2160, 25, 0),
+	100: (4096, 2160, 30, 0), 101: (4096, 2160, 50, 0), 102: (4096, 2160, 60, 0),
+	103: (3840, 2160, 24, 0), 104: (3840, 2160, 25, 0), 105: (3840, 2160, 30, 0),
+	106: (3840, 2160, 50, 0), 107: (3840, 2160, 60, 0),
+}
+
 ### Offsets from the edid spec
 class Edid:
 	def __init__(self, edid=None):
+		'''parse the EDID from a string or any other buffer, which is
+		not copied'''
 		self.edid = None
 		self.valid = 1
+		self._details = None
+		self._extensions = None
 		### Parse the passed in edid
-		if edid == None:
+		if edid == None or len(edid) < 128:
 #			print "Error: Empty EDID"
 			self.valid = 0
 			edid = "\0" * 128
+		self._base = _BASE.unpack_from(edid)
 		### Make sure it a valid edid (header matches)
-		if edid[:8] != EDID_HEADER:
+		if self._base[0] != EDID_HEADER:
 #			print "Error: Invalid EDID"
 			self.valid = 0
 			edid = "\0" * 128
-		### Check the checksum 
-		sum = 0
-		for i in range(128):
-			sum = (sum + int(unpack('B', edid[i])[0])) & 0xFF
-		if sum != 0:
-#			print "Checksum failed, result should be 0, instead it's:", sum
+		### Check the checksum
+		elif sum(_BLOCK.unpack_from(edid)) & 0xFF != 0:
+#			print "Checksum failed, result should be 0"
 			self.valid = 0
 			edid = "\0" * 128
+		if not self.valid:
+			self._base = _BASE.unpack_from(edid)
 
 		self.edid = edid
 
 	### ID String
 	def get_id_string(self):
-		name = unpack('>H',self.edid[8:10])[0]
+		name = self._base[1]
 		### FIXME Be sure to check endianness on an x86 machine
 		n = chr(((name >> 10) & 0x1F) + ASC) + chr(((name >> 5) & 0x1F) + ASC) + chr(((name >> 0) & 0x1F) + ASC)
-		return n + hex(unpack('>H', self.edid[10:12])[0])[2:].upper()
-	
+		return n + hex(self._base[2])[2:].upper()
+
 	### Serial Number
 	def get_serial_number(self):
-		return unpack('>I', self.edid[12:16])[0]
+		return self._base[3]
 
 	### Tupple of week, year from EDID
 	def get_date(self):
-		date = unpack('BB', self.edid[16:18])
-		return [date[0], date[1] + 1990]
+		return [self._base[4], self._base[5] + 1990]
 
 	### EDID version, revision
 	def get_edid_ver(self):
-		return unpack('BB', self.edid[18:20])
+		return self._base[6:8]
 
 	### Video input definition struct
 	def get_video_input_def(self):
 		vid_in = {}
-		v = unpack('B', self.edid[20])[0]
+		v = self._base[8]
 		vid_in['digital'] = (v >> 7) & 1
 		if vid_in['digital']:
-			vid_in['DFP1x'] = (v & 1)	
+			vid_in['DFP1x'] = (v & 1)
 		else:
 			vid_in['video_level'] = (v >> 5) & 3
 			vid_in['blank_to_black'] = (v >> 4) & 1
@@ -84,16 +159,16 @@ class Edid:
 
 	### Size of screen (horiz, vert)
 	def get_size(self):
-		return unpack('BB', self.edid[21:23])
+		return self._base[9:11]
 
 	### Gamma
 	def get_gamma(self):
-		return (unpack('B', self.edid[23])[0] / 100.0) + 1.0
-	
+		return (self._base[11] / 100.0) + 1.0
+
 	### Feature Support
 	def get_feature_support(self):
 		fs = {}
-		f = unpack('B', self.edid[24])[0]
+		f = self._base[12]
 		fs['standby'] = (f >> 7) & 1
 		fs['suspend'] = (f >> 6) & 1
 		fs['active_off'] = (f >> 5) & 1
@@ -106,7 +181,7 @@ class Edid:
 	### Color Characteristics
 	def get_color_characteristics(self):
 		cc = {}
-		c = unpack('10B', self.edid[25:35])
+		c = self._base[13:23]
 		### Check the / 1024 value... (is this right?)
 		cc['red_x'] = ((c[2] << 2) + ((c[0] >> 6) & 3)) / 1024.0
 		cc['red_y'] = ((c[3] << 2) + ((c[0] >> 4) & 3)) / 1024.0
@@ -128,21 +203,15 @@ class Edid:
 		my_timing = []
 
 		### Established timings
-		est = unpack('BB', self.edid[35:37])
-		### This is what the field is set to if not used	
-		if est[0] == "\x01":
-			est[0] = 0
-		elif est[1] == "\x01":
-			est[1] = 0	
-
+		est = self._base[23:25]
 		for j in range(2):
 			for i in range(8):
 				if ((est[j] >> i) & 1):
 					my_timing.append(timing[i])
 
 		### Add the "standard" timings into the timing array
-		std = unpack('>8H', self.edid[38:54])
-		man = unpack('B', self.edid[37])[0]
+		std = self._base[26:34]
+		man = self._base[25]
 
 		for i in range(8):
 			if ((man >> i) & 1):
@@ -156,85 +225,75 @@ class Edid:
 					vert = (horiz * 5) / 4
 				else: # aspect == 3
 					vert = (horiz * 16) / 9
-	
+
 				freq = ((std[i] & 0x00FC) >> 2) + 60
 				my_timing.append([horiz, vert, freq])
 		return my_timing
 
 	### Monitor Descriptor
-	def get_range_dt(self, tag):
+	def get_range_dt(self, tag, offset=0):
 		sync = {}
 		### If possible, we get the range limit from the range limit tag
-		sync['v_min'] = unpack('B',tag[5])[0]
-		sync['v_max'] = unpack('B',tag[6])[0]
-		sync['h_min'] = unpack('B',tag[7])[0]
-		sync['h_max'] = unpack('B',tag[8])[0]
+		(sync['v_min'], sync['v_max'],
+		 sync['h_min'], sync['h_max']) = _RANGE_DT.unpack_from(tag, offset)
 		return sync
 
-	### Detailed Timing (from monitor details)
-	def get_timing_dt(self, info):
+	### Detailed Timing (from monitor details), pixel clock in 10 kHz units
+	def get_timing_dt(self, info, offset=0):
 		### Search for detailed timing info
 		timing = {}
-		timing['pixel_clock'] = unpack(">H",info[:2])[0]
-
-		timing['horizontal_active'] = unpack("B",info[2])[0] + ((unpack("B",info[4])[0] >> 4) << 8)
-		timing['horizontal_blanking'] = unpack("B",info[3])[0] + ((unpack("B",info[4])[0] & 0xF) << 8)
-
-		timing['vertical_active'] = unpack("B",info[5])[0] + (((unpack("B",info[7])[0] >> 4) & 0xF) << 8)
-		timing['vertical_blanking'] = unpack("B",info[6])[0] + ((unpack("B",info[7])[0] & 0xF) << 8)
-
-		timing['hsync_offset'] = unpack("B",info[8])[0] + (((unpack("B", info[11])[0] >> 6) & 3) << 8)
-		timing['hsync_pulse_width'] = unpack("B",info[9])[0] + (((unpack("B", info[11])[0] >> 4) & 3) << 8)
-		timing['vsync_offset'] = (unpack("B",info[10])[0] >> 4) + (((unpack("B", info[11])[0] >> 2) & 3) << 8)
-		timing['vsync_pulse_width'] = (unpack("B",info[10])[0] & 0xF) + ((unpack("B", info[11])[0] & 3) << 8)
-				
-		timing['himage_size'] = unpack("B",info[12])[0] + ((unpack("B",info[14])[0] >> 4) << 8)
-		timing['vimage_size'] = unpack("B",info[13])[0] + ((unpack("B",info[14])[0] & 0xF) << 8)
-				
-		timing['hborder'] = unpack("B",info[15])[0]
-		timing['vborder'] = unpack("B",info[16])[0]
-				
-		timing['interlaced'] = (unpack("B", info[17])[0] >> 7) & 1
-		timing['stereo'] = (unpack("B", info[17])[0] >> 5) & 3
-		timing['digital_composite'] = (unpack("B", info[17])[0] >> 3) & 3
-		timing['variant'] = (unpack("B", info[17])[0] >> 1) & 3
+		t = _DTD.unpack_from(info, offset)
+		timing['pixel_clock'] = t[0]
+
+		timing['horizontal_active'] = t[1] + ((t[3] >> 4) << 8)
+		timing['horizontal_blanking'] = t[2] + ((t[3] & 0xF) << 8)
+
+		timing['vertical_active'] = t[4] + (((t[6] >> 4) & 0xF) << 8)
+		timing['vertical_blanking'] = t[5] + ((t[6] & 0xF) << 8)
+
+		timing['hsync_offset'] = t[7] + (((t[10] >> 6) & 3) << 8)
+		timing['hsync_pulse_width'] = t[8] + (((t[10] >> 4) & 3) << 8)
+		### the vertical sync fields have 4 low bits
+		timing['vsync_offset'] = (t[9] >> 4) + (((t[10] >> 2) & 3) << 4)
+		timing['vsync_pulse_width'] = (t[9] & 0xF) + ((t[10] & 3) << 4)
+
+		timing['himage_size'] = t[11] + ((t[13] >> 4) << 8)
+		timing['vimage_size'] = t[12] + ((t[13] & 0xF) << 8)
+
+		timing['hborder'] = t[14]
+		timing['vborder'] = t[15]
+
+		timing['interlaced'] = (t[16] >> 7) & 1
+		timing['stereo'] = (t[16] >> 5) & 3
+		timing['digital_composite'] = (t[16] >> 3) & 3
+		timing['variant'] = (t[16] >> 1) & 3
 		return timing
 
-	### Parse Monitor Details
+	### Parse Monitor Details, only once
 	def get_monitor_details(self):
-		details = []
-		for i in range(4):
-			dmt_offset = i * 18 + 54
-			tag = self.edid[dmt_offset:dmt_offset+18] 
-
-			if tag[:5] == SERIAL_DT:
-				for i in range(13):
-					if tag[i + 5] == "\x0A" or tag[i + 5] == "\x00":
-						i = i - 1
-						break
-				size = str(i + 1) + "s"
-				details.append(["Serial", unpack(size, tag[5:i + 6])[0]])
-			elif tag[:5] == ASCII_DT:
-				for i in range(13):
-					if tag[i + 5] == "\x0A" or tag[i + 5] == "\x00":
-						i = i - 1
-						break
-				size = str(i + 1) + "s"
-				details.append(["ASCII", unpack(size, tag[5:i + 6])[0]])
-			elif tag[:5] == RANGE_DT:
-				details.append(["Range", self.get_range_dt(tag)])
-			elif tag[:5] == NAME_DT:
-				for i in range(13):
-					if tag[i + 5] == "\x0A" or tag[i + 5] == "\x00":
-						i = i - 1
-						break
-				size = str(i + 1) + "s"
-				details.append(["Name", unpack(size, tag[5:i + 6])[0]])
-			elif tag[:3] == "\0\0\0" and (0 < unpack('B', tag[3])[0] < 16):
-				details.append(["Manufacturer", str(unpack("13B", tag[5:18]))])
-			elif tag[:2] != "\0\0":
-				details.append(["Detailed Timing", self.get_timing_dt(tag)])
-		return details
+		if self._details is None:
+			self._details = []
+			for i in range(4):
+				detail = self._get_detail(DESCRIPTOR_OFFSET + i * DESCRIPTOR_SIZE)
+				if detail: self._details.append(detail)
+		return self._details
+
+	### Decode the descriptor at offset
+	def _get_detail(self, offset):
+		tag, text = _DESCRIPTOR.unpack_from(self.edid, offset)
+		if tag == SERIAL_DT:
+			return ["Serial", _dt_text(text)]
+		elif tag == ASCII_DT:
+			return ["ASCII", _dt_text(text)]
+		elif tag == RANGE_DT:
+			return ["Range", self.get_range_dt(self.edid, offset)]
+		elif tag == NAME_DT:
+			return ["Name", _dt_text(text)]
+		elif tag[:3] == "\0\0\0" and 0 < ord(tag[3]) < 16:
+			return ["Manufacturer", str(_MANUFACTURER_DT.unpack_from(self.edid, offset)[1:])]
+		elif tag[:2] != "\0\0":
+			return ["Detailed Timing", self.get_timing_dt(self.edid, offset)]
+		return None
 
 	### Get a readable name for this monitor
 	def get_string_name(self):
@@ -247,7 +306,238 @@ class Edid:
 			s = self.get_id_string()
 
 		return s.strip()
-			
+
 
 	def has_extension(self):
-		return unpack("B", self.edid[126])[0]
+		return self._base[34]
+
+	### Tag and offset of each extension block that is present and valid
+	def get_extension_blocks(self):
+		if self._extensions is None:
+			self._extensions = []
+			if self.valid:
+				for i in range(1, self.has_extension() + 1):
+					offset = i * BLOCK_SIZE
+					if len(self.edid) < offset + BLOCK_SIZE: break
+					block = _BLOCK.unpack_from(self.edid, offset)
+					if sum(block) & 0xFF != 0: continue
+					self._extensions.append((block[0], offset))
+		return self._extensions
+
+	### Detailed timings of the base block and CEA-861 extensions; the first
+	### one of the base block is the preferred timing
+	def get_detailed_timings(self):
+		timings = []
+		if not self.valid: return timings
+		for i in range(4):
+			offset = DESCRIPTOR_OFFSET + i * DESCRIPTOR_SIZE
+			if _DTD.unpack_from(self.edid, offset)[0] == 0: continue
+			timings.append(_dtd_timing(self.edid, offset, i == 0, 'edid'))
+		for tag, offset in self.get_extension_blocks():
+			if tag != CEA_EXT: continue
+			d = _CEA_HEADER.unpack_from(self.edid, offset)[2]
+			if d < 4: continue
+			# detailed timings follow the data blocks up to the padding
+			dtd = offset + d
+			while dtd + DESCRIPTOR_SIZE < offset + BLOCK_SIZE:
+				if _DTD.unpack_from(self.edid, dtd)[0] == 0: break
+				timings.append(_dtd_timing(self.edid, dtd, False, 'cea'))
+				dtd += DESCRIPTOR_SIZE
+		return timings
+
+	### Short video descriptors of CEA-861 extensions as (vic, native)
+	def get_video_codes(self):
+		codes = []
+		for tag, offset in self.get_extension_blocks():
+			if tag != CEA_EXT: continue
+			d = _CEA_HEADER.unpack_from(self.edid, offset)[2]
+			pos = offset + 4
+			while pos < offset + d:
+				header = _BYTE.unpack_from(self.edid, pos)[0]
+				length = header & 0x1F
+				if pos + 1 + length > offset + d: break
+				if header >> 5 == CEA_VIDEO_BLOCK:
+					for svd in unpack_from('%dB' % length, self.edid, pos + 1):
+						# codes 1-64 have a native bit, 129-192 are
+						# native codes 1-64, and from 193 on they are
+						# plain codes again
+						if 129 <= svd <= 192:
+							codes.append((svd & 0x7F, 1))
+						elif svd:
+							codes.append((svd, 0))
+				pos += 1 + length
+		return codes
+
+	### Timings of the known video codes of CEA-861 extensions
+	def get_cea_timings(self):
+		timings = []
+		for vic, native in self.get_video_codes():
+			if vic not in CEA_VICS: continue
+			w, h, refresh, interlaced = CEA_VICS[vic]
+			timings.append(Timing(w, h, float(refresh), interlaced, native, 'cea-vic'))
+		return timings
+
+	### Detailed timings of DisplayID extensions (type I and VII)
+	def get_displayid_timings(self):
+		timings = []
+		for tag, offset in self.get_extension_blocks():
+			if tag != DISPLAYID_EXT: continue
+			section = _DISPLAYID_HEADER.unpack_from(self.edid, offset + 1)[1]
+			pos = offset + 5
+			end = min(pos + section, offset + BLOCK_SIZE - 1)
+			while pos + 3 <= end:
+				block, revision, length = _DISPLAYID_BLOCK.unpack_from(self.edid, pos)
+				pos += 3
+				if pos + length > end: break
+				if block in (DISPLAYID_TIMING_I, DISPLAYID_TIMING_VII):
+					# type I has the pixel clock in 10 kHz units, VII in kHz
+					khz = block == DISPLAYID_TIMING_I and 10 or 1
+					for t in range(pos, pos + length - 19, 20):
+						timings.append(_displayid_timing(self.edid, t, khz))
+				pos += length
+		return timings
+
+	### All timings found in the EDID, including extension blocks
+	def get_all_timings(self):
+		return self.get_detailed_timings() + self.get_cea_timings() + \
+			self.get_displayid_timings()
+
+### Timing of the detailed timing descriptor at offset
+def _dtd_timing(data, offset, preferred, source):
+	t = _DTD.unpack_from(data, offset)
+	width = t[1] + ((t[3] >> 4) << 8)
+	hblank = t[2] + ((t[3] & 0xF) << 8)
+	height = t[4] + ((t[6] >> 4) << 8)
+	vblank = t[5] + ((t[6] & 0xF) << 8)
+	interlaced = (t[16] >> 7) & 1
+	refresh = 0.0
+	if (width + hblank) and (height + vblank):
+		refresh = t[0] * 10000.0 / ((width + hblank) * (height + vblank))
+	### interlaced timings have the height of a field
+	if interlaced: height *= 2
+	return Timing(width, height, refresh, interlaced, int(preferred), source)
+
+### Timing of the DisplayID detailed timing descriptor at offset
+def _displayid_timing(data, offset, khz):
+	t = _DISPLAYID_TIMING.unpack_from(data, offset)
+	clock = (t[0] | (t[1] << 16)) + 1
+	flags = t[2]
+	width, hblank = t[3] + 1, t[4] + 1
+	height, vblank = t[7] + 1, t[8] + 1
+	refresh = clock * khz * 1000.0 / ((width + hblank) * (height + vblank))
+	return Timing(width, height, refresh, (flags >> 4) & 1, (flags >> 7) & 1, 'displayid')
+
+### Text of a descriptor, up to a newline or NUL
+def _dt_text(text):
+	for c in "\x0A\x00":
+		i = text.find(c)
+		if i >= 0: text = text[:i]
+	return text
+
+
+
+if __name__ == '__main__':
+	### base block of a known EDID, which lists two detailed timings, range
+	### limits and a name; the values are those the previous parser gave
+	data = (
+		'00ffffffffffff0012703412010000000a140104a5341d782aee91a3544c9926'
+		'0f5054210800d1c08180010101010101010101010101023a801871382d40582c'
+		'450008222100001e302a009851002a403070430408222100001e000000fd0038'
+		'4c1e5311000a202020202020000000fc0054455354204d4f4e49544f520a0211'
+	).decode('hex')
+	### a CEA-861 extension with VICs 16 (native), 4, 97 and 1 and a
+	### 1280x720 detailed timing, and a DisplayID extension with a preferred
+	### 3840x2160 type I timing
+	extensions = (
+		'020309004490046101011d007251d01e206e28550008222100001e0000000000'
+		+ '00' * 95 + '75'
+		'701217030003001407e80088ff0e2f02af0057006f0859000700090022000000'
+		+ '00' * 95 + '90'
+	).decode('hex')
+
+	for edid in [Edid(data), Edid(bytearray(data)), Edid(buffer(data))]:
+		if not edid.valid:
+			print 'ERROR: valid EDID rejected from %s'%type(edid.edid)
+		if edid.get_id_string() != 'DSP3412':
+			print 'ERROR: id string: %s'%edid.get_id_string()
+		if edid.get_serial_number() != 0x01000000:
+			print 'ERROR: serial number: %s'%edid.get_serial_number()
+		if edid.get_date() != [10, 2010]:
+			print 'ERROR: date: %s'%edid.get_date()
+		if edid.get_edid_ver() != (1, 4):
+			print 'ERROR: version: %s'%str(edid.get_edid_ver())
+		if edid.get_video_input_def() != {'digital': 1, 'DFP1x': 1}:
+			print 'ERROR: video input: %s'%edid.get_video_input_def()
+		if edid.get_size() != (52, 29) or edid.get_gamma() != 2.2:
+			print 'ERROR: size or gamma: %s %s'%(edid.get_size(), edid.get_gamma())
+		if edid.get_feature_support() != {'standby': 0, 'suspend': 0,
+				'active_off': 1, 'display_type': 1, 'rgb': 0,
+				'prefered_timing': 1, 'gtf': 0}:
+			print 'ERROR: feature support: %s'%edid.get_feature_support()
+		cc = edid.get_color_characteristics()
+		if (cc['red_x'], cc['green_y'], cc['blue_x'], cc['white_y']) != \
+				(655/1024.0, 614/1024.0, 154/1024.0, 337/1024.0):
+			print 'ERROR: color characteristics: %s'%cc
+		if edid.get_timings() != [[720, 400, 70], [640, 480, 75], [640, 480, 67]]:
+			print 'ERROR: established timings: %s'%edid.get_timings()
+		details = edid.get_monitor_details()
+		if [d[0] for d in details] != ['Detailed Timing', 'Detailed Timing', 'Range', 'Name']:
+			print 'ERROR: monitor details: %s'%details
+		elif [(d[1]['horizontal_active'], d[1]['vertical_active']) for d in details[:2]] != \
+				[(1920, 1080), (1280, 1024)]:
+			print 'ERROR: detailed timing resolutions: %s'%details[:2]
+		elif details[2][1] != {'v_min': 56, 'v_max': 76, 'h_min': 30, 'h_max': 83}:
+			print 'ERROR: range limits: %s'%details[2][1]
+		if edid.get_string_name() != 'TEST MONITOR':
+			print 'ERROR: name: %s'%edid.get_string_name()
+		if edid.has_extension() != 2:
+			print 'ERROR: extension count: %s'%edid.has_extension()
+
+	### detailed timings are decoded with a little-endian pixel clock
+	edid = Edid(data + extensions)
+	details = edid.get_monitor_details()
+	if details[0][1] != {'pixel_clock': 14850, 'horizontal_active': 1920,
+			'horizontal_blanking': 280, 'vertical_active': 1080,
+			'vertical_blanking': 45, 'hsync_offset': 88,
+			'hsync_pulse_width': 44, 'vsync_offset': 4,
+			'vsync_pulse_width': 5, 'himage_size': 520, 'vimage_size': 290,
+			'hborder': 0, 'vborder': 0, 'interlaced': 0, 'stereo': 0,
+			'digital_composite': 3, 'variant': 3}:
+		print 'ERROR: detailed timing: %s'%details[0][1]
+	if (details[1][1]['pixel_clock'], details[1][1]['vsync_offset'],
+			details[1][1]['vsync_pulse_width']) != (10800, 20, 3):
+		print 'ERROR: detailed timing vertical sync: %s'%details[1][1]
+
+	### timings of the base block and both extensions
+	if edid.get_extension_blocks() != [(CEA_EXT, 128), (DISPLAYID_EXT, 256)]:
+		print 'ERROR: extension blocks: %s'%edid.get_extension_blocks()
+	if edid.get_video_codes() != [(16, 1), (4, 0), (97, 0), (1, 0)]:
+		print 'ERROR: video codes: %s'%edid.get_video_codes()
+	timings = [(t.width, t.height, round(t.refresh, 2), t.interlaced, t.preferred, t.source)
+		for t in edid.get_all_timings()]
+	if timings != [
+			(1920, 1080, 60.0, 0, 1, 'edid'),
+			(1280, 1024, 60.02, 0, 0, 'edid'),
+			(1280, 720, 60.0, 0, 0, 'cea'),
+			(1920, 1080, 60.0, 0, 1, 'cea-vic'),
+			(1280, 720, 60.0, 0, 0, 'cea-vic'),
+			(3840, 2160, 60.0, 0, 0, 'cea-vic'),
+			(640, 480, 60.0, 0, 0, 'cea-vic'),
+			(3840, 2160, 60.0, 0, 1, 'displayid')]:
+		print 'ERROR: timings: %s'%timings
+
+	### extension blocks with a bad checksum or beyond the data are skipped
+	edid = Edid(data + extensions[:127] + '\0' + extensions[128:])
+	if edid.get_extension_blocks() != [(DISPLAYID_EXT, 256)] or edid.get_cea_timings():
+		print 'ERROR: bad extension block accepted: %s'%edid.get_extension_blocks()
+	edid = Edid(data + extensions[:128])
+	if edid.get_extension_blocks() != [(CEA_EXT, 128)] or edid.get_displayid_timings():
+		print 'ERROR: missing extension block: %s'%edid.get_extension_blocks()
+
+	### invalid data gives an invalid, empty EDID
+	for bad in [None, data[:100], data[:127] + '\0', '\1' + data[1:]]:
+		edid = Edid(bad)
+		if edid.valid or edid.get_monitor_details() or edid.get_detailed_timings():
+			print 'ERROR: invalid EDID accepted: %r'%bad
+
+	print 'all tests done.'
@@ -0,0 +1,108 @@
+##############################################################################
+# layout.py - placing displays on the screen
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License at http://www.gnu.org/licenses/gpl.txt
+# By using, editing and/or distributing this software you agree to
+# the terms and conditions of this license.
+
+import math
+
+DIRECTIONS = ['left', 'right', 'top', 'bottom', 'grid']
+
+
+def layout_displays(displays, sizes, direction=None, align='start',
+                    columns=None, rotations=None):
+    '''return the position of each display and the size of the screen as a
+    tuple (positions, (width, height)), where positions is a dict with (x,y)
+    for each display. sizes is a dict with the (w,h) of each display, and
+    rotations an optional dict with its rotation in degrees.
+
+    displays are placed in the order given: next to each other in direction,
+    which is one of 'left'/'right'/'top'/'bottom', or in rows of columns
+    displays for 'grid' (a square grid by default). When direction is None,
+    all displays are placed at the origin to clone them. Displays smaller
+    than their row or column are aligned to its 'start', 'center' or 'end'.
+    The top-left corner of the screen is always at the origin.'''
+    n = len(displays)
+    if n == 0: return {}, (0, 0)
+    # size of each display as it appears on the screen
+    dsizes = []
+    for d in displays:
+        w, h = sizes[d]
+        if rotations and rotations.get(d, 0) % 180 == 90: w, h = h, w
+        dsizes.append((w, h))
+    if direction == None:
+        positions = {}
+        for d in displays: positions[d] = (0, 0)
+        return positions, (max([s[0] for s in dsizes]), max([s[1] for s in dsizes]))
+    # find the cell in the grid of each display; a line is a grid of one row
+    # or column
+    if direction in ['left', 'right']:
+        ncols = n
+    elif direction in ['top', 'bottom']:
+        ncols = 1
+    elif direction == 'grid':
+        ncols = columns or int(math.ceil(math.sqrt(n)))
+    else:
+        raise ValueError('extend direction must be left/right/top/bottom/grid')
+    nrows = (n + ncols - 1) / ncols
+    cells = []
+    for i in range(n):
+        row, col = divmod(i, ncols)
+        if direction == 'left': col = ncols - 1 - col
+        if direction == 'top': row = nrows - 1 - row
+        cells.append((row, col))
+    # each column is as wide as its widest display, rows likewise
+    colw = [0] * ncols
+    rowh = [0] * nrows
+    for (row, col), (w, h) in zip(cells, dsizes):
+        colw[col] = max(colw[col], w)
+        rowh[row] = max(rowh[row], h)
+    colx = [sum(colw[:c]) for c in range(ncols)]
+    rowy = [sum(rowh[:r]) for r in range(nrows)]
+    positions = {}
+    for d, (row, col), (w, h) in zip(displays, cells, dsizes):
+        positions[d] = (colx[col] + _align(colw[col] - w, align),
+                        rowy[row] + _align(rowh[row] - h, align))
+    return positions, (sum(colw), sum(rowh))
+
+
+def _align(space, align):
+    '''return the offset of a display in a cell with space left over'''
+    if align == 'start': return 0
+    elif align == 'center': return space / 2
+    elif align == 'end': return space
+    raise ValueError('alignment must be start/center/end')
+
+
+if __name__ == '__main__':
+    displays = ['CRT-0', 'DFP-0', 'TV-0']
+    sizes = {'CRT-0': (800, 600), 'DFP-0': (200, 300), 'TV-0': (640, 480)}
+    for direction, expected, size in [
+            ('right',  {'CRT-0': (0, 0), 'DFP-0': (800, 0), 'TV-0': (1000, 0)}, (1640, 600)),
+            ('left',   {'CRT-0': (840, 0), 'DFP-0': (640, 0), 'TV-0': (0, 0)}, (1640, 600)),
+            ('top',    {'CRT-0': (0, 780), 'DFP-0': (0, 480), 'TV-0': (0, 0)}, (800, 1380)),
+            ('bottom', {'CRT-0': (0, 0), 'DFP-0': (0, 600), 'TV-0': (0, 900)}, (800, 1380)),
+            ('grid',   {'CRT-0': (0, 0), 'DFP-0': (800, 0), 'TV-0': (0, 600)}, (1000, 1080)),
+            (None,     {'CRT-0': (0, 0), 'DFP-0': (0, 0), 'TV-0': (0, 0)}, (800, 600)) ]:
+        if layout_displays(displays, sizes, direction) != (expected, size):
+            print 'ERROR: layout %s: %s'%(direction, layout_displays(displays, sizes, direction))
+
+    positions, size = layout_displays(displays, sizes, 'right', 'center')
+    if positions['DFP-0'] != (800, 150) or size != (1640, 600):
+        print 'ERROR: centered layout: %s'%positions
+    positions, size = layout_displays(displays, sizes, 'right', rotations={'CRT-0': 90})
+    if positions['DFP-0'] != (600, 0) or size != (1440, 800):
+        print 'ERROR: rotated layout: %s'%positions
+
+    print 'all tests done.'
+
+# vim:ts=4:sw=4:expandtab:
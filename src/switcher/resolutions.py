@@ -21,15 +21,62 @@ except:
         lnew.sort()
         return lnew
 
-class Resolution:
+# parsed resolution strings as (physical, virtual), so that the same
+# resolution string is parsed only once
+_parsed = {}
+_PARSED_MAX = 1024
+
+def _parse(val):
+    '''return a tuple (physical, virtual) from a resolution specified in
+    any of the forms accepted by Resolution.set(); virtual may be None.'''
+    if isinstance(val, Resolution):
+        return val.physical, val.virtual
+    elif val == None:
+        return None, None
+    elif type(val) == str:
+        if val in _parsed: return _parsed[val]
+        parts = val.split('@')
+        if len(parts)>2:
+            raise TypeError('need zero or one virtual resolutions (@): '+val)
+        physical = map(int, parts[0].split('x',1))
+        virtual = None
+        if len(parts)>1:
+            virtual = map(int, parts[1].split('x',1))
+        r = _validate(val, physical, virtual)
+        if len(_parsed) >= _PARSED_MAX: _parsed.clear()
+        _parsed[val] = r
+        return r
+    elif type(val) in [list,tuple]:
+        if type(val[0]) in [list,tuple]:
+            return _validate(val, val[0], val[1])
+        return _validate(val, val, None)
+    else:
+        raise TypeError('invalid resolution: '+str(val))
+
+def _validate(val, physical, virtual):
+    '''return physical and virtual resolution as tuples, raises TypeError
+    when they are not valid'''
+    if len(physical)!=2:
+        raise TypeError('invalid physical resolution in: '+str(val))
+    if virtual and len(virtual)!=2:
+        raise TypeError('invalid virtual resolution in: '+str(val))
+    # make sure we have fixed type to avoid comparison trouble
+    physical = tuple(physical)
+    if virtual: virtual = tuple(virtual)
+    else: virtual = None
+    return physical, virtual
+
+
+class Resolution(object):
     '''a single resolution with a width, height, and a sort weight.
-    Resolutions can be initialised from a string or a list and can be sorted.'''
+    Resolutions can be initialised from a string or a list and can be sorted.
+    Resolutions are equal when their physical and virtual size are, the
+    weight only matters for sorting.'''
+
+    __slots__ = ('physical', 'virtual', '_weight', '_size', '_key')
 
-    physical = None
-    virtual = None
-    weight = 0      # how 'important' this resolution is for sorting
-	
     def __init__(self, val=None, weight=None):
+        self._weight = 0    # how 'important' this resolution is for sorting
         self.set(val, weight)
 
     def set(self, val, weight=None):
@@ -38,36 +85,32 @@ class Resolution:
         instance, a list [width,height] or a list
         [[width,height],[vwidth,vheight].
         When weight is not None, it will be set.'''
-        self.physical = self.virtual = None
-        if weight != None: self.weight = weight
-        if isinstance(val, Resolution):
-            if val.physical: self.physical = val.physical[0], val.physical[1]
-            if val.virtual: self.virtual = val.virtual[0], val.virtual[1]
-            self.weight = val.weight
-        elif val == None:
-            pass
-        elif type(val) == str:
-            parts = val.split('@')
-            self.physical = map(int, parts[0].split('x',1))
-            if len(parts)>1:
-                self.virtual = map(int, parts[1].split('x',1))
-            elif len(parts)>2:
-                raise TypeError('need zero or one virtual resolutions (@): '+val)
-        elif type(val) in [list,tuple]:
-            if type(val[0]) in [list,tuple]:
-                self.physical,self.virtual = val
-            else:
-                self.physical = val
-        else:
-            raise TypeError('invalid resolution: '+str(val))
-        # validate
-        if len(self.physical)!=2:
+        if isinstance(val, Resolution): self._weight = val.weight
+        if weight != None: self._weight = weight
+        self.physical, self.virtual = _parse(val)
+        if not self.physical:
             raise TypeError('invalid physical resolution in: '+str(val))
-        if self.virtual and len(self.virtual)!=2:
-            raise TypeError('invalid virtual resolution in: '+str(val))
-        # make sure we have fixed type to avoid comparison trouble
-        self.physical = tuple(self.physical)
-        if self.virtual: self.virtual = tuple(self.virtual)
+        # physical and virtual size, to compare with and hash
+        self._size = self.physical, self.virtual or self.physical
+        self._key = None
+
+    def _get_weight(self):
+        return self._weight
+
+    def _set_weight(self, weight):
+        self._weight = weight
+        self._key = None
+
+    weight = property(_get_weight, _set_weight)
+
+    def sort_key(self):
+        '''return the key to sort by: weight first, then physical size,
+        then virtual size'''
+        if self._key is None:
+            physical, virtual = self._size
+            self._key = (self._weight, physical[0]*physical[1],
+                         virtual[0]*virtual[1])
+        return self._key
 
     def size(self):
         return self.physical
@@ -78,36 +121,26 @@ class Resolution:
             s += ' @%dx%d'%(self.virtual[0],self.virtual[1])
         return s
 
+    def __repr__(self):
+        return '<Resolution %s>'%self
+
     def __eq__(self, other):
-        if not isinstance(other, Resolution):
-            try: other = Resolution(other)
-            except: return False
-        virt1,virt2 = self.virtual, other.virtual
-        if not virt1: virt1 = self.physical
-        if not virt2: virt2 = other.physical
-        return (self.physical == other.physical) and (virt1 == virt2)
+        if isinstance(other, Resolution):
+            return self._size == other._size
+        try: physical, virtual = _parse(other)
+        except: return False
+        return self._size == (physical, virtual or physical)
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
     def __cmp__(self, other):
-        # sort order: by weight first, then physical size, then virtual size
         if not isinstance(other, Resolution):
             other = Resolution(other)
-        diff = self.weight - other.weight
-        if diff: return diff
-        diff = self.physical[0]*self.physical[1] - other.physical[0]*other.physical[1]
-        if diff: return diff
-        virt1,virt2 = self.virtual, other.virtual
-        if not virt1: virt1 = self.physical
-        if not virt2: virt2 = other.physical
-        diff = virt1[0]*virt1[1] - virt2[0]*virt2[1]
-        if diff: return diff
-        # equal
-        return 0
+        return cmp(self.sort_key(), other.sort_key())
 
     def __hash__(self):
-        return hash(self.__str__())
+        return hash(self._size)
 
 
 class ResolutionList(list):
@@ -124,6 +157,11 @@ class ResolutionList(list):
         for v in val:
             self.append(Resolution(v))
 
+    def sort(self, cmp=None, key=None, reverse=False):
+        '''sort resolutions, by default on their sort key'''
+        if not cmp and not key: key = Resolution.sort_key
+        list.sort(self, cmp, key, reverse)
+
     def __str__(self):
         return ', '.join(map(str, self))
 
@@ -193,17 +231,21 @@ class ResolutionCollection(dict):
         if len(self) == 0: return ResolutionList()
         common = None
         for disp,rl in self.iteritems():
-            rl = ResolutionList(rl)
-            if not common:
-                common = rl
+            if common is None:
+                common = ResolutionList(rl)
                 continue
-            delitems = ResolutionList()
+            if not isinstance(rl, ResolutionList):
+                rl = ResolutionList(rl)
+            # index weights by size; the first one counts, as with index()
+            weights = {}
+            for r in rl:
+                weights.setdefault(r._size, r.weight)
+            keep = ResolutionList()
             for c in common:
-                if c in rl:
-                    c.weight += rl[rl.index(c)].weight
-                else:
-                    delitems.append(c)
-            for d in delitems: common.remove(d)
+                if c._size in weights:
+                    c.weight += weights[c._size]
+                    keep.append(c)
+            common = keep
         return common
 
     def sort(self):
@@ -280,6 +322,13 @@ if __name__ == '__main__':
     if rc != rcsorted:
         print 'ERROR: inplace sorting failed'
 
+    for i in range(_PARSED_MAX+10):
+        Resolution('%dx%d'%(i+1, i+1))
+    if len(_parsed) > _PARSED_MAX:
+        print 'ERROR: parsed resolution cache is unbounded: %d'%len(_parsed)
+    if Resolution('800x600') != [800, 600]:
+        print 'ERROR: resolution string init after cache clear'
+
     print 'all tests done.'
 
 # vim:ts=4:sw=4:expandtab:
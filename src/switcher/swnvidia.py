@@ -20,15 +20,18 @@ import logging
 import nvidia
 
 from resolutions import *
+from layout import layout_displays
 
 class NVidiaSwitcher:
 
     nv = None
     _display_associations = []
     _switch_method = None
+    _watching = False
 
 
     def __init__(self):
+        self._probed = {}
         self.nv = nvidia.NVidiaControl()
         self.screen = nvidia.Screen(self.nv.xscreen)
         self.log = logging.getLogger('disper.switcher.nvidia')
@@ -47,6 +50,26 @@ class NVidiaSwitcher:
             self._switch_method=self._xrandr_switch_cmd
 
 
+    def refresh(self, probe=True):
+        '''forget cached information about displays'''
+        self.nv.invalidate_cache()
+        self._probed = {}
+
+
+    def wait_display_event(self, timeout=None):
+        '''wait at most timeout seconds (forever if None) for displays to be
+        probed, and return whether that happened. Displays are only probed
+        when a client asks for it, e.g. on a hotkey handled by the driver.'''
+        if not self._watching:
+            self.nv.select_notify(self.screen)
+            self._watching = True
+        while True:
+            event = self.nv.next_attribute_event(timeout)
+            if not event: return False
+            if event.attribute in [nvidia.NV_CTRL_PROBE_DISPLAYS, nvidia.NV_CTRL_CONNECTED_DISPLAYS]:
+                return True
+
+
     def get_displays(self):
         '''return an array of connected displays'''
         displays = self.nv.probe_displays(self.screen)
@@ -78,6 +101,30 @@ class NVidiaSwitcher:
         Displays need to be associated to probe their modelines, so this method
         temporarily changes that (and reverts to the old setup before
         returning).'''
+        return self._probe_display(ndisp)[0]
+
+
+    def get_display_preferred_res(self, ndisp):
+        '''return the preferred resolution for a display.
+        Displays need to be associated to probe their modelines, so this method
+        temporarily changes that (and reverts to the old setup before
+        returning).'''
+        return self._probe_display(ndisp)[1]
+
+
+    def _probe_display(self, ndisp):
+        '''return the tuple (supported resolutions, preferred resolution) of
+        a display, which is probed only once until refresh()'''
+        if ndisp not in self._probed:
+            self.probe_displays([ndisp])
+        return self._probed[ndisp]
+
+
+    def probe_displays(self, displays):
+        '''return a dict with a tuple (supported resolutions, preferred
+        resolution) for each display. Displays are associated for probing in
+        as few groups as the GPU allows, and the association is restored
+        after each group.'''
 
         # Get display resolutions for display. The display needs to have
         # it associated to the X screen to be able to do this. So we check that
@@ -86,32 +133,45 @@ class NVidiaSwitcher:
         # Note: When twinview has not been enabled before, the X server can
         #       *crash* when a display is associated that isn't mentioned in
         #       any metamode line. So create an autoselect modeline first.
-        self._push_display_association([ndisp])
-        try:
-            self.nv.build_display_modepool(self.screen, ndisp)
-            resolutions = set()
-            for m in self.nv.get_display_modelines(self.screen, ndisp):
-                r = re.search(r'::\s*"(\d+x\d+)"', m)
-                if not r: continue
-                resolutions.add(r.group(1))
-        finally:
-            self._pop_display_association()
-
-        return resolutions
-
-
-    def get_display_preferred_res(self, ndisp):
-        '''return the preferred resolution for a display.
-        Displays need to be associated to probe their modelines, so this method
-        temporarily changes that (and reverts to the old setup before
-        returning).'''
-        self._push_display_association([ndisp])
-        try:
-            self.nv.build_display_modepool(self.screen, ndisp)
-            res = self.nv.get_dfp_native_resolution(self.screen, ndisp)
-        finally:
-            self._pop_display_association()
-        return res
+        probed = {}
+        for group in self._association_groups(displays):
+            self._push_display_association(group)
+            try:
+                for ndisp in group:
+                    self.nv.build_display_modepool(self.screen, ndisp)
+                    resolutions = set()
+                    # only modes named after their resolution can be used in
+                    # a metamode by resolution
+                    for m in self.nv.get_display_modes(self.screen, ndisp):
+                        if m.name == '%dx%d'%m.size():
+                            resolutions.add(m.name)
+                    res = self.nv.get_dfp_native_resolution(self.screen, ndisp)
+                    probed[ndisp] = (resolutions, res)
+            finally:
+                self._pop_display_association()
+
+        self._probed.update(probed)
+        return probed
+
+
+    def _association_groups(self, displays):
+        '''split displays into groups that can each be associated together
+        with the displays that are associated already, without exceeding the
+        number of displays the GPU can drive at once.'''
+        maxdisplays = self.nv.get_max_displays(self.screen)
+        if not maxdisplays: return [displays]
+        olddisplays = self.nv.get_screen_associated_displays(self.screen)
+        # associated displays don't take another place
+        groups = [filter(lambda d: d in olddisplays, displays)]
+        room = max(1, maxdisplays - len(olddisplays))
+        added = 0
+        for d in filter(lambda d: d not in olddisplays, displays):
+            if added == room:
+                groups.append([])
+                added = 0
+            groups[-1].append(d)
+            added += 1
+        return filter(None, groups)
 
 
     def get_display_edid(self, ndisp):
@@ -119,6 +179,11 @@ class NVidiaSwitcher:
         return self.nv.get_display_edid(self.screen, ndisp)
 
 
+    def get_driver_version(self):
+        '''return a string identifying the driver and its version'''
+        return 'nvidia %s'%self.nv.get_driver_version(self.screen)
+
+
     def switch_clone(self, displays, res):
         '''switch to resolution and clone all displays'''
         mm = nvidia.metamode_clone(displays, str(res))
@@ -127,15 +192,31 @@ class NVidiaSwitcher:
 
     def switch_extend(self, displays, direction, ress):
         '''extend desktop across all displays. direction is one of
-        'left'/'right'/'bottom'/'top', and ress a dict of a resolution
+        'left'/'right'/'bottom'/'top'/'grid', and ress a dict of a resolution
         for each display.'''
-        mm = None
+        ress = dict(map(lambda d: (d, Resolution(ress[d])), displays))
+        sizes = {}
         for disp in displays:
-            res = ress[disp]
-            mm = nvidia.metamode_add_extend(mm, direction, disp, str(res))
+            sizes[disp] = ress[disp].virtual or ress[disp].physical
+        positions, size = layout_displays(displays, sizes, direction)
+        mm = nvidia.MetaMode(', '.join(map(lambda d: '%s: %s %+d%+d'%(
+            d, ress[d], positions[d][0], positions[d][1]), displays)))
         return self._switch(mm, displays)
 
 
+    def get_current_layout(self):
+        '''return the current configuration as a dict with a tuple
+        (Resolution, (x, y), refresh rate) for each display in use, or None
+        when the current metamode has displays without a fixed resolution or
+        position. The refresh rate is None, since it can't be selected.'''
+        layout = {}
+        for d in self.nv.get_current_metamode(self.screen).metamodes:
+            if type(d.physical) != list or not d.position: return None
+            layout[d.display] = (Resolution([d.physical, d.virtual or d.physical]),
+                tuple(d.position), None)
+        return layout
+
+
     def import_config(self, cfg):
         '''restore a display configuration as exported by export_config()'''
         backend = displays = mmline = scaling = xio = None
@@ -272,6 +353,7 @@ class NVidiaSwitcher:
         self._cleanup_metamodes(displays)
         self._pop_display_association(False)
         self._set_associated_displays(displays)
+        self.log.info('NV-CONTROL cache: %d hits, %d misses'%(self.nv.cache_hits, self.nv.cache_misses))
 
 
     def _add_metamode(self,  mm):
@@ -354,7 +436,11 @@ class NVidiaSwitcher:
         if not virtualres:
             mm = self.nv.get_metamodes(self.screen).find(mmid)
             virtualres = mm.bounding_size()
-        return self._switch_method(mmid, virtualres)
+        try:
+            return self._switch_method(mmid, virtualres)
+        finally:
+            # the current metamode has changed outside of NV-CONTROL
+            self.nv.invalidate_cache()
 
     def _xrandr_switch_mod(self, mmid, virtualres):
         '''_xrandr_switch that uses the xrandr python module'''
@@ -389,17 +475,20 @@ class NVidiaSwitcher:
         list are still associated to the X screen.
         '''
         metamodes = self.nv.get_metamodes(self.screen)
+        keep = []
         for mm in metamodes:
             for d in mm.metamodes:
                 if d.display not in displays and d.physical:
                     self.log.info('deleting dangling metamode %d: %s'%(mm.id,mm))
-                    r = self.nv.delete_metamode(self.screen, mm)
-                    if not r: self.log.warning('deletion of dangling metamode %d failed'%mm.id)
                     break
-        # nvidia-settings re-orders them, so do it here to be sure
-        metamodes = self.nv.get_metamodes(self.screen)
-        for i,mm in enumerate(metamodes):
-            self.nv.move_metamode(self.screen, mm, i)
+            else:
+                keep.append(mm)
+        # nvidia-settings re-orders them, the plan includes moves if needed
+        ops = nvidia.metamode_plan(metamodes, keep)
+        if not ops: return
+        for op, r in zip(ops, self.nv.update_metamodes(self.screen, ops)):
+            if op[0] == 'delete' and not r:
+                self.log.warning('deletion of dangling metamode %d failed'%op[1].id)
 
     def set_scaling(self, displays, scaling):
         '''update the flat panel scaling mode if it was set previously by
@@ -438,8 +527,7 @@ class NVidiaSwitcher:
     def get_scaling(self, displays):
         '''return an array of scaling modes for each display'''
         scalings = []
-        for d in displays:
-            res = self.nv.get_gpu_scaling(self.screen, d)
+        for d, res in zip(displays, self.nv.get_gpu_scalings(self.screen, displays)):
             if not res: # 'default' on error
                 self.log.warning('could not get scaling for screen %s, reverting to "default"'%d)
                 scalings.append('default')
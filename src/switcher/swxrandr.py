@@ -16,11 +16,21 @@
 import logging
 
 import xrandr
+from xrandr import randrctl
 
+from edid import Edid
 from resolutions import *
+from layout import layout_displays, DIRECTIONS
 
 class XRandrSwitcher:
 
+    _watching = False
+    _refresh_rate = None
+    _randr = None       # RandRControl for pipelined requests, False if unusable
+    _outputs = None     # RandR information of each output by name
+    _probe = True       # whether outputs are probed when next requested
+    _edids = None       # EDID of each connected display by name
+
     def __init__(self):
         self.log = logging.getLogger('disper.switcher.xrandr')
         self.screen = xrandr.get_current_screen()
@@ -28,8 +38,31 @@ class XRandrSwitcher:
             raise Exception('No XRandR extension found')
 
 
+    def refresh(self, probe=True):
+        '''reload outputs and their modes, keeping the X connection. When
+        probe is False, the outputs are not probed again by the X server.'''
+        self.screen = xrandr.Screen(self.screen._display, probe=probe)
+        self._outputs = None
+        self._probe = probe
+        self._edids = None
+
+
+    def wait_display_event(self, timeout=None):
+        '''wait at most timeout seconds (forever if None) for an output or the
+        screen to change, and return whether that happened.'''
+        if not self._watching:
+            self.screen.select_input(xrandr.RR_SCREEN_CHANGE_NOTIFY_MASK |
+                xrandr.RR_OUTPUT_CHANGE_NOTIFY_MASK)
+            self._watching = True
+        return self.screen.wait_event(timeout) != None
+
+
     def get_displays(self):
         '''return an array of connected displays'''
+        outputs = self._get_outputs()
+        if outputs is not None:
+            return map(lambda o: o['name'], filter(lambda o: o['connected'],
+                sorted(outputs.values(), key=lambda o: o['index'])))
         displays = self.screen.get_outputs()
         displays = filter(lambda o: o.is_connected(), displays)
         displays = map(lambda o: o.name, displays)
@@ -49,45 +82,184 @@ class XRandrSwitcher:
 
     def get_display_supported_res(self, ndisp):
         '''return a set of supported resolutions for a display.'''
+        outputs = self._get_outputs()
+        if outputs is not None:
+            return outputs[ndisp]['resolutions']
         o = self.screen.get_output_by_name(ndisp)
         return o.get_available_resolutions()
 
 
     def get_display_preferred_res(self, ndisp):
-        '''return the preferred resolution for a display.'''
+        '''return the preferred resolution for a display, or None if it has
+        none.'''
+        outputs = self._get_outputs()
+        if outputs is not None:
+            return outputs[ndisp]['preferred']
         o = self.screen.get_output_by_name(ndisp)
-        m = o.get_available_modes()[o.get_preferred_mode()]
+        index = o.get_preferred_mode()
+        if index is None: return None
+        m = o.get_available_modes()[index]
         return [m.width,m.height]
 
 
+    def probe_displays(self, displays):
+        '''return a dict with a tuple (supported resolutions, preferred
+        resolution) for each display. The information of all outputs and
+        crtcs is requested in a single pipelined batch, see _get_outputs().'''
+        probed = {}
+        for d in displays:
+            probed[d] = (self.get_display_supported_res(d),
+                         self.get_display_preferred_res(d))
+        return probed
+
+
+    def _get_randr(self):
+        '''return the RandRControl used for pipelined requests, which is
+        connected on first use; or False if RandR can't be used that way.'''
+        if self._randr is None:
+            try:
+                from xrandr.randrctl import RandRControl
+                self._randr = RandRControl()
+            except Exception, e:
+                self.log.info('no pipelined RandR connection: %s'%e)
+                self._randr = False
+        return self._randr
+
+
+    def _get_outputs(self):
+        '''return a dict with the information of each output by name, or None
+        if RandR can't be used for pipelined requests and libXrandr is to be
+        used instead. The screen resources are requested first, then the
+        information of all outputs and crtcs at once, instead of a round trip
+        for each as libXrandr does. The information is a dict with the output
+        id, index, connected, resolutions, preferred (as [w,h] or None) and,
+        when active, layout as returned by get_current_layout().'''
+        if self._outputs is None:
+            randr = self._get_randr()
+            if not randr: return None
+            try:
+                res, outputs, crtcs = randr.get_screen_config(self._probe)
+            except Exception, e:
+                self.log.info('pipelined RandR request failed: %s'%e)
+                self._randr = False
+                return None
+            if self._probe:
+                # libXrandr doesn't need to probe the outputs again
+                self.screen = xrandr.Screen(self.screen._display, probe=False)
+                self._probe = False
+            modes = dict(map(lambda m: (m['id'], m), res.modes))
+            self._outputs = {}
+            for index, oid in enumerate(res.outputs):
+                info = outputs[oid]
+                # modes unknown to the screen are skipped, like libXrandr does
+                omodes = filter(lambda m: m in modes, info.modes)
+                preferred = filter(lambda m: m in modes, info.modes[:info.num_preferred])
+                o = {'id': oid, 'name': info.name, 'index': index,
+                     'connected': info.connection in (randrctl.RR_CONNECTED,
+                         randrctl.RR_UNKNOWN_CONNECTION),
+                     'resolutions': sorted(set(map(lambda m:
+                         (modes[m]['width'], modes[m]['height']), omodes))),
+                     'preferred': None, 'layout': None}
+                if preferred:
+                    o['preferred'] = [modes[preferred[0]]['width'], modes[preferred[0]]['height']]
+                crtc = crtcs.get(info.crtc)
+                if crtc and crtc.mode in modes:
+                    mode = modes[crtc.mode]
+                    o['layout'] = (Resolution([mode['width'], mode['height']]),
+                        (crtc.x, crtc.y), randrctl.get_mode_rate(mode), crtc.rotation)
+                self._outputs[info.name] = o
+        return self._outputs
+
+
+    def set_refresh_rate(self, rate):
+        '''set the refresh rate in Hz to select modes by, or None for the
+        best mode of each resolution'''
+        self._refresh_rate = rate
+
+
     def get_display_edid(self, ndisp):
-        '''return the EDID data for a display.'''
-        # not available now
-        return None
+        '''return the EDID data for a display, or None if it has no valid
+        EDID. The EDIDs of all outputs are requested together on first use.'''
+        if self._edids is None:
+            self._edids = self._get_edids()
+        if self._edids is not None:
+            edid_data = self._edids.get(ndisp)
+        else:
+            # one request per output, when it is needed
+            edid_data = self.screen.get_output_by_name(ndisp).get_edid()
+        if not edid_data or len(edid_data) < 128 or not Edid(edid_data).valid:
+            return None
+        return edid_data
+
+
+    def _get_edids(self):
+        '''return a dict with the EDID data of each connected display, which
+        are requested in a single pipelined batch; or None if that is not
+        possible and they have to be requested one by one. The outputs are
+        taken from _get_outputs(), so that the same RandR connection serves
+        all probing.'''
+        outputs = self._get_outputs()
+        if outputs is None: return None
+        outputs = filter(lambda o: o['connected'], outputs.values())
+        edids = {}
+        try:
+            # older drivers use EdidData instead of EDID
+            for name in ['EDID', 'EdidData']:
+                outputs = filter(lambda o: o['name'] not in edids, outputs)
+                if not outputs: break
+                values = self._randr.get_outputs_property(
+                    map(lambda o: o['id'], outputs), name)
+                for o, data in zip(outputs, values):
+                    if data: edids[o['name']] = data
+        except Exception, e:
+            self.log.info('pipelined EDID request failed: %s'%e)
+            self._randr = False
+            return None
+        return edids
+
+
+    def get_driver_version(self):
+        '''return a string identifying the driver and its version'''
+        return 'xrandr %d.%d'%xrandr.XRANDR_VERSION
 
 
     def switch_clone(self, displays, res):
         '''switch to resolution and clone all displays'''
         ress = ResolutionSelection(res, displays)
-        return self._switch(displays, ress, xrandr.RELATION_SAME_AS)
+        return self._switch(displays, ress, None)
 
 
     def switch_extend(self, displays, direction, ress):
         '''extend desktop across all displays. direction is one of
-        'left'/'right'/'bottom'/'top', and ress a dict of a resolution
+        'left'/'right'/'bottom'/'top'/'grid', and ress a dict of a resolution
         for each display.'''
-        relation = None
-        if direction=='left':
-            relation = xrandr.RELATION_LEFT_OF
-        elif direction=='right':
-            relation = xrandr.RELATION_RIGHT_OF
-        elif direction=='top':
-            relation = xrandr.RELATION_ABOVE
-        elif direction=='bottom':
-            relation = xrandr.RELATION_BELOW
-        else:
-            raise ValueError('extend direction must be left/right/bottom/top')
-        return self._switch(displays, ress, relation)
+        if direction not in DIRECTIONS:
+            raise ValueError('extend direction must be left/right/bottom/top/grid')
+        return self._switch(displays, ress, direction)
+
+
+    def get_current_layout(self):
+        '''return the current configuration as a dict with a tuple
+        (Resolution, (x, y), refresh rate) for each display in use, or None
+        when a display is rotated.'''
+        layout = {}
+        outputs = self._get_outputs()
+        if outputs is not None:
+            for o in outputs.values():
+                if not o['layout']: continue
+                if o['layout'][3] != randrctl.RR_ROTATE_0: return None
+                layout[o['name']] = o['layout'][:3]
+            return layout
+        for o in self.screen.get_outputs():
+            if not o.is_active(): continue
+            crtc = self.screen.get_crtc_by_xid(o.get_crtc())
+            if not crtc: return None
+            x, y, mode, rotation, outputs = crtc.get_current_config()
+            if not mode or rotation != xrandr.RR_ROTATE_0: return None
+            mode = self.screen.get_mode_by_xid(mode)
+            layout[o.name] = (Resolution([mode.width, mode.height]), (x, y),
+                xrandr.core.get_mode_rate(mode))
+        return layout
 
 
     def import_config(self, cfg):
@@ -101,33 +273,40 @@ class XRandrSwitcher:
         raise NotImplementedError('export not yet implemented')
 
 
-    def _switch(self, displays, ress, relation):
-        '''switch displays to the specified resolution according to XRandR relation'''
-        dprev = None
+    def _switch(self, displays, ress, direction):
+        '''switch displays to the specified resolution, placed in direction
+        as layout_displays() does'''
         old_displays = self.get_displays()
+        # keep the rotation of outputs
+        sizes = {}
+        rotations = {}
+        for d in displays:
+            sizes[d] = ress[d].size()
+            rotation = self.screen.get_output_by_name(d)._rotation
+            if rotation & (xrandr.RR_ROTATE_90|xrandr.RR_ROTATE_270):
+                rotations[d] = 90
+        positions, size = layout_displays(displays, sizes, direction,
+                                          rotations=rotations)
         for d in displays:
             res = ress[d]
             s = res.size()
-            # for each display, select mode with highest refresh rate at res
+            # for each display, select the best mode at res, which is the
+            # preferred one or has the highest or requested refresh rate
             o = self.screen.get_output_by_name(d)
-            modes = []
-            for i,mode in enumerate(o.get_available_modes()):
-                if mode.width != s[0]: continue
-                if mode.height != s[1]: continue
-                refresh = mode.dotClock/(mode.hTotal*mode.vTotal)
-                modes.append([i, refresh])
-            modes.sort(lambda x,y: x[1]-y[1])
+            mode = o.get_best_mode_index(s[0], s[1], self._refresh_rate)
+            if mode is None:
+                raise ValueError('Mode %dx%d is invalid for display %s'%(s[0], s[1], d))
+            modes = o.get_available_mode_indices(s[0], s[1])
             if len(modes) > 1:
                 self.log.info(str(d)+': available refresh rates for resolution '+
-                    str(res)+': '+', '.join(map(lambda o: '%d'%(o[1]), modes)))
-            if len(modes) == 0:
-                raise ValueError('Mode %dx%d is invalid for display %s'%(s[0], s[1], d))
-            mode = modes[-1]
-            self.log.info(str(d)+': selecting XRandR mode #%d: %s %dHz'%(mode[0],res,mode[1]))
-            o.set_to_mode(mode[0])
-            if dprev:
-                o.set_relation(dprev, relation)
-            dprev = d
+                    str(res)+': '+', '.join(map(lambda m: '%.2f'%o.get_available_mode_rate(m), modes)))
+            rate = o.get_available_mode_rate(mode)
+            if self._refresh_rate is not None and abs(rate - self._refresh_rate) >= 0.5:
+                self.log.warning(str(d)+': refresh rate %gHz not available for resolution %s'%(
+                    self._refresh_rate, res))
+            self.log.info(str(d)+': selecting XRandR mode #%d: %s %.2fHz'%(mode,res,rate))
+            o.set_to_mode(mode)
+            o.set_position(*positions[d])
             if d in old_displays: old_displays.remove(d)
             
         if len(old_displays)>0:
@@ -136,6 +315,8 @@ class XRandrSwitcher:
                 o.disable()
         
         self.screen.apply_output_config()
+        # the configuration has changed
+        self._outputs = None
 
     def set_scaling(self, displays, scaling):
         if scaling == "default" : return
@@ -0,0 +1,744 @@
+###############################################################################
+# minx.py - an example of a minimal X Protocol interface in python
+#
+# code taken from NvThermometer by Harry Organs, which was based on the code
+# for python-xlib, written by Peter Liljenberg
+# http://python-xlib.sourceforge.net/
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#        
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License at http://www.gnu.org/licenses/gpl.txt
+# By using, editing and/or distributing this software you agree to
+# the terms and conditions of this license.
+
+import struct
+import socket
+import select
+import xnet
+
+
+# struct codes for each X type; formats are compiled with '=' so that sizes
+# are the standard ones on every architecture
+__XFORMATS = { 'CARD8':'B','CARD16':'H','INT8':'b','INT16':'h',
+'PAD':'x','BYTE':'B','CARD32':'I','INT32':'i','STRING8':'s' }
+
+_XStruct__XFORMATS = __XFORMATS
+
+__XERRORMSG = { 1:'Request error. The major or minor opcode of a request is \
+invalid.',
+2:'Value error. A request contained a bad argument value.',
+3:'Window error. A value for a WINDOW argument does not name a defined \
+WINDOW.',
+4:'Pixmap error. A value for a PIXMAP argument does not name a defined PIXMAP.',
+5:'Atom error. A value for an ATOM argument does not name a defined ATOM.',
+6:'Cursor error. A value for a CURSOR argument does not name a defined \
+CURSOR.',
+7:'Font error. A value for a FONT argument does not name a defined FONT \
+or a value for a FONTABLE argument does not name a defined FONT or a \
+defined GCONTEXT.',
+8:'Match error. InputOnly window used as a DRAWABLE, or GCONTEXT argument \
+does not have the same root and depth as the destination DRAWABLE argument, \
+or argument(s) fails to match request requirements.',
+9:'Drawable error. A value for a DRAWABLE argument does not name a defined \
+WINDOW or PIXMAP.',
+10:'Access error. Resource access violation or conflict with another client',
+11:'Alloc error. The server failed to allocate the requested resource.',
+12:'Colormap error. A value for a COLORMAP argument does not name a defined \
+COLORMAP.',
+13:'GContext error. A value for a GCONTEXT argument does not name a defined \
+GCONTEXT.',
+14:'IDChoice error. The value chosen for a resource identifier either is not \
+included in the range assigned to the client or is already in use.',
+15:'Name error. A font or color of the specified name does not exist.',
+16:'Length error. The length of a request is shorter or longer than that \
+required to minimally contain the arguments, or the length of a request \
+exceeds the maximum length accepted by the server.',
+17:'Implementation error. The server does not implement some aspect of the \
+request.' }
+
+_XServerError__XERRORMSG = __XERRORMSG
+
+class XData:
+    '''XData is a simple argument container used to avoid the
+    pain and errors of indexing'''
+
+    def __init__( self, f, s, v ):
+        self.format = f
+        self.size = s
+        self.value = v
+
+
+class XStruct:
+    '''XStruct compiles a list of XData fields into a single struct.Struct,
+    so that a request or reply is encoded or decoded with one call instead
+    of one per field. The XData args are X type, number of elements, and
+    the key name of the field. The number of elements can also be the key
+    name of an earlier field; from there on the fields have a variable
+    length and are handled one by one after the fixed part, the value of
+    a variable length field is always a sequence. Strings are padded to a
+    multiple of four bytes, PAD fields are skipped.'''
+
+    def __init__( self, *fields ):
+        self.fields = fields
+        self._keys = []     # (name, count) for each value in the fixed part
+        fmt = '='
+        nfixed = 0
+        for arg in fields:
+            if isinstance(arg.size, str): break
+            nfixed += 1
+            structcode = __XFORMATS[arg.format]
+            if arg.format == 'PAD':
+                fmt += '%dx' % arg.size
+                continue
+            if arg.format == 'STRING8':
+                fmt += '%ds%dx' % ( arg.size, -arg.size % 4 )
+                self._keys.append( (arg.value, None) )
+            elif arg.size == 1:
+                fmt += structcode
+                self._keys.append( (arg.value, None) )
+            else:
+                fmt += '%d%s' % ( arg.size, structcode )
+                self._keys.append( (arg.value, arg.size) )
+        self.struct = struct.Struct( fmt )
+        self.size = self.struct.size
+        self._tail = fields[nfixed:]
+        self._names = [ name for name, count in self._keys ]
+        self._simple = not filter( lambda k: k[1], self._keys )
+
+    def pack( self, *values ):
+        '''return the encoding of values, one for each field but PADs'''
+        if self._simple and not self._tail:
+            return self.struct.pack( *values )
+        named = dict( zip(self._names, values) )
+        args = []
+        for name, count in self._keys:
+            if count: args.extend( named[name] )
+            else: args.append( named[name] )
+        bytestream = [ self.struct.pack( *args ) ]
+        values = values[len(self._keys):]
+        for arg in self._tail:
+            count = arg.size
+            if isinstance(count, str): count = named[count]
+            if arg.format == 'PAD':
+                bytestream.append( '\0' * count )
+                continue
+            value, values = values[0], values[1:]
+            named[arg.value] = value
+            if arg.format == 'STRING8':
+                bytestream.append( struct.pack( '=%ds%dx' % (count, -count % 4), value ) )
+            elif count == 1 and not isinstance(arg.size, str):
+                bytestream.append( struct.pack( '=' + __XFORMATS[arg.format], value ) )
+            else:
+                bytestream.append( struct.pack( '=%d%s' % (count, __XFORMATS[arg.format]), *value ) )
+        return ''.join( bytestream )
+
+    def unpack_from( self, data, offset=0 ):
+        '''decode data starting at offset; returns a dict with the value
+        for each field by name and the offset just after the last field'''
+        values = self.struct.unpack_from( data, offset )
+        offset += self.size
+        if self._simple:
+            rdict = dict( zip(self._names, values) )
+        else:
+            rdict = {}
+            i = 0
+            for name, count in self._keys:
+                if count:
+                    rdict[name] = values[i:i+count]
+                    i += count
+                else:
+                    rdict[name] = values[i]
+                    i += 1
+        for arg in self._tail:
+            count = arg.size
+            if isinstance(count, str): count = rdict[count]
+            if arg.format == 'PAD':
+                offset += count
+            elif arg.format == 'STRING8':
+                rdict[arg.value] = struct.unpack_from( '%ds' % count, data, offset )[0]
+                offset += count + (-count % 4)
+            elif count == 1 and not isinstance(arg.size, str):
+                structcode = '=' + __XFORMATS[arg.format]
+                rdict[arg.value] = struct.unpack_from( structcode, data, offset )[0]
+                offset += struct.calcsize( structcode )
+            else:
+                structcode = '=%d%s' % ( count, __XFORMATS[arg.format] )
+                rdict[arg.value] = struct.unpack_from( structcode, data, offset )
+                offset += struct.calcsize( structcode )
+        return rdict, offset
+
+    def unpack( self, data ):
+        '''decode data; returns a dict with the value for each field by name
+        and the data that remains after the last field'''
+        rdict, offset = self.unpack_from( data )
+        return rdict, data[offset:]
+
+
+# compiled formats for encode() and decode()
+__XSTRUCTS = {}
+
+def encode( *arguments ):
+    '''encode takes a variable argument list consisting of XData
+    types and returns an encoded byte stream ready to send to the X server.
+    the XData args are X type, number of elements, and the value(s). the
+    order of fields in the resulting byte stream is determined by the order
+    of their respective arguments. Request classes use an XStruct directly.'''
+
+    key = tuple([ (arg.format, arg.size) for arg in arguments ])
+    if key not in __XSTRUCTS:
+        __XSTRUCTS[key] = XStruct( *[XData(f, s, i) for i, (f, s) in enumerate(key)] )
+    return __XSTRUCTS[key].pack( *[arg.value for arg in arguments if arg.format != 'PAD'] )
+
+
+def decode( binary, *arguments ):
+    '''decode takes a byte stream and a variable argument list of XData
+    types and returns a dict containing the decoded byte stream.
+    the XData args are X type, number of elements, and the key name to
+    be associated with the value. the order of arguments determines
+    what order the fields will be decoded in. Reply classes use an XStruct
+    directly.'''
+
+    key = tuple([ (arg.format, arg.size, arg.value) for arg in arguments ])
+    if key not in __XSTRUCTS:
+        __XSTRUCTS[key] = XStruct( *arguments )
+    return __XSTRUCTS[key].unpack( binary )
+
+
+###############################################################################
+# Exception class for X server errors
+#
+class XServerError(Exception):
+    '''XServerError is an Exception class to raise X errors.
+    this class decodes the error return and selects the message
+    to display. the error messages are copied from the X Protocol
+    pdf. see the doc for an explanation of the other_info field,
+    which contains extra data for some errors.'''
+
+    _format = XStruct( XData('CARD8',1,'Error'),
+        XData('CARD8',1,'code'),
+        XData('CARD16',1,'sequence_number'),
+        XData('CARD32',1,'other_info'),
+        XData('CARD16',1,'minor_opcode'),
+        XData('CARD8',1,'major_opcode'),
+        XData('PAD',21,'unused') )
+
+    def __init__(self,encoding):
+        xreply, ad = self._format.unpack_from( encoding )
+        
+        self.error_code = xreply['code']
+        self.sequence_number = xreply['sequence_number']
+        self.major_opcode = xreply['major_opcode']
+        self.minor_opcode = xreply['minor_opcode']
+        self.message = __XERRORMSG.get(self.error_code, 'Extension error.')
+        self.other_info = xreply['other_info']
+        
+    def __str__(self):
+        return 'X Error ' + str(self.error_code) + ': ' + self.message
+
+
+        
+###############################################################################
+# Connection Setup request and replies
+#
+class XConnectRequest:
+    '''XConnectRequest encodes the packet needed to connect to the X server'''
+
+    _format = XStruct( XData('BYTE',1,'byte_order'),
+        XData('PAD',1,'unused_1'),
+        XData('CARD16',1,'protocol_major_version'),
+        XData('CARD16',1,'protocol_minor_version'),
+        XData('CARD16',1,'sz_auth_name'),
+        XData('CARD16',1,'sz_auth_data'),
+        XData('PAD',2,'unused_2'),
+        XData('STRING8','sz_auth_name','auth_name'),
+        XData('STRING8','sz_auth_data','auth_data') )
+
+    def __init__(self, byte_order, proto_major,
+    proto_minor, auth_name, auth_data ):    
+        self.encoding = self._format.pack( byte_order, proto_major,
+            proto_minor, len(auth_name), len(auth_data), auth_name, auth_data )
+
+        
+class XConnectRefusedReply:
+    '''X server reply for failed logon attempt'''
+
+    _format = XStruct( XData('BYTE',1,'Failed'),
+        XData('BYTE',1,'sz_reason'),
+        XData('CARD16',1,'protocol_major_version'),
+        XData('CARD16',1,'protocol_minor_version'),
+        XData('CARD16',1,'sz_additional'),
+        XData('STRING8','sz_reason','reason') )
+
+    def __init__(self,encoding):
+        xreply, n = self._format.unpack_from( encoding )
+        self.__dict__.update( xreply )
+
+class XConnectAcceptedReply:
+    '''the logon reply. contains all the info needed by
+    clients to create windows, etc, as well as various
+    server info like vendor name'''
+
+    _format = XStruct( XData('BYTE',1,'Success'),
+        XData('PAD',1,'unused_1'), 
+        XData('CARD16',1,'protocol_major_version'),
+        XData('CARD16',1,'protocol_minor_version'),
+        XData('CARD16',1,'sz_additional'),
+        XData('CARD32',1,'release_number'),
+        XData('CARD32',1,'resource_id_base'),
+        XData('CARD32',1,'resource_id_mask'),
+        XData('CARD32',1,'motion_buffer_size'),
+        XData('CARD16',1,'sz_vendor'),
+        XData('CARD16',1,'maximum_request_length'),
+        XData('CARD8',1,'n_SCREENS'),
+        XData('BYTE',1,'n_FORMATS'),
+        XData('BYTE',1,'image_byte_order'),
+        XData('BYTE',1,'bitmap_format_bit_order'),
+        XData('CARD8',1,'bitmap_format_scanline_unit'),
+        XData('CARD8',1,'bitmap_format_scanline_pad'),
+        XData('CARD8',1,'min_keycode'),
+        XData('CARD8',1,'max_keycode'),
+        XData('PAD',4,'unused_2'),
+        XData('STRING8','sz_vendor','vendor') )
+
+    _pixmap_format = XStruct( XData('CARD8',1,'depth'),
+        XData('CARD8',1,'bits_per_pixel'),
+        XData('CARD8',1,'scanline_pad'),
+        XData('PAD',5,'unused') )
+
+    _screen_format = XStruct( XData('CARD32',1,'root'),
+        XData('CARD32',1,'default_colormap'),
+        XData('CARD32',1,'white_pixel'),
+        XData('CARD32',1,'black_pixel'),
+        XData('CARD32',1,'current_input-masks'),
+        XData('CARD16',1,'width_in_pixels'),
+        XData('CARD16',1,'height_in_pixels'),
+        XData('CARD16',1,'width_in_millimeters'),
+        XData('CARD16',1,'height_in_millimeters'),
+        XData('CARD16',1,'min_installed_maps'),
+        XData('CARD16',1,'max_installed_maps'),
+        XData('CARD32',1,'root_visual'),
+        XData('CARD8',1,'backing_stores'),
+        XData('CARD8',1,'save_unders'),
+        XData('CARD8',1,'root_depth'),
+        XData('CARD8',1,'n_allowed_depths') )
+
+    _depth_format = XStruct( XData('CARD8',1,'depth'),
+        XData('PAD',1,'unused_1'),
+        XData('CARD16',1,'n_VISUALTYPES'),
+        XData('PAD',4,'unused_2') )
+
+    _visual_format = XStruct( XData('CARD32',1,'visual_id'),
+        XData('CARD8',1,'class'),
+        XData('CARD8',1,'bits_per_rgb_value'),
+        XData('CARD16',1,'colormap_entries'),
+        XData('CARD32',1,'red_mask'),
+        XData('CARD32',1,'green_mask'),
+        XData('CARD32',1,'blue_mask'),
+        XData('PAD',4,'unused') )
+
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from( encoding )
+        self.__dict__.update( xreply )
+    
+        self.pixmap_formats = []
+        for p in range(self.n_FORMATS):
+            pfe, offset = self._pixmap_format.unpack_from( encoding, offset )
+            self.pixmap_formats.append(pfe)
+        
+        self.roots = []
+        for s in range(self.n_SCREENS):
+            se, offset = self._screen_format.unpack_from( encoding, offset )
+
+            se['allowed_depths'] = []
+            for d in range(se['n_allowed_depths']):
+                de, offset = self._depth_format.unpack_from( encoding, offset )
+                
+                de['visuals'] = []
+                for v in range(de['n_VISUALTYPES']):
+                    ve, offset = self._visual_format.unpack_from( encoding, offset )
+                    de['visuals'].append(ve)
+                se['allowed_depths'].append(de)
+
+            self.roots.append(se)
+
+
+
+class XConnectAuthenticateReply:
+    '''reply sent by secured servers to request client authentication.
+    authentication procedures are not defined by the X protcol, so the
+    way to handle this one is outside an X protocol interface. Should
+    probably raise some kind of exception if unhandled'''
+
+    _format = XStruct( XData('BYTE',1,'Authenticate'),
+        XData('PAD',5,'unused'),
+        XData('CARD16',1,'sz_additional') )
+
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from( encoding )
+        self.__dict__.update( xreply )
+        # the reason is padded with zeroes to a multiple of four bytes
+        self.reason = struct.unpack_from( '%ds' % (self.sz_additional*4),
+            encoding, offset )[0].rstrip('\0')
+
+
+###############################################################################
+# InternAtom request and reply - opcode 16
+#
+class XInternAtomRequest:
+    '''this class wraps the X Protocol Intern Atom request. it requires
+    the name of the atom; when only_if_exists is set, no atom is created
+    and atom 0 is returned if it doesn't exist yet'''
+
+    _format = XStruct( XData('CARD8',1,'opcode'),
+        XData('CARD8',1,'only_if_exists'),
+        XData('CARD16',1,'length'),
+        XData('CARD16',1,'n'),
+        XData('PAD',2,'unused'),
+        XData('STRING8','n','name') )
+
+    def __init__(self,name,only_if_exists=True):
+        self.encoding = self._format.pack( 16, only_if_exists,
+            2 + (len(name)+3)/4, len(name), name )
+
+class XInternAtomReply:
+    _format = XStruct( XData('CARD8',1,'reply'),
+        XData('PAD',1,'unused_1'),
+        XData('CARD16',1,'sequence_number'),
+        XData('CARD32',1,'reply_length'),
+        XData('CARD32',1,'atom'),
+        XData('PAD',20,'unused_2') )
+
+    def __init__(self,encoding):
+        xreply, ad = self._format.unpack_from( encoding )
+        self.__dict__.update( xreply )
+
+
+###############################################################################
+# QueryExtension request and reply - opcode 98
+#
+class XQueryExtensionRequest:
+    '''this class wraps the X Protocol Query Extension request. it
+    requires the name of the extension to look for as a constructor arg'''
+
+    _format = XStruct( XData('CARD8',1,'opcode'),
+        XData('PAD',1,'unused_1'),
+        XData('CARD16',1,'length'),
+        XData('CARD16',1,'n'),
+        XData('PAD',2,'unused_2'),
+        XData('STRING8','n','name') )
+
+    def __init__(self,exname):
+        self.encoding = self._format.pack( 98, 2 + (len(exname)+3)/4,
+            len(exname), exname )
+
+class XQueryExtensionReply:
+    '''the reply to a Query Extension request. if attr present is
+    0, the extension isn't there. if present is 1, extension exists
+    and the extension opcode, base error, and base event are returned'''
+
+    _format = XStruct( XData('CARD8',1,'reply'),
+        XData('PAD',1,'unused_1'),
+        XData('CARD16',1,'sequence_number'),
+        XData('CARD32',1,'reply_length'),
+        XData('CARD8',1,'present'),
+        XData('CARD8',1,'major_opcode'),
+        XData('CARD8',1,'first_event'),
+        XData('CARD8',1,'first_error'),
+        XData('PAD',20,'unused_2') )
+
+    def __init__(self,encoding):
+        xreply, ad = self._format.unpack_from( encoding )
+        self.__dict__.update( xreply )
+
+
+###############################################################################
+# ListExtensions request and reply - opcode 99
+#
+class XListExtensionsRequest:
+    '''this class wraps the X List Extensions request'''
+
+    _format = XStruct( XData('CARD8',1,'opcode'),
+        XData('PAD',1,'unused'),
+        XData('CARD16',1,'length') )
+
+    def __init__(self):
+        self.encoding = self._format.pack( 99, 1 )
+
+class XListExtensionsReply:
+    '''this class wraps the X List Extensions reply. it contains
+    the extensions as a list of strings, as well as the number
+    of strings in the list and the sequence number of request'''
+
+    _format = XStruct( XData('CARD8',1,'reply'),
+        XData('CARD8',1,'n_STRs'),
+        XData('CARD16',1,'sequence_number'),
+        XData('CARD32',1,'reply_length'),
+        XData('PAD',24,'unused') )
+
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from( encoding )
+        self.__dict__.update( xreply )
+
+        self.names = []
+        for s in range(xreply['n_STRs']):
+            sz = struct.unpack_from( 'B', encoding, offset )[0]
+            self.names.append( struct.unpack_from( '%ds'%sz, encoding, offset+1 )[0] )
+            offset += sz+1
+
+
+
+###############################################################################
+# Pipelined transport
+#
+class XGetInputFocusRequest:
+    '''GetInputFocus has a small reply and no side effects, which makes it
+    suitable to make sure that all preceding requests have been processed'''
+
+    _format = XStruct( XData('CARD8',1,'opcode'),
+        XData('PAD',1,'unused'),
+        XData('CARD16',1,'length') )
+
+    def __init__(self):
+        self.encoding = self._format.pack( 43, 1 )
+
+class XGetInputFocusReply:
+    '''the reply to a GetInputFocus request'''
+
+    _format = XStruct( XData('CARD8',1,'reply'),
+        XData('CARD8',1,'revert_to'),
+        XData('CARD16',1,'sequence_number'),
+        XData('CARD32',1,'reply_length'),
+        XData('CARD32',1,'focus'),
+        XData('PAD',20,'unused') )
+
+    def __init__(self,encoding):
+        xreply, ad = self._format.unpack_from( encoding )
+        self.__dict__.update( xreply )
+
+class XSocket:
+    '''XSocket wraps the socket connected to the X server and keeps track
+    of request sequence numbers. Requests can be queued with enqueue() and
+    sent all at once with flush(), which reads back all replies in a single
+    pass and matches replies and errors to their requests. Other attributes
+    are passed on to the socket itself.'''
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sequence_number = 0    # sequence number of last request queued
+        self.events = []            # events received while waiting for replies
+        self.max_events = 64        # oldest events are dropped beyond this
+        # replies carry only the lower 16 bits of the sequence number, so
+        # at most this many requests may be outstanding, including the
+        # request added by flush()
+        self.max_pending = 0xffff
+        self._queue = []            # unsent requests as (seq, request, reply)
+        self._results = []          # results of requests sent by enqueue()
+        # replies are read into a buffer that is reused between requests
+        self._buffer = bytearray( 4096 )
+        self._view = memoryview( self._buffer )
+        self._start = self._end = 0 # unread data in buffer
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+    def setup(self, rq):
+        '''send the connection setup request and return the raw reply'''
+        self._send( rq.encoding )
+        self._fill( 8 )
+        additional = struct.unpack_from( '=H', self._buffer, self._start+6 )[0]
+        self._fill( 8 + additional*4 )
+        return self._take( 8 + additional*4 ).tobytes()
+
+    def enqueue(self, rq, reply=None):
+        '''queue a request; reply is the class to decode its reply with, or
+        None if the request doesn't generate a reply. Nothing is sent until
+        flush() is called, unless max_pending requests are queued already;
+        those are sent first and their results returned by the next flush().
+        Returns the sequence number of the request.'''
+        if len(self._queue) >= self.max_pending:
+            self._results.extend( self._exchange() )
+        self.sequence_number += 1
+        self._queue.append( (self.sequence_number, rq, reply) )
+        return self.sequence_number
+
+    def flush(self):
+        '''send all queued requests at once and wait for their replies.
+        Returns a list with, for each queued request in order, the decoded
+        reply, None if the request has no reply, or an XServerError if the
+        request failed. Errors are returned instead of raised so that the
+        caller can decide what to do with the other replies. Replies are
+        decoded into copies, since the packets they are read from are
+        overwritten by the next read.'''
+        results, self._results = self._results, []
+        return results + self._exchange()
+
+    def _exchange(self):
+        '''send the queued requests and return their results, see flush()'''
+        if not self._queue: return []
+        # a request without reply can only be known to be processed when a
+        # later one has been answered, so make sure the last one has a reply
+        nrequests = len(self._queue)
+        if not self._queue[-1][2]:
+            self.sequence_number += 1
+            self._queue.append( (self.sequence_number, XGetInputFocusRequest(),
+                                 XGetInputFocusReply) )
+        queue, self._queue = self._queue, []
+        results = [None] * len(queue)
+        # replies contain only the lower 16 bits of the sequence number
+        pending = {}
+        for i, (seq, rq, reply) in enumerate(queue):
+            pending[seq & 0xffff] = i
+        self._send( ''.join([rq.encoding for seq, rq, reply in queue]) )
+        last = queue[-1][0] & 0xffff
+        while True:
+            packet = self._read_packet()
+            kind = packet[0]
+            if kind != '\x00' and kind != '\x01':
+                self._keep_event( packet )
+                continue
+            seq = struct.unpack_from( '=H', packet, 2 )[0]
+            if seq not in pending:
+                continue
+            i = pending[seq]
+            if kind == '\x00':
+                results[i] = XServerError( packet )
+            elif queue[i][2]:
+                results[i] = queue[i][2]( packet )
+            if seq == last: break
+        return results[:nrequests]
+
+    def next_event(self, timeout=None):
+        '''return the next event from the X server, waiting at most timeout
+        seconds (forever if None). Returns None when no event arrived in time.
+        Events that arrived while waiting for replies are returned first.'''
+        while not self.events:
+            # only wait when there is no complete packet in the buffer
+            if self._end - self._start < 32:
+                r, w, x = select.select( [self.sock], [], [], timeout )
+                if not r: return None
+            packet = self._read_packet()
+            # stray replies and errors are skipped, there is nothing waiting
+            # for them
+            if packet[0] != '\x00' and packet[0] != '\x01':
+                self._keep_event( packet )
+        return self.events.pop(0)
+
+    def _keep_event(self, packet):
+        '''store a copy of an event packet until next_event() is called;
+        when nobody does, only the last max_events are kept'''
+        self.events.append( packet.tobytes() )
+        if len(self.events) > self.max_events:
+            del self.events[:-self.max_events]
+
+    def _read_packet(self):
+        '''read a single reply, error or event from the X server. A view on
+        the receive buffer is returned, which is only valid until the next
+        packet is read.'''
+        self._fill( 32 )
+        size = 32
+        # replies and generic events (35) may have additional data
+        kind = self._buffer[self._start]
+        if kind == 1 or kind == 35:
+            size += struct.unpack_from( '=I', self._buffer, self._start+4 )[0]*4
+            self._fill( size )
+        return self._take( size )
+
+    def _take(self, size):
+        '''return a view on the next size buffered bytes and skip them. The
+        view is only valid until the next read: unread data is moved to the
+        front of the same buffer then, overwriting what the view shows.'''
+        packet = self._view[self._start:self._start+size]
+        self._start += size
+        return packet
+
+    def _fill(self, size):
+        '''make sure that at least size unread bytes are in the buffer'''
+        if self._end - self._start >= size: return
+        if self._start + size > len(self._buffer):
+            # move unread data to the front, to a larger buffer if needed;
+            # this overwrites the data of views handed out earlier
+            unread = self._buffer[self._start:self._end]
+            if size > len(self._buffer):
+                self._buffer = bytearray( max(size, 2*len(self._buffer)) )
+                self._view = memoryview( self._buffer )
+            self._buffer[:len(unread)] = unread
+            self._start, self._end = 0, len(unread)
+        try:
+            while self._end - self._start < size:
+                n = self.sock.recv_into( self._view[self._end:] )
+                if not n:
+                    raise xnet.XConnectionError( 'Connection closed by X server' )
+                self._end += n
+        except socket.error, err:
+            raise xnet.XConnectionError( 'Network error: %s' % err[1] )
+
+    def _send(self, data):
+        try:
+            self.sock.sendall( data )
+        except socket.error, err:
+            raise xnet.XConnectionError( 'Network error: %s' % err[1] )
+
+
+###############################################################################
+# Procedures to use the request classes to get info, etc
+#
+def Xchange( xsock, rq, reply=None ):
+    '''send a single request and wait for its reply, which is decoded with
+    the reply class given. Raises XServerError if the request failed.'''
+    xsock.enqueue( rq, reply )
+    xreply = xsock.flush()[0]
+    if isinstance(xreply, XServerError):
+        raise xreply
+    return xreply
+
+
+def XConnect():
+
+    name, host, displayno, screenno = xnet.get_X_display()
+    xsock = XSocket( xnet.get_X_socket( host, displayno ) )
+    auth_name, auth_data = xnet.get_X_auth( xsock, name, host, displayno )
+    byte_order = xnet.get_X_byteorder()
+
+    rq = XConnectRequest( byte_order, 11, 0, auth_name, auth_data )
+
+    xreply = xsock.setup( rq )
+
+    if xreply[0] == '\x00':
+        repobj = XConnectRefusedReply(xreply)
+        raise xnet.XConnectionError( repobj.reason )
+
+    elif xreply[0] == '\x01':
+        repobj = XConnectAcceptedReply(xreply)
+
+    elif xreply[0] == '\x02':
+        repobj = XConnectAuthenticateReply(xreply) 
+        raise xnet.XConnectionError( repobj.reason )
+
+    else:
+        raise xnet.XConnectionError( 'Unknown connection failure' )
+
+    return xsock, repobj
+
+
+def XListExtensions( xsock ):
+    rq = XListExtensionsRequest()
+    return Xchange( xsock, rq, XListExtensionsReply )
+
+
+def XQueryExtension( xsock, exname ):
+    rq = XQueryExtensionRequest(exname)
+    return Xchange( xsock, rq, XQueryExtensionReply )
+
+
+def XInternAtom( xsock, name, only_if_exists=True ):
+    rq = XInternAtomRequest(name, only_if_exists)
+    return Xchange( xsock, rq, XInternAtomReply ).atom
+    
+
+
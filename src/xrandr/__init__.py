@@ -49,6 +49,14 @@ RR_ROTATE_270 = 8
 RR_REFLECT_X = 16
 RR_REFLECT_Y = 32
 
+# Mode flags
+RR_HSYNC_POSITIVE = 1
+RR_HSYNC_NEGATIVE = 2
+RR_VSYNC_POSITIVE = 4
+RR_VSYNC_NEGATIVE = 8
+RR_INTERLACE = 16
+RR_DOUBLE_SCAN = 32
+
 RR_CONNECTED = 0
 RR_DISCONNECTED = 1
 RR_UNKOWN_CONNECTION = 2
@@ -74,6 +82,12 @@ CHANGES_AUTOMATIC = 64
 CHANGES_REFRESH = 128
 CHANGES_PROPERTY = 256
 
+# Event masks for XRRSelectInput
+RR_SCREEN_CHANGE_NOTIFY_MASK = 1
+RR_CRTC_CHANGE_NOTIFY_MASK = 2
+RR_OUTPUT_CHANGE_NOTIFY_MASK = 4
+RR_OUTPUT_PROPERTY_NOTIFY_MASK = 8
+
 # Relation information
 RELATION_ABOVE = 0
 RELATION_BELOW = 1
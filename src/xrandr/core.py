@@ -35,6 +35,7 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
 
 import os
+import select
 from ctypes import *
 
 import xrandr
@@ -47,6 +48,7 @@ Connection = c_ushort
 SubpixelOrder = c_ushort
 Time = c_ulong
 Rotation = c_ushort
+Atom = c_ulong
 Status = c_int
 
 xlib = cdll.LoadLibrary("libX11.so.6")
@@ -175,13 +177,57 @@ class Output:
         self._changes = xrandr.CHANGES_NONE
         self._x = 0
         self._y = 0
+        self._edid = None
 
         self.name = self._info.contents.name
+        self._index_modes()
+
+    def _index_modes(self):
+        """Looks up the modes of the output once, and indexes them by
+           resolution, best mode first. Only needed privately by the
+           bindings"""
+        self._modes = []
+        self._rates = []
+        self._preferred = []
+        self._modes_by_resolution = {}
+        output_modes = self._info.contents.modes
+        for m in range(self._info.contents.nmode):
+            mode = self._screen.get_mode_by_xid(output_modes[m])
+            if mode is None: continue
+            # the first npreferred modes of the output are the preferred ones
+            if m < self._info.contents.npreferred:
+                self._preferred.append(len(self._modes))
+            self._modes_by_resolution.setdefault((mode.width, mode.height),
+                                                 []).append(len(self._modes))
+            self._modes.append(mode)
+            self._rates.append(get_mode_rate(mode))
+        for indices in self._modes_by_resolution.values():
+            indices.sort(key=self._mode_rank, reverse=True)
+
+    def _mode_rank(self, index):
+        """Returns the ranking key of an available mode: the preferred mode
+           first, then progressive modes, then the highest refresh rate"""
+        mode = self._modes[index]
+        return (index in self._preferred,
+                not mode.modeFlags & xrandr.RR_INTERLACE,
+                self._rates[index])
 
     def __del__(self):
         """Frees the internal reference to the output info if the output gets
            removed"""
         rr.XRRFreeOutputInfo(self._info)
+    def get_edid(self):
+        """Returns the EDID of the connected output device as a string, or
+           None if it is not available. It is requested on first use"""
+        if self._edid is None:
+            self._edid = ''
+            if self.is_connected() and xrandr.XRANDR_VERSION >= (1,2):
+                for atom in self._screen._edid_atoms:
+                    self._edid = self._screen._get_output_property(self.id,
+                                                                   atom) or ''
+                    if self._edid: break
+        return self._edid or None
+
     def get_physical_width(self):
         """Returns the display width reported by the connected output device"""
         return self._info.contents.mm_width
@@ -197,9 +243,8 @@ class Output:
            be attached"""
         crtcs = []
         for i in range(self._info.contents.ncrtc):
-            for crtc in self._screen.crtcs:
-                if crtc.xid == self._info.contents.crtcs[i]:
-                    crtcs.append(crtc)
+            crtc = self._screen.get_crtc_by_xid(self._info.contents.crtcs[i])
+            if crtc: crtcs.append(crtc)
         return crtcs
 
     def get_available_rotations(self):
@@ -223,22 +268,33 @@ class Output:
 
     def get_available_modes(self):
         """Returns the list of supported mode lines (resolution, refresh rate)
-           that are supported by the connected device"""
-        modes = []
-        for m in range(self._info.contents.nmode):
-            output_modes = self._info.contents.modes
-            for s in range(self._screen._resources.contents.nmode):
-                screen_modes = self._screen._resources.contents.modes
-                if screen_modes[s].id == output_modes[m]:
-                    modes.append(screen_modes[s])
-        return modes
+           that are supported by the connected device. The list must not be
+           modified"""
+        return self._modes
+
+    def get_available_mode_indices(self, width, height):
+        """Returns the indices in the list of available modes of the modes
+           with the given resolution, best mode first"""
+        return self._modes_by_resolution.get((width, height), [])
+
+    def get_available_mode_rate(self, mode):
+        """Returns the exact refresh rate in Hz of the available mode with
+           the given index"""
+        return self._rates[mode]
+
+    def get_best_mode_index(self, width, height, rate=None):
+        """Returns the index in the list of available modes of the best mode
+           with the given resolution, or None if there is none. When a rate
+           is given the mode with the closest refresh rate is returned"""
+        indices = self.get_available_mode_indices(width, height)
+        if not indices: return None
+        if rate is None: return indices[0]
+        # min() returns the first of equally close modes, the best ranked
+        return min(indices, key=lambda i: abs(self._rates[i] - rate))
 
     def get_available_resolutions(self, reverse=False):
         """Return a list of available resolution pairs"""
-        res = set()
-        for mode in self.get_available_modes():
-            res.add((mode.width, mode.height))
-        ls = list(res)
+        ls = self._modes_by_resolution.keys()
         ls.sort(reverse=reverse)
         return  ls
 
@@ -246,9 +302,8 @@ class Output:
         """Return a list of rates that are available for the given
            resolution"""
         rates = set()
-        for mode in self.get_available_modes():
-            if mode.width == width and mode.height == height:
-                rates.add(mode.dotClock / (mode.hTotal * mode.vTotal))
+        for m in self.get_available_mode_indices(width, height):
+            rates.add(self._rates[m])
         ls = list(rates)
         ls.sort(reverse=reverse)
         return ls
@@ -257,7 +312,7 @@ class Output:
         """Return a tuple with the current height and width"""
         if self.is_active():
             mode = self._screen.get_mode_by_xid(self._mode)
-            return mode.dotClock / (mode.hTotal * mode.vTotal)
+            return get_mode_rate(mode)
         else:
             return None
 
@@ -271,9 +326,11 @@ class Output:
 
     def get_preferred_mode(self):
         """Returns an index that refers to the list of available modes and 
-           points to the preferred mode of the connected device"""
-        # NOTE: modes start with 1, while arrays start with 0, so subtract 1
-        return self._info.contents.npreferred - 1
+           points to the preferred mode of the connected device, or None if
+           the device has no preferred mode"""
+        if self._preferred:
+            return self._preferred[0]
+        return None
 
     def is_active(self):
         """Returns True if the output is attached to a hardware pipe, is
@@ -307,7 +364,9 @@ class Output:
     def set_to_preferred_mode(self):
         """Set the output to its preferred mode"""
         modes = self.get_available_modes()
-        mode = modes[self.get_preferred_mode()]
+        index = self.get_preferred_mode()
+        mode = None
+        if index is not None: mode = modes[index]
         if mode != None:
             self._mode = mode.id
             self._changes = self._changes | xrandr.CHANGES_MODE
@@ -339,6 +398,16 @@ class Output:
             raise RRError("The given relative output or relation is not "
                           "available")
 
+    def set_position(self, x, y):
+        """Place the output at the given position of the screen, instead of
+           in relation to another output"""
+        self._x = x
+        self._y = y
+        self._relation = None
+        self._relative_to = None
+        self._changes = (self._changes & ~xrandr.CHANGES_RELATION) | \
+                        xrandr.CHANGES_POSITION
+
     def has_changed(self, changes=None):
         """Checks if the output has changed: Either for a specific change or
            generally"""
@@ -457,17 +526,32 @@ class Crtc:
             return True
         return False
 
+    def get_config(self):
+        """Returns the configuration the crtc will have when the stored
+           changes are applied as a tuple (x, y, mode, rotation, output ids)"""
+        if not self._outputs:
+            return (0, 0, 0, xrandr.RR_ROTATE_0, ())
+        output = self._outputs[0]
+        ids = map(lambda o: o.id, self._outputs)
+        ids.sort()
+        return (output._x, output._y, output._mode or 0, output._rotation,
+                tuple(ids))
+
+    def get_current_config(self):
+        """Returns the active configuration of the crtc as a tuple
+           (x, y, mode, rotation, output ids)"""
+        current = self._info.contents
+        if not current.mode or not current.noutput:
+            return (0, 0, 0, xrandr.RR_ROTATE_0, ())
+        ids = [current.outputs[i] for i in range(current.noutput)]
+        ids.sort()
+        return (current.x, current.y, current.mode, current.rotation,
+                tuple(ids))
+
     def has_changed(self):
         """Check if there are any new outputs assigned to the crtc or any
-           outputs with a changed mode or position"""
-        if len(self._outputs) != self._info.contents.noutput:
-            return True
-        for i in range(self._info.contents.noutput):
-            id = self._info.contents.outputs[i]
-            output = self._screen.get_output_by_id(id) 
-            if not output in self._outputs: return True
-            if output.has_changed(): return True
-        return False
+           outputs with a changed mode, position or rotation"""
+        return self.get_config() != self.get_current_config()
 
     def fits_size(self, width, height):
         """Checks if the active configuration fits within the given 
@@ -481,19 +565,17 @@ class Crtc:
         return True
 
 class Screen:
-    def __init__(self, dpy, screen=-1):
-        """Initializes the screen"""
+    def __init__(self, dpy, screen=-1, probe=True):
+        """Initializes the screen. The configuration, crtcs and outputs are
+           only requested from the X server when first used. When probe is
+           False, the resources known to the X server are used as they are
+           instead of probing the outputs again, if XRandR supports that."""
         # Some sane default values
-        self.outputs = {}
-        self.crtcs = []
         self._width = 0
         self._height = 0
-        self._width_max = 0
-        self._height_max = 0
-        self._width_min = 0
-        self._height_min = 0
         self._width_mm = 0
         self._height_mm = 0
+        self._probe = probe
 
         self._display = dpy
         if not -1 <= screen < xlib.XScreenCount(dpy):
@@ -505,24 +587,50 @@ class Screen:
         self._root = xlib.XDefaultRootWindow(self._display, self._screen)
         self._id = rr.XRRRootToScreen(self._display, self._root)
         
-        self._load_config()
         (self._width, self._height, 
          self._width_mm, self._height_mm) = self.get_size()
-        if xrandr.get_version() >= (1,2):
-            self._load_resources()
-            self._load_screen_size_range()
-            self._load_crtcs()
-            self._load_outputs()
 
-        # Store XRandR 1.0 changes here
-        self._rate = self.get_current_rate()
-        self._rotation = self.get_current_rotation()
-        self._size_index = self.get_current_size_index()
+    def __getattr__(self, name):
+        """Loads the configuration and XRandR 1.2 resources on first
+           access of an attribute that depends on them"""
+        if name == '_config':
+            self._load_config()
+        elif name in ('_rate', '_rotation', '_size_index'):
+            # Store XRandR 1.0 changes here
+            self._rate = self.get_current_rate()
+            self._rotation = self.get_current_rotation()
+            self._size_index = self.get_current_size_index()
+        elif name in ('_width_min', '_height_min', '_width_max', '_height_max'):
+            self._width_min = self._height_min = 0
+            self._width_max = self._height_max = 0
+            if xrandr.XRANDR_VERSION >= (1,2):
+                self._load_screen_size_range()
+        elif name in ('_resources', '_modes_by_xid', '_modes_by_name'):
+            self._modes_by_xid = {}
+            self._modes_by_name = {}
+            if xrandr.XRANDR_VERSION >= (1,2):
+                self._load_resources()
+        elif name in ('crtcs', '_crtcs_by_xid'):
+            self.crtcs = []
+            self._crtcs_by_xid = {}
+            if xrandr.XRANDR_VERSION >= (1,2):
+                self._load_crtcs()
+        elif name in ('outputs', '_outputs_by_id'):
+            self.outputs = {}
+            self._outputs_by_id = {}
+            if xrandr.XRANDR_VERSION >= (1,2):
+                self._load_outputs()
+        elif name == '_edid_atoms':
+            self._load_edid_atoms()
+        else:
+            raise AttributeError(name)
+        return self.__dict__[name]
 
     def __del__(self):
         """Free the reference to the interal screen config if the screen
            gets removed"""
-        rr.XRRFreeScreenConfigInfo(self._config)
+        if '_config' in self.__dict__:
+            rr.XRRFreeScreenConfigInfo(self._config)
 
     def _load_config(self):
         """Loads the screen configuration. Only needed privately by the
@@ -552,9 +660,23 @@ class Screen:
     def _load_resources(self):
         """Loads the screen resources. Only needed privately for the 
            bindings"""
-        gsr = rr.XRRGetScreenResources
+        # getting the current resources avoids probing all outputs, but
+        # it is only present in libXrandr 1.3 and later
+        gsr = None
+        if not self._probe and xrandr.XRANDR_VERSION >= (1,3):
+            gsr = getattr(rr, 'XRRGetScreenResourcesCurrent', None)
+        if not gsr:
+            gsr = rr.XRRGetScreenResources
         gsr.restype = POINTER(_XRRScreenResources)
         self._resources = gsr(self._display, self._root)
+        # index modes to look them up directly
+        self._modes_by_xid = {}
+        self._modes_by_name = {}
+        screen_modes = self._resources.contents.modes
+        for s in range(self._resources.contents.nmode):
+            mode = screen_modes[s]
+            self._modes_by_xid[mode.id] = mode
+            self._modes_by_name.setdefault(mode.name, mode)
 
     def _load_crtcs(self):
         """Loads the available XRandR 1.2 crtcs (hardware pipes) of
@@ -564,7 +686,9 @@ class Screen:
         c = self._resources.contents.crtcs
         for i in range(self._resources.contents.ncrtc):
             xrrcrtcinfo = gci(self._display, self._resources, c[i])
-            self.crtcs.append(Crtc(xrrcrtcinfo, c[i], self))
+            crtc = Crtc(xrrcrtcinfo, c[i], self)
+            self.crtcs.append(crtc)
+            self._crtcs_by_xid[crtc.xid] = crtc
 
     def _load_outputs(self):
         """Loads the available XRandR 1.2 outputs of the screen"""
@@ -575,12 +699,49 @@ class Screen:
             xrroutputinfo = goi(self._display, self._resources, o[i])
             output = Output(xrroutputinfo, o[i], self)
             self.outputs[xrroutputinfo.contents.name] = output
-            # Store the mode of the crtc in the output instance
+            self._outputs_by_id[output.id] = output
+            # Store the mode and position of the crtc in the output instance
             crtc = self.get_crtc_by_xid(output.get_crtc())
             if crtc:
                 output._mode = crtc._info.contents.mode
+                output._x = crtc._info.contents.x
+                output._y = crtc._info.contents.y
+                output._rotation = crtc._info.contents.rotation
                 crtc.add_output(output)
 
+    def _load_edid_atoms(self):
+        """Looks up the atoms of the EDID output property, EdidData for
+           older drivers. Only needed privately by the bindings"""
+        self._edid_atoms = []
+        for name in ("EDID", "EdidData"):
+            atom = xlib.XInternAtom(self._display, name, True)
+            if atom: self._edid_atoms.append(atom)
+
+    def _get_output_property(self, output, atom):
+        """Returns the data of an 8-bit output property as a string, or
+           None if the output doesn't have it"""
+        gop = rr.XRRGetOutputProperty
+        gop.argtypes = [c_void_p, RROutput, Atom, c_long, c_long, c_int,
+                        c_int, Atom, POINTER(Atom), POINTER(c_int),
+                        POINTER(c_ulong), POINTER(c_ulong),
+                        POINTER(POINTER(c_ubyte))]
+        actual_type = Atom()
+        actual_format = c_int()
+        nitems = c_ulong()
+        bytes_after = c_ulong()
+        prop = POINTER(c_ubyte)()
+        # an EDID has at most 256 blocks of 128 bytes, which is 8192
+        # 32-bit units
+        if gop(self._display, output, atom, 0, 8192, False, False, 0,
+               byref(actual_type), byref(actual_format), byref(nitems),
+               byref(bytes_after), byref(prop)):
+            return None
+        data = None
+        if actual_format.value == 8 and nitems.value > 0:
+            data = string_at(prop, nitems.value)
+        if prop: xlib.XFree(prop)
+        return data
+
     def get_size(self):
         """Returns the current pixel and physical size of the screen"""
         width = xlib.XDisplayWidth(self._display, self._screen)
@@ -598,10 +759,7 @@ class Screen:
 
     def get_crtc_by_xid(self, xid):
         """Returns the crtc with the given xid or None"""
-        for crtc in self.crtcs:
-            if crtc.xid == xid:
-                return crtc
-        return None
+        return self._crtcs_by_xid.get(xid)
 
     def get_current_rate(self):
         """Returns the currently used refresh rate"""
@@ -695,21 +853,30 @@ class Screen:
             raise RRError("The chosen refresh rate %s is not "
                           "supported" % rate)
 
+    def select_input(self, mask):
+        """Selects the XRandR events to receive for the screen"""
+        rr.XRRSelectInput(self._display, self._root, mask)
+        xlib.XFlush(self._display)
+
+    def wait_event(self, timeout=None):
+        """Waits at most timeout seconds (forever if None) for an event,
+           and returns its type or None if no event arrived"""
+        if not xlib.XPending(self._display):
+            fd = xlib.XConnectionNumber(self._display)
+            r, w, x = select.select([fd], [], [], timeout)
+            if not r or not xlib.XPending(self._display): return None
+        # XEvent is a union padded to 24 longs, starting with the type
+        event = (c_long * 24)()
+        xlib.XNextEvent(self._display, byref(event))
+        return cast(event, POINTER(c_int))[0]
+
     def get_mode_by_name(self, name):
         """Returns the mode of the given name"""
-        screen_modes = self._resources.contents.modes
-        for s in range(self._resources.contents.nmode):
-            if screen_modes[s].name == name:
-                return screen_modes[s]
-        return None
+        return self._modes_by_name.get(name)
 
     def get_mode_by_xid(self, xid):
         """Returns the mode of the given xid"""
-        screen_modes = self._resources.contents.modes
-        for s in range(self._resources.contents.nmode):
-            if screen_modes[s].id == xid:
-                return screen_modes[s]
-        return None
+        return self._modes_by_xid.get(xid)
 
     def get_output_by_name(self, name):
         """Returns the output of the screen with the given name or None"""
@@ -720,10 +887,7 @@ class Screen:
 
     def get_output_by_id(self, id):
         """Returns the output of the screen with the given xid or None"""
-        for o in self.outputs.values():
-            if o.id == id:
-                return o
-        return None
+        return self._outputs_by_id.get(id)
 
     def print_info(self, verbose=False):
         """Prints some information about the detected screen and its outputs"""
@@ -766,8 +930,8 @@ class Screen:
                 print "    Modes:"
                 for m in range(len(modes)):
                     mode = modes[m]
-                    refresh = mode.dotClock / (mode.hTotal * mode.vTotal)
-                    print "      [%s] %s x %s @ %s" % (m,
+                    refresh = output.get_available_mode_rate(m)
+                    print "      [%s] %s x %s @ %.2f" % (m,
                                                        mode.width,
                                                        mode.height,
                                                        refresh),
@@ -827,18 +991,30 @@ class Screen:
                 #FIXME: Take a look at the pick_crtc code in xrandr.c
                 raise RRError("There is no matching crtc for the output")
 
-        # Disable any crtcs whose size won't fit the new one
-        for crtc in self.crtcs:
-            if not crtc.fits_size(self._width, self._height):
-                crtc.disable()
-
-        self.set_size(self._width, self._height,
-                      self._width_mm, self._height_mm)
-
-        # Apply stored changes of crtcs
-        for crtc in self.crtcs:
-            if crtc.has_changed(): 
-                crtc.apply_changes()
+        # Only touch the crtcs of which the configuration really changes
+        changed = filter(lambda c: c.has_changed(), self.crtcs)
+
+        # Apply all changes at once while the server is grabbed, so that
+        # other clients don't see (and react to) intermediate states
+        xlib.XGrabServer(self._display)
+        try:
+            # Disable crtcs that are turned off or whose current
+            # configuration won't fit the new screen size
+            for crtc in changed:
+                if not crtc.get_outputs() or \
+                   not crtc.fits_size(self._width, self._height):
+                    crtc.disable()
+
+            self.set_size(self._width, self._height,
+                          self._width_mm, self._height_mm)
+
+            # Apply stored changes of crtcs
+            for crtc in changed:
+                if crtc.get_outputs():
+                    crtc.apply_changes()
+        finally:
+            xlib.XUngrabServer(self._display)
+            xlib.XFlush(self._display)
 
     def apply_config(self):
         """Used for instantly applying RandR 1.0 changes"""
@@ -960,4 +1136,13 @@ def get_mode_width(mode, rotation):
     else:
         return 0
 
+def get_mode_rate(mode):
+    """Return the vertical refresh rate of the given mode in Hz, taking
+       interlacing and doublescan into account"""
+    vtotal = mode.vTotal
+    if mode.modeFlags & xrandr.RR_DOUBLE_SCAN: vtotal *= 2
+    if mode.modeFlags & xrandr.RR_INTERLACE: vtotal /= 2.0
+    if not mode.hTotal or not vtotal: return 0.0
+    return mode.dotClock / float(mode.hTotal * vtotal)
+
 # vim:ts=4:sw=4:et
@@ -0,0 +1,544 @@
+###############################################################################
+# randrctl.py - XRandR 1.2+ extension functions in python
+#
+# this file contains only the subset of the RandR protocol needed to read
+# the configuration of crtcs and outputs. It talks to the X
+# server directly using minx, so that requests can be pipelined and no
+# ctypes or libXrandr are needed. See randrproto.txt in the X.org randrproto
+# package for a description of the protocol.
+# This file contains low-level communication functionality only.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License at http://www.gnu.org/licenses/gpl.txt
+# By using, editing and/or distributing this software you agree to
+# the terms and conditions of this license.
+
+import struct
+
+from x11 import xnet, minx
+
+###############################################################################
+# RandR request minor opcodes
+#
+_X_RRQueryVersion                   = 0
+_X_RRGetScreenResources             = 8
+_X_RRGetOutputInfo                  = 9
+_X_RRGetOutputProperty              = 15
+_X_RRGetCrtcInfo                    = 20
+_X_RRGetScreenResourcesCurrent      = 25
+
+# connection of an output
+RR_CONNECTED                        = 0
+RR_DISCONNECTED                     = 1
+RR_UNKNOWN_CONNECTION               = 2
+
+RR_ROTATE_0                         = 1
+
+# mode flags
+RR_INTERLACE                        = 16
+RR_DOUBLE_SCAN                      = 32
+
+# property type matching any type, for GetOutputProperty
+ANY_PROPERTY_TYPE                   = 0
+
+
+###############################################################################
+# RandR Query Version
+#
+class _RRQueryVersionRequest:
+    '''this class wraps the RandR query version request. the client
+    tells the server which version it supports, the server replies
+    with the version it will use for this client.'''
+
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'rr_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD32',1,'major_version'),
+            minx.XData('CARD32',1,'minor_version'))
+
+    def __init__(self,opcode,major,minor):
+        self.encoding = self._format.pack(opcode, _X_RRQueryVersion, 3,
+            major, minor)
+
+
+class _RRQueryVersionReply:
+    _format = minx.XStruct(
+            minx.XData('BYTE',1,'type'),
+            minx.XData('PAD',1,'pad0'),
+            minx.XData('CARD16',1,'sequence_number'),
+            minx.XData('CARD32',1,'length'),
+            minx.XData('CARD32',1,'major_version'),
+            minx.XData('CARD32',1,'minor_version'),
+            minx.XData('PAD',16,'pad1'))
+
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
+
+
+###############################################################################
+# RandR Get Screen Resources (Current)
+#
+class _RRGetScreenResourcesRequest:
+    '''this class wraps the RandR get screen resources request. when
+    current is set, GetScreenResourcesCurrent is used, which returns
+    what the server knows without probing the outputs (RandR 1.3).'''
+
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'rr_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD32',1,'window'))
+
+    def __init__(self,opcode,window,current=False):
+        rr_opcode = _X_RRGetScreenResources
+        if current: rr_opcode = _X_RRGetScreenResourcesCurrent
+        self.encoding = self._format.pack(opcode, rr_opcode, 2, window)
+
+
+class _RRGetScreenResourcesReply:
+    '''the reply to a RandR get screen resources request. contains the
+    ids of all crtcs and outputs, and a list of modes; each mode is a
+    dict with the fields of a MODEINFO and its name.'''
+
+    _format = minx.XStruct(
+            minx.XData('BYTE',1,'type'),
+            minx.XData('PAD',1,'pad0'),
+            minx.XData('CARD16',1,'sequence_number'),
+            minx.XData('CARD32',1,'length'),
+            minx.XData('CARD32',1,'timestamp'),
+            minx.XData('CARD32',1,'config_timestamp'),
+            minx.XData('CARD16',1,'num_crtcs'),
+            minx.XData('CARD16',1,'num_outputs'),
+            minx.XData('CARD16',1,'num_modes'),
+            minx.XData('CARD16',1,'num_bytes_names'),
+            minx.XData('PAD',8,'pad1'),
+            minx.XData('CARD32','num_crtcs','crtcs'),
+            minx.XData('CARD32','num_outputs','outputs'))
+
+    _mode_format = minx.XStruct(
+            minx.XData('CARD32',1,'id'),
+            minx.XData('CARD16',1,'width'),
+            minx.XData('CARD16',1,'height'),
+            minx.XData('CARD32',1,'dot_clock'),
+            minx.XData('CARD16',1,'hsync_start'),
+            minx.XData('CARD16',1,'hsync_end'),
+            minx.XData('CARD16',1,'htotal'),
+            minx.XData('CARD16',1,'hskew'),
+            minx.XData('CARD16',1,'vsync_start'),
+            minx.XData('CARD16',1,'vsync_end'),
+            minx.XData('CARD16',1,'vtotal'),
+            minx.XData('CARD16',1,'name_len'),
+            minx.XData('CARD32',1,'mode_flags'))
+
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
+
+        self.modes = []
+        for m in range(self.num_modes):
+            mode, offset = self._mode_format.unpack_from(encoding, offset)
+            self.modes.append(mode)
+        # the names of all modes follow each other without separator
+        names = struct.unpack_from('%ds'%self.num_bytes_names, encoding, offset)[0]
+        for mode in self.modes:
+            mode['name'], names = names[:mode['name_len']], names[mode['name_len']:]
+
+
+###############################################################################
+# RandR Get Output Info
+#
+class _RRGetOutputInfoRequest:
+    '''this class wraps the RandR get output info request. it requires
+    the output id and the config timestamp of the screen resources.'''
+
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'rr_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD32',1,'output'),
+            minx.XData('CARD32',1,'config_timestamp'))
+
+    def __init__(self,opcode,output,config_timestamp):
+        self.encoding = self._format.pack(opcode, _X_RRGetOutputInfo, 3,
+            output, config_timestamp)
+
+
+class _RRGetOutputInfoReply:
+    '''the reply to a RandR get output info request. the first
+    num_preferred modes are the preferred ones of the output.'''
+
+    _format = minx.XStruct(
+            minx.XData('BYTE',1,'type'),
+            minx.XData('CARD8',1,'status'),
+            minx.XData('CARD16',1,'sequence_number'),
+            minx.XData('CARD32',1,'length'),
+            minx.XData('CARD32',1,'timestamp'),
+            minx.XData('CARD32',1,'crtc'),
+            minx.XData('CARD32',1,'mm_width'),
+            minx.XData('CARD32',1,'mm_height'),
+            minx.XData('CARD8',1,'connection'),
+            minx.XData('CARD8',1,'subpixel_order'),
+            minx.XData('CARD16',1,'num_crtcs'),
+            minx.XData('CARD16',1,'num_modes'),
+            minx.XData('CARD16',1,'num_preferred'),
+            minx.XData('CARD16',1,'num_clones'),
+            minx.XData('CARD16',1,'name_len'),
+            minx.XData('CARD32','num_crtcs','crtcs'),
+            minx.XData('CARD32','num_modes','modes'),
+            minx.XData('CARD32','num_clones','clones'),
+            minx.XData('STRING8','name_len','name'))
+
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
+
+
+###############################################################################
+# RandR Get Output Property
+#
+class _RRGetOutputPropertyRequest:
+    '''this class wraps the RandR get output property request. it
+    requires the output id, the property atom, and the offset and length
+    of the data to return in 32-bit units.'''
+
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'rr_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD32',1,'output'),
+            minx.XData('CARD32',1,'property'),
+            minx.XData('CARD32',1,'type'),
+            minx.XData('CARD32',1,'long_offset'),
+            minx.XData('CARD32',1,'long_length'),
+            minx.XData('CARD8',1,'delete'),
+            minx.XData('CARD8',1,'pending'),
+            minx.XData('PAD',2,'pad0'))
+
+    def __init__(self,opcode,output,prop,long_offset,long_length):
+        self.encoding = self._format.pack(opcode, _X_RRGetOutputProperty, 7,
+            output, prop, ANY_PROPERTY_TYPE, long_offset, long_length, 0, 0)
+
+
+class _RRGetOutputPropertyReply:
+    '''the reply to a RandR get output property request. data holds the
+    num_items items of format bits as a string; type is 0 when the output
+    doesn't have the property.'''
+
+    _format = minx.XStruct(
+            minx.XData('BYTE',1,'type'),
+            minx.XData('CARD8',1,'format'),
+            minx.XData('CARD16',1,'sequence_number'),
+            minx.XData('CARD32',1,'length'),
+            minx.XData('CARD32',1,'property_type'),
+            minx.XData('CARD32',1,'bytes_after'),
+            minx.XData('CARD32',1,'num_items'),
+            minx.XData('PAD',12,'pad0'))
+
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
+        size = self.num_items * self.format / 8
+        self.data = struct.unpack_from('%ds'%size, encoding, offset)[0]
+
+
+###############################################################################
+# RandR Get Crtc Info
+#
+class _RRGetCrtcInfoRequest:
+    '''this class wraps the RandR get crtc info request. it requires
+    the crtc id and the config timestamp of the screen resources.'''
+
+    _format = minx.XStruct(
+            minx.XData('CARD8',1,'opcode'),
+            minx.XData('CARD8',1,'rr_opcode'),
+            minx.XData('CARD16',1,'length'),
+            minx.XData('CARD32',1,'crtc'),
+            minx.XData('CARD32',1,'config_timestamp'))
+
+    def __init__(self,opcode,crtc,config_timestamp):
+        self.encoding = self._format.pack(opcode, _X_RRGetCrtcInfo, 3,
+            crtc, config_timestamp)
+
+
+class _RRGetCrtcInfoReply:
+    _format = minx.XStruct(
+            minx.XData('BYTE',1,'type'),
+            minx.XData('CARD8',1,'status'),
+            minx.XData('CARD16',1,'sequence_number'),
+            minx.XData('CARD32',1,'length'),
+            minx.XData('CARD32',1,'timestamp'),
+            minx.XData('INT16',1,'x'),
+            minx.XData('INT16',1,'y'),
+            minx.XData('CARD16',1,'width'),
+            minx.XData('CARD16',1,'height'),
+            minx.XData('CARD32',1,'mode'),
+            minx.XData('CARD16',1,'rotation'),
+            minx.XData('CARD16',1,'rotations'),
+            minx.XData('CARD16',1,'num_outputs'),
+            minx.XData('CARD16',1,'num_possible_outputs'),
+            minx.XData('CARD32','num_outputs','outputs'),
+            minx.XData('CARD32','num_possible_outputs','possible_outputs'))
+
+    def __init__(self,encoding):
+        xreply, offset = self._format.unpack_from(encoding)
+        self.__dict__.update(xreply)
+
+
+###############################################################################
+# RandR Control
+#
+class RandRControl:
+
+    xsock = None    # X connection socket
+    xscreen = None  # X screen
+    root = None     # root window of the X screen
+    opcode = None   # major opcode for X extension
+    first_event = None # event code of first event of X extension
+    version = None  # RandR extension version
+
+    config_timestamp = 0 # config timestamp of the last screen resources
+    atoms = None    # interned atoms by name
+
+
+    def __init__(self, connection=None):
+        '''Initialise the RandR extension. connection is a tuple of an X
+        socket and its connection reply as returned by minx.XConnect(), so
+        that a connection can be shared with NVidiaControl; when not given,
+        a new connection is made. A KeyError is raised if the RandR extension
+        could not be found, a ValueError is raised if it is older than 1.2.'''
+        name, host, displayno, self.xscreen = xnet.get_X_display()
+        if connection:
+            self.xsock, self.xconn = connection
+        else:
+            self.xsock, self.xconn = minx.XConnect()
+        self.root = self.xconn.roots[self.xscreen]['root']
+
+        RandR = minx.XQueryExtension(self.xsock, 'RANDR')
+        if not RandR.present:
+            raise KeyError( 'RANDR extension not found' )
+        self.opcode = RandR.major_opcode
+        self.first_event = RandR.first_event
+
+        if self.get_version() < (1,2):
+            raise ValueError( 'RANDR extension 1.2 or later required: %d.%d'%self.version )
+
+
+    def get_version(self):
+        '''return the RandR version used by the X server as a tuple
+        (major,minor)'''
+        if self.version:
+            return self.version
+
+        rq = _RRQueryVersionRequest(self.opcode, 1, 3)
+        rr = minx.Xchange(self.xsock, rq, _RRQueryVersionReply)
+        self.version = (rr.major_version, rr.minor_version)
+        return self.version
+
+
+    def get_screen_resources(self, probe=True):
+        '''return the crtcs, outputs and modes of the screen. When probe is
+        False and the server supports it, the outputs are not probed again.'''
+        rq = _RRGetScreenResourcesRequest(self.opcode, self.root,
+            not probe and self.get_version() >= (1,3))
+        res = minx.Xchange(self.xsock, rq, _RRGetScreenResourcesReply)
+        self.config_timestamp = res.config_timestamp
+        return res
+
+
+    def get_outputs_info(self, outputs):
+        '''return the information of each output in the list given,
+        requested all at once'''
+        for o in outputs:
+            self.xsock.enqueue(_RRGetOutputInfoRequest(self.opcode, o,
+                self.config_timestamp), _RRGetOutputInfoReply)
+        return self._flush()
+
+
+    def get_crtcs_info(self, crtcs):
+        '''return the information of each crtc in the list given,
+        requested all at once'''
+        for c in crtcs:
+            self.xsock.enqueue(_RRGetCrtcInfoRequest(self.opcode, c,
+                self.config_timestamp), _RRGetCrtcInfoReply)
+        return self._flush()
+
+
+    def get_outputs_property(self, outputs, name, length=8192):
+        '''return the value of the property with the given name of each
+        output in the list given, requested all at once. Each value is the
+        data as a string, or None if the output doesn't have the property.
+        At most length 32-bit units of data are returned.'''
+        prop = self._intern_atom(name)
+        if not prop: return [None] * len(outputs)
+        for o in outputs:
+            self.xsock.enqueue(_RRGetOutputPropertyRequest(self.opcode, o,
+                prop, 0, length), _RRGetOutputPropertyReply)
+        values = []
+        for r in self.xsock.flush():
+            # an output that disappeared gives an error, not a missing value
+            if isinstance(r, minx.XServerError) or not r.property_type:
+                values.append(None)
+            else:
+                values.append(r.data)
+        return values
+
+
+    def _intern_atom(self, name):
+        '''return the atom with the given name, or 0 if it doesn't exist.
+        Atoms persist as long as the X server runs, so existing ones are
+        only looked up once.'''
+        if self.atoms is None: self.atoms = {}
+        if name not in self.atoms:
+            atom = minx.XInternAtom(self.xsock, name)
+            if not atom: return atom
+            self.atoms[name] = atom
+        return self.atoms[name]
+
+
+    def get_screen_config(self, probe=True):
+        '''return the screen resources and the information of all its
+        outputs and crtcs as a tuple (resources, outputs, crtcs), where
+        outputs and crtcs are dicts by id. The information of all outputs
+        and crtcs is requested in a single batch.'''
+        res = self.get_screen_resources(probe)
+        for o in res.outputs:
+            self.xsock.enqueue(_RRGetOutputInfoRequest(self.opcode, o,
+                self.config_timestamp), _RRGetOutputInfoReply)
+        for c in res.crtcs:
+            self.xsock.enqueue(_RRGetCrtcInfoRequest(self.opcode, c,
+                self.config_timestamp), _RRGetCrtcInfoReply)
+        info = self._flush()
+        outputs = dict(zip(res.outputs, info[:len(res.outputs)]))
+        crtcs = dict(zip(res.crtcs, info[len(res.outputs):]))
+        return res, outputs, crtcs
+
+
+    def _flush(self):
+        '''send all queued requests and return their replies; raises the
+        first error encountered, if any.'''
+        replies = self.xsock.flush()
+        for r in replies:
+            if isinstance(r, minx.XServerError):
+                raise r
+        return replies
+
+
+def get_mode_rate(mode):
+    '''return the vertical refresh rate in Hz of a mode as returned in the
+    screen resources, taking interlacing and doublescan into account'''
+    vtotal = mode['vtotal']
+    if mode['mode_flags'] & RR_DOUBLE_SCAN: vtotal *= 2
+    if mode['mode_flags'] & RR_INTERLACE: vtotal /= 2.0
+    if not mode['htotal'] or not vtotal: return 0.0
+    return mode['dot_clock'] / float(mode['htotal'] * vtotal)
+
+
+if __name__ == '__main__':
+    # requests are encoded as the protocol describes them
+    rq = _RRQueryVersionRequest(140, 1, 3)
+    if rq.encoding != struct.pack('=BBHII', 140, _X_RRQueryVersion, 3, 1, 3):
+        print 'ERROR: query version request: %r'%rq.encoding
+    rq = _RRGetScreenResourcesRequest(140, 0x123, current=True)
+    if rq.encoding != struct.pack('=BBHI', 140, _X_RRGetScreenResourcesCurrent, 2, 0x123):
+        print 'ERROR: get screen resources current request: %r'%rq.encoding
+    # replies are decoded with their variable length parts
+    names = '1024x768' + '800x600'
+    data = struct.pack('=BxHIIIHHHH8x', 1, 5, 0, 10, 20, 1, 2, 2, len(names))
+    data += struct.pack('=3I', 0x41, 0x42, 0x43)
+    data += struct.pack('=IHHIHHHHHHHHI', 0x50, 1024, 768, 65000000, 1048, 1184, 1344, 0, 771, 777, 806, 8, 10)
+    data += struct.pack('=IHHIHHHHHHHHI', 0x51, 800, 600, 40000000, 840, 968, 1056, 0, 601, 605, 628, 7, 5)
+    data += names + '\0' * (-len(names) % 4)
+    data_res = data
+    res = _RRGetScreenResourcesReply(data)
+    if res.config_timestamp != 20 or list(res.crtcs) != [0x41] or list(res.outputs) != [0x42, 0x43]:
+        print 'ERROR: screen resources: %s'%res.__dict__
+    if [(m['id'], m['width'], m['name']) for m in res.modes] != [(0x50, 1024, '1024x768'), (0x51, 800, '800x600')]:
+        print 'ERROR: screen resources modes: %s'%res.modes
+
+    data = struct.pack('=BBHIIIIIBBHHHHH', 1, 0, 6, 6, 10, 0x41, 520, 320,
+                       RR_CONNECTED, 0, 1, 2, 1, 0, 5)
+    data += struct.pack('=3I', 0x41, 0x50, 0x51) + 'VGA-0\0\0\0'
+    data_output = data
+    o = _RRGetOutputInfoReply(data)
+    if o.name != 'VGA-0' or list(o.modes) != [0x50, 0x51] or o.num_preferred != 1 or o.mm_width != 520:
+        print 'ERROR: output info: %s'%o.__dict__
+
+    data = struct.pack('=BBHIIhhHHIHHHH2I', 1, 0, 7, 2, 10, 1024, 0, 800, 600, 0x51,
+                       RR_ROTATE_0, 0xf, 1, 1, 0x42, 0x42)
+    data_crtc = data
+    c = _RRGetCrtcInfoReply(data)
+    if (c.x, c.y, c.mode, list(c.outputs)) != (1024, 0, 0x51, [0x42]):
+        print 'ERROR: crtc info: %s'%c.__dict__
+
+    rq = _RRGetOutputPropertyRequest(140, 0x42, 0x99, 0, 8192)
+    if rq.encoding != struct.pack('=BBHIIIIIBB2x', 140, _X_RRGetOutputProperty, 7,
+            0x42, 0x99, ANY_PROPERTY_TYPE, 0, 8192, 0, 0):
+        print 'ERROR: get output property request: %r'%rq.encoding
+    data = struct.pack('=BBHIIII12x', 1, 8, 8, 2, 19, 0, 5) + 'abcde\0\0\0'
+    data_property = data
+    p = _RRGetOutputPropertyReply(data)
+    if p.format != 8 or p.property_type != 19 or p.data != 'abcde':
+        print 'ERROR: output property: %s'%p.__dict__
+
+    if map(lambda m: round(get_mode_rate(m), 2), res.modes) != [60.0, 60.32]:
+        print 'ERROR: mode rates: %s'%map(get_mode_rate, res.modes)
+
+    # the outputs and crtcs of the screen are requested in a single batch
+    class _TestSocket:
+        '''answers queued requests with the replies given by reply class,
+        and records how many requests each flush sends'''
+        def __init__(self, replies):
+            self.replies = replies
+            self.queue = []
+            self.flushes = []
+            self.requests = []
+        def enqueue(self, rq, reply=None):
+            self.requests.append(rq.encoding)
+            self.queue.append(reply)
+        def flush(self):
+            queue, self.queue = self.queue, []
+            self.flushes.append(len(queue))
+            return map(lambda reply: reply and reply(self.replies[reply]), queue)
+
+    class _TestControl(RandRControl):
+        def __init__(self, xsock):
+            self.xsock = xsock
+            self.opcode = 140
+            self.root = 0x123
+            self.version = (1,3)
+
+    atom = struct.pack('=BxHII20x', 1, 9, 0, 0x99)
+    xsock = _TestSocket({_RRGetScreenResourcesReply: data_res,
+        _RRGetOutputInfoReply: data_output, _RRGetCrtcInfoReply: data_crtc,
+        _RRGetOutputPropertyReply: data_property, minx.XInternAtomReply: atom})
+    rrc = _TestControl(xsock)
+    res, outputs, crtcs = rrc.get_screen_config(probe=False)
+    if xsock.flushes != [1, 3]:
+        print 'ERROR: requests per flush for screen config: %s'%xsock.flushes
+    if ord(xsock.requests[0][1]) != _X_RRGetScreenResourcesCurrent:
+        print 'ERROR: screen config probed the outputs'
+    if sorted(outputs.keys()) != [0x42, 0x43] or crtcs.keys() != [0x41] or \
+       outputs[0x42].name != 'VGA-0' or crtcs[0x41].mode != 0x51:
+        print 'ERROR: screen config: %s %s'%(outputs, crtcs)
+    xsock.flushes = []
+    if rrc.get_outputs_property([0x42, 0x43], 'EDID') != ['abcde', 'abcde']:
+        print 'ERROR: outputs property'
+    if xsock.flushes != [1, 2]:
+        print 'ERROR: requests per flush for outputs property: %s'%xsock.flushes
+    xsock.flushes = []
+    rrc.get_outputs_property([0x42, 0x43], 'EDID')
+    if xsock.flushes != [2]:
+        print 'ERROR: atom not cached, requests per flush: %s'%xsock.flushes
+
+    print 'all tests done.'
+
+# vim:ts=4:sw=4:expandtab: